@@ -1,7 +1,16 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from routers import dashboard
+from services.executor import shutdown_executor
+from services.llm import close_client
+from services.metrics import MetricsMiddleware, registry
+from typing import Optional
 import logging
+import os
+import secrets
 
 # Configure logging
 logging.basicConfig(
@@ -14,11 +23,24 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Bearer token required to scrape /metrics; the endpoint is disabled while it is unset
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Let in-flight PDF work finish before the process exits, without blocking the event loop
+    await run_in_threadpool(shutdown_executor)
+    await close_client()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="SafetyAdvisor API",
     description="Safety management and compliance tracking API",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
 # CORS configuration for Vercel frontend
@@ -33,6 +55,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency, per-route counts and Server-Timing headers
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(dashboard.router)
 
@@ -51,6 +76,17 @@ async def health_check():
     return {"status": "healthy"}
 
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus metrics for request, extraction, LLM, database and chat timings."""
+    if not METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not secrets.compare_digest(authorization or "", f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting uvicorn server")
@@ -1,30 +1,88 @@
 from datetime import datetime
 import logging
+import time
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from jose import ExpiredSignatureError
+
+from auth.verification import (
+    TOKEN_CACHE_SIZE,
+    TTLCache,
+    token_cache_expiry,
+    verify_token_locally,
+)
 from db.connection import get_supabase_client
 from db.models import User
+from services.metrics import registry, span
 
 logger = logging.getLogger(__name__)
 
 # Security
 security = HTTPBearer()
 
+# Verified tokens -> User, valid until the token expires (capped by TTL)
+_token_cache: TTLCache[User] = TTLCache(TOKEN_CACHE_SIZE)
+
+# User id -> User profile from the last Supabase lookup. JWT claims don't
+# carry account details such as created_at, so locally verified tokens are
+# resolved through this cache and only hit Supabase for unseen users.
+USER_PROFILE_TTL_SECONDS = 3600
+_user_profiles: TTLCache[User] = TTLCache(TOKEN_CACHE_SIZE)
+
+# How each request's user was resolved: token cache, local JWT check or Supabase
+AUTH_LOOKUPS = registry.counter("auth_lookups", "Authenticated requests by how the user was resolved", ("source",))
+
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
 ) -> User:
     """
-    Verify JWT token from Supabase and return user info
+    Verify JWT token from Supabase and return user info.
+
+    Tokens are verified locally against the project's JWT secret/JWKS and
+    cached until expiry; Supabase is only called as a fallback.
+    """
+    token = credentials.credentials
+
+    cached_user = _token_cache.get(token)
+    if cached_user is not None:
+        AUTH_LOOKUPS.inc(source="token_cache")
+        return cached_user
+
+    try:
+        with span("auth.verify"):
+            claims = await verify_token_locally(token)
+    except ExpiredSignatureError:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication token has expired",
+        )
+
+    user = _user_profiles.get(claims["sub"]) if claims and claims.get("sub") else None
+    if user is None:
+        AUTH_LOOKUPS.inc(source="supabase")
+        with span("auth.supabase"):
+            user = await _get_user_from_supabase(token)
+        _user_profiles.set(user.id, user, time.time() + USER_PROFILE_TTL_SECONDS)
+    else:
+        AUTH_LOOKUPS.inc(source="local")
+
+    _token_cache.set(token, user, token_cache_expiry(token, claims))
+    return user
+
+
+async def _get_user_from_supabase(token: str) -> User:
+    """
+    Verify JWT token with the Supabase Auth server and return user info
     """
     try:
-        token = credentials.credentials
         supabase = get_supabase_client()
 
         # Use Supabase's built-in user verification
         # This automatically handles JWT verification with the correct secret and audience
-        response = supabase.auth.get_user(token)
+        response = await run_in_threadpool(supabase.auth.get_user, token)
         
         if not response or not response.user:
             raise HTTPException(
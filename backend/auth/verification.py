@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Optional, TypeVar
+
+import httpx
+from dotenv import load_dotenv
+from jose import ExpiredSignatureError, JWTError, jwt
+
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+V = TypeVar('V')
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "1024"))
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+JWKS_CACHE_TTL_SECONDS = int(os.getenv("JWKS_CACHE_TTL_SECONDS", "600"))
+
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256"]
+
+
+class TTLCache(Generic[V]):
+    """Thread-safe LRU cache where every entry carries its own expiry time."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Hashable, tuple[float, V]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: V, expires_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_jwks: Optional[Dict[str, Any]] = None
+_jwks_fetched_at = 0.0
+
+
+async def _get_jwks() -> Optional[Dict[str, Any]]:
+    """Fetch the project's JSON Web Key Set, cached for JWKS_CACHE_TTL_SECONDS."""
+    global _jwks, _jwks_fetched_at
+
+    if _jwks is not None and time.time() - _jwks_fetched_at < JWKS_CACHE_TTL_SECONDS:
+        return _jwks
+    if not SUPABASE_URL:
+        return None
+
+    try:
+        async with httpx.AsyncClient(timeout=5.0) as client:
+            response = await client.get(f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json")
+            response.raise_for_status()
+            _jwks = response.json()
+            _jwks_fetched_at = time.time()
+            return _jwks
+    except Exception as e:
+        logger.warning(f"Failed to fetch JWKS: {str(e)}")
+        return _jwks
+
+
+async def verify_token_locally(token: str) -> Optional[Dict[str, Any]]:
+    """
+    Verify a Supabase access token without calling the Auth server.
+
+    HS256 tokens are checked against SUPABASE_JWT_SECRET, asymmetric tokens
+    against the project's JWKS.
+
+    Returns:
+        Optional[Dict[str, Any]]: The verified claims, or None if the token
+        can't be verified locally and the caller should fall back to Supabase
+
+    Raises:
+        ExpiredSignatureError: If the token is validly signed but expired
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get("alg")
+
+        if algorithm == "HS256":
+            if not SUPABASE_JWT_SECRET:
+                return None
+            key: Any = SUPABASE_JWT_SECRET
+        elif algorithm in ASYMMETRIC_ALGORITHMS:
+            jwks = await _get_jwks()
+            if not jwks:
+                return None
+            key = next(
+                (k for k in jwks.get("keys", []) if k.get("kid") == header.get("kid")),
+                None,
+            )
+            if key is None:
+                return None
+        else:
+            return None
+
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=SUPABASE_JWT_AUDIENCE,
+        )
+    except ExpiredSignatureError:
+        raise
+    except JWTError as e:
+        logger.info(f"Local token verification failed, falling back to Supabase: {str(e)}")
+        return None
+
+
+def token_cache_expiry(token: str, claims: Optional[Dict[str, Any]] = None) -> float:
+    """Cache expiry for a verified token: its `exp` claim, capped by the cache TTL."""
+    ttl_expiry = time.time() + TOKEN_CACHE_TTL_SECONDS
+    try:
+        claims = claims or jwt.get_unverified_claims(token)
+    except JWTError:
+        return ttl_expiry
+    exp = claims.get("exp")
+    if exp is None:
+        return ttl_expiry
+    return min(float(exp), ttl_expiry)
@@ -0,0 +1,149 @@
+"""
+Benchmark PDF corpus: sample PDFs from a directory, or synthetic ones.
+
+A corpus directory holds `incident/*.pdf` and `ptw/*.pdf`. Synthetic
+corpora mix digital PDFs (with a text layer, extracted as text) and
+scanned ones (page images only, rendered and sent as images), with a
+blank page and a photo page appended to scans to exercise page filtering.
+"""
+import random
+from pathlib import Path
+from typing import Dict, List
+
+from PIL import Image, ImageDraw
+
+DOCUMENT_KINDS = ("incident", "ptw")
+
+PAGE_WIDTH_PT = 595
+PAGE_HEIGHT_PT = 842
+SCAN_DPI = 100
+
+INCIDENT_LINES = [
+    "HSE INCIDENT REPORT",
+    "Date of incident: 14/03/2024    Time of day: 14:20 DAYLIGHT",
+    "Vessel name: HELIX 1    Vessel location: North Sea, Block 21/10",
+    "Client: Example Energy    Client advised: YES",
+    "Project number / well name: P-2031 / W-14    Vessel connected to well: YES",
+    "Classification: Near Miss    Type of event: Dropped Object",
+    "Level of investigation: Level 1    Investigated with HIT: YES",
+    "Sea state: Moderate    Swell direction: NW    Swell period: 7.5 s    Swell height: 1.8 m",
+    "Incident location on vessel: Main deck, starboard side",
+    "Incident description: A shackle fell approximately 3 m from the crane hook block onto",
+    "the main deck during a lift. The area was barriered and nobody was in the drop zone.",
+    "Job role: Deck Crew    Injury status: No Injury    First aid provided: NO",
+    "Work at height: NO    Confined space: NO    Lifting operation: YES    Dropped object: YES",
+    "Tools used: Crane, shackles, tag lines",
+    "Equipment involved: Main crane hook block    Equipment damaged: None",
+    "Permit to work type: COLD WORK    Permit number: PTW-2024-0412    TRAC/JSA completed: YES",
+    "Task being performed: Back-loading equipment to supply vessel",
+    "PPE worn: Standard PPE, hard hat, gloves, safety boots",
+    "Corrective and preventive actions: Inspect all rigging before use.",
+]
+
+PTW_LINES = [
+    "PERMIT TO WORK - COLD WORK",
+    "Vessel name: HELIX 1",
+    "Description of work: Replace hydraulic hose on main deck crane slew motor",
+    "Work location: Main deck crane pedestal",
+    "Job safety analysis number: JSA-0877",
+    "Equipment required: Hand tools, spill kit, hose crimping kit, man basket",
+    "Isolations: Hydraulic power pack isolated and locked out",
+    "Gas test required: NO    Fire watch required: NO",
+]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path: Path, pages: List[List[str]]) -> None:
+    """Write a minimal PDF whose pages carry a Helvetica text layer."""
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(b"")
+    pages_id = add(b"")
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    page_ids = []
+    for lines in pages:
+        text = " ".join(f"({_pdf_escape(line)}) '" for line in lines)
+        stream = f"BT /F1 10 Tf 14 TL 40 {PAGE_HEIGHT_PT - 50} Td {text} ET".encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH_PT} {PAGE_HEIGHT_PT}] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>".encode("latin-1")
+        ))
+    objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode("latin-1")
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("latin-1")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref_offset
+    )
+    path.write_bytes(bytes(output))
+
+
+def _scanned_page(lines: List[str], rng: random.Random) -> Image.Image:
+    size = (PAGE_WIDTH_PT * SCAN_DPI // 72, PAGE_HEIGHT_PT * SCAN_DPI // 72)
+    image = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(lines):
+        draw.text((60, 70 + index * 22), line, fill=rng.randint(0, 60))
+    return image
+
+
+def _photo_page(rng: random.Random) -> Image.Image:
+    size = (PAGE_WIDTH_PT * SCAN_DPI // 72, PAGE_HEIGHT_PT * SCAN_DPI // 72)
+    return Image.frombytes("L", size, rng.randbytes(size[0] * size[1]))
+
+
+def write_scanned_pdf(path: Path, pages: List[List[str]], rng: random.Random) -> None:
+    """Write an image-only PDF (no text layer), with a blank and a photo page at the end."""
+    images = [_scanned_page(lines, rng) for lines in pages]
+    images.append(Image.new("L", images[0].size, 255))
+    images.append(_photo_page(rng))
+    images[0].save(path, "PDF", resolution=SCAN_DPI, save_all=True, append_images=images[1:])
+
+
+def generate_corpus(directory: Path, documents: int, pages: int, scanned_ratio: float, seed: int = 0) -> Dict[str, List[Path]]:
+    """
+    Write `documents` synthetic PDFs of each kind under `directory`.
+
+    Each document has `pages` form pages; a `scanned_ratio` share of them
+    are image-only scans.
+    """
+    rng = random.Random(seed)
+    corpus: Dict[str, List[Path]] = {}
+    for kind, lines in (("incident", INCIDENT_LINES), ("ptw", PTW_LINES)):
+        kind_dir = directory / kind
+        kind_dir.mkdir(parents=True, exist_ok=True)
+        corpus[kind] = []
+        for index in range(documents):
+            # A unique reference per document keeps content hashes (and cache keys) distinct
+            form_pages = [[f"Report reference: BENCH-{kind.upper()}-{seed}-{index}-{page}", *lines] for page in range(pages)]
+            path = kind_dir / f"{kind}_{index:03d}.pdf"
+            if rng.random() < scanned_ratio:
+                write_scanned_pdf(path, form_pages, rng)
+            else:
+                write_text_pdf(path, form_pages)
+            corpus[kind].append(path)
+    return corpus
+
+
+def load_corpus(directory: Path) -> Dict[str, List[Path]]:
+    """Sample PDFs from `directory/incident` and `directory/ptw`."""
+    corpus = {kind: sorted((directory / kind).glob("*.pdf")) for kind in DOCUMENT_KINDS}
+    if not any(corpus.values()):
+        raise ValueError(f"No PDFs found under {directory}/incident or {directory}/ptw")
+    return corpus
@@ -0,0 +1,170 @@
+"""
+Local stand-in for the OpenRouter chat completions API.
+
+Structured-output requests are answered with the recorded response named
+after the requested schema (`recordings/AccidentData.json`, ...), trimmed
+to the requested fields; other requests (the chat agent) get
+`recordings/chat.txt`. Responses are streamed in chunks with a
+configurable time to first token, per-image cost and generation speed.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+RECORDINGS_DIR = Path(__file__).resolve().parent / "recordings"
+
+# Rough token accounting, only used for the usage block
+CHARS_PER_TOKEN = 4
+TOKENS_PER_IMAGE = 258
+
+
+class FakeLatency(BaseModel):
+    """Simulated model timing"""
+
+    first_token_seconds: float = 0.5
+    seconds_per_image: float = 0.2
+    tokens_per_second: float = 200.0
+    chunk_chars: int = 40
+
+
+def _default_for(schema: Dict[str, Any]) -> Any:
+    types = [option.get("type") for option in schema.get("anyOf", [schema])]
+    if "null" in types:
+        return None
+    return {"string": "", "boolean": False, "number": 0.0, "integer": 0}.get(types[0], None)
+
+
+def _structured_content(recording: Dict[str, Any], schema: Dict[str, Any]) -> str:
+    properties = schema.get("properties", {})
+    return json.dumps({
+        name: recording[name] if name in recording else _default_for(prop)
+        for name, prop in properties.items()
+    })
+
+
+def _count_images(messages: List[Dict[str, Any]]) -> int:
+    images = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            images += sum(1 for part in content if part.get("type") == "image_url")
+    return images
+
+
+def create_app(latency: FakeLatency, recordings_dir: Path = RECORDINGS_DIR) -> FastAPI:
+    recordings = {path.stem: json.loads(path.read_text()) for path in recordings_dir.glob("*.json")}
+    chat_answer = (recordings_dir / "chat.txt").read_text().strip()
+    app = FastAPI()
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        messages = body.get("messages", [])
+
+        response_format = body.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            json_schema = response_format["json_schema"]
+            recording = recordings.get(json_schema["name"])
+            if recording is None:
+                return JSONResponse({"error": {"message": f"No recording for {json_schema['name']}"}}, 400)
+            content = _structured_content(recording, json_schema["schema"])
+        else:
+            content = chat_answer
+
+        images = _count_images(messages)
+        prompt_tokens = len(json.dumps(messages)) // CHARS_PER_TOKEN + images * TOKENS_PER_IMAGE
+        completion_tokens = max(1, len(content) // CHARS_PER_TOKEN)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost": 0.0,
+        }
+        completion_id = f"gen-{uuid.uuid4().hex}"
+        created = int(time.time())
+
+        await asyncio.sleep(latency.first_token_seconds + images * latency.seconds_per_image)
+
+        if not body.get("stream"):
+            await asyncio.sleep(completion_tokens / latency.tokens_per_second)
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra: Any) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                **extra,
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def stream():
+            chunk_seconds = latency.chunk_chars / CHARS_PER_TOKEN / latency.tokens_per_second
+            for start in range(0, len(content), latency.chunk_chars):
+                delta = {"content": content[start:start + latency.chunk_chars]}
+                if start == 0:
+                    delta["role"] = "assistant"
+                yield chunk(delta)
+                await asyncio.sleep(chunk_seconds)
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                usage_chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                               "model": model, "choices": [], "usage": usage}
+                yield f"data: {json.dumps(usage_chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+class FakeOpenRouter:
+    """The fake API served by uvicorn on a background thread."""
+
+    def __init__(self, latency: FakeLatency, port: int, recordings_dir: Path = RECORDINGS_DIR):
+        config = uvicorn.Config(
+            create_app(latency, recordings_dir), host="127.0.0.1", port=port, log_level="warning"
+        )
+        self.server = uvicorn.Server(config)
+        self.base_url = f"http://127.0.0.1:{port}/api/v1"
+        self._thread = threading.Thread(target=self.server.run, name="fake-openrouter", daemon=True)
+
+    def start(self) -> "FakeOpenRouter":
+        self._thread.start()
+        deadline = time.monotonic() + 10
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("Fake OpenRouter server failed to start")
+            time.sleep(0.05)
+        logger.info(f"Fake OpenRouter listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self._thread.join(timeout=10)
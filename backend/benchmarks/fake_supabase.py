@@ -0,0 +1,174 @@
+"""
+In-memory stand-in for the Supabase client used by db.queries.
+
+Implements the subset of the PostgREST query builder the backend calls
+(select/eq/gte/lt/ilike/or_/order/limit, insert and upsert) over plain
+Python lists, with an optional per-request latency to mimic the network
+round trip. `install()` must run before anything imports `db.connection`.
+"""
+import copy
+import fnmatch
+import re
+import sys
+import threading
+import time
+import types
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+# Keyset pagination filter built by query_incidents
+_KEYSET_PATTERN = re.compile(
+    r'^(\w+)\.lt\."([^"]*)",and\((\w+)\.eq\."([^"]*)",(\w+)\.lt\."([^"]*)"\)$'
+)
+
+
+def _comparable(value: Any) -> str:
+    # PostgREST filters arrive as strings; compare stored values the same way
+    if isinstance(value, bool):
+        return str(value).lower()
+    return "" if value is None else str(value)
+
+
+class FakeResponse:
+    def __init__(self, data: List[Dict[str, Any]]):
+        self.data = data
+
+
+class FakeQuery:
+    def __init__(self, table: "FakeTable"):
+        self._table = table
+        self._columns: Optional[List[str]] = None
+        self._filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self._order: List[tuple] = []
+        self._limit: Optional[int] = None
+        self._write: Optional[Callable[[], List[Dict[str, Any]]]] = None
+
+    # Reads
+
+    def select(self, columns: str = "*") -> "FakeQuery":
+        self._columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def eq(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: _comparable(row.get(column)) == _comparable(value))
+        return self
+
+    def gte(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: _comparable(row.get(column)) >= _comparable(value))
+        return self
+
+    def lt(self, column: str, value: Any) -> "FakeQuery":
+        self._filters.append(lambda row: _comparable(row.get(column)) < _comparable(value))
+        return self
+
+    def ilike(self, column: str, pattern: str) -> "FakeQuery":
+        pattern = pattern.replace("%", "*").lower()
+        self._filters.append(lambda row: fnmatch.fnmatchcase(_comparable(row.get(column)).lower(), pattern))
+        return self
+
+    def or_(self, expression: str) -> "FakeQuery":
+        match = _KEYSET_PATTERN.match(expression)
+        if not match:
+            raise NotImplementedError(f"Unsupported or_ filter: {expression}")
+        first, first_value, _, eq_value, second, second_value = match.groups()
+        self._filters.append(
+            lambda row: _comparable(row.get(first)) < first_value
+            or (_comparable(row.get(first)) == eq_value and _comparable(row.get(second)) < second_value)
+        )
+        return self
+
+    def order(self, column: str, desc: bool = False) -> "FakeQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, count: int) -> "FakeQuery":
+        self._limit = count
+        return self
+
+    # Writes
+
+    def insert(self, rows: Any) -> "FakeQuery":
+        self._write = lambda: self._table.write(rows, replace=False, skip_existing=False)
+        return self
+
+    def upsert(self, rows: Any, on_conflict: str = "id", ignore_duplicates: bool = False) -> "FakeQuery":
+        self._write = lambda: self._table.write(rows, replace=not ignore_duplicates, skip_existing=ignore_duplicates)
+        return self
+
+    def execute(self) -> FakeResponse:
+        self._table.client.wait()
+        if self._write is not None:
+            return FakeResponse(self._write())
+
+        rows = [row for row in self._table.rows() if all(check(row) for check in self._filters)]
+        # Sort by the last key first so earlier order() calls take precedence
+        for column, desc in reversed(self._order):
+            rows.sort(key=lambda row: _comparable(row.get(column)), reverse=desc)
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if self._columns is not None:
+            rows = [{column: row.get(column) for column in self._columns} for row in rows]
+        return FakeResponse(copy.deepcopy(rows))
+
+
+class FakeTable:
+    def __init__(self, client: "FakeSupabaseClient", name: str):
+        self.client = client
+        self.name = name
+
+    def rows(self) -> List[Dict[str, Any]]:
+        with self.client.lock:
+            return list(self.client.tables.setdefault(self.name, {}).values())
+
+    def write(self, rows: Any, replace: bool, skip_existing: bool) -> List[Dict[str, Any]]:
+        rows = rows if isinstance(rows, list) else [rows]
+        written = []
+        with self.client.lock:
+            table = self.client.tables.setdefault(self.name, {})
+            for row in rows:
+                row = copy.deepcopy(row)
+                row.setdefault("id", str(uuid.uuid4()))
+                if row["id"] in table:
+                    if skip_existing:
+                        continue
+                    if not replace:
+                        raise Exception(f'duplicate key value violates unique constraint "{self.name}_pkey"')
+                table[row["id"]] = row
+                written.append(copy.deepcopy(row))
+        return written
+
+    def __getattr__(self, name: str):
+        # table("x").select(...), table("x").insert(...), ...
+        return getattr(FakeQuery(self), name)
+
+
+class FakeSupabaseClient:
+    """Tables of rows keyed by id, shared by every query."""
+
+    def __init__(self, latency_seconds: float = 0.0):
+        self.latency_seconds = latency_seconds
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.lock = threading.Lock()
+
+    def wait(self) -> None:
+        # Queries run on threadpool workers, so a blocking sleep is realistic
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+
+    def table(self, name: str) -> FakeTable:
+        return FakeTable(self, name)
+
+    def seed(self, name: str, rows: List[Dict[str, Any]]) -> None:
+        FakeTable(self, name).write(rows, replace=True, skip_existing=False)
+
+
+def install(latency_seconds: float = 0.0) -> FakeSupabaseClient:
+    """Replace `db.connection` with a module serving the in-memory client."""
+    if "db.connection" in sys.modules:
+        raise RuntimeError("db.connection is already imported; install the fake Supabase client first")
+    client = FakeSupabaseClient(latency_seconds)
+    module = types.ModuleType("db.connection")
+    module.supabase = client
+    module.get_supabase_client = lambda: client
+    sys.modules["db.connection"] = module
+    return client
@@ -0,0 +1,372 @@
+"""
+Offline benchmark of the extraction pipeline and the API.
+
+Runs entirely on this machine: LLM calls go to a local fake OpenRouter
+server (recorded responses, simulated latency) and Supabase is replaced by
+an in-memory client, so results only reflect our own code plus the
+simulated waits.
+
+Phases:
+    pipeline  PDFs from the corpus through process_incident_report /
+              process_ptw_report, `--concurrency` at a time
+    api       the FastAPI app under concurrent load (upload jobs, chat,
+              stats, incident listing) through an in-process ASGI client
+
+Reports throughput, p50/p95/p99 latency and peak RSS per operation and
+per instrumented stage (the spans from services.metrics).
+
+Usage (from backend/):
+    python -m benchmarks.run
+    python -m benchmarks.run --corpus ~/sample-pdfs --concurrency 8 --json results.json
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from benchmarks import fake_supabase
+from benchmarks.corpus import generate_corpus, load_corpus
+from benchmarks.fake_openrouter import RECORDINGS_DIR, FakeLatency, FakeOpenRouter
+
+logger = logging.getLogger("benchmarks")
+
+RSS_SAMPLE_SECONDS = 0.02
+JOB_POLL_SECONDS = 0.05
+
+CHAT_QUESTIONS = [
+    "How many dropped objects were there this year?",
+    "What is the most common sea state?",
+    "What is the average swell height?",
+    "Why do lifting incidents happen more often on the main deck?",
+]
+
+VESSELS = ["HELIX 1", "HELIX 2", "WELL ENHANCER", "SEAWELL", "Q7000"]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linearly interpolated percentile (q in 0-100) of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (rank - lower)
+
+
+def _current_rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # No /proc (macOS): fall back to the process peak
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RssSampler:
+    """Samples the process RSS on a background thread."""
+
+    def __init__(self, interval: float = RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.times: List[float] = []
+        self.values: List[int] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.times.append(time.perf_counter())
+            self.values.append(_current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def start(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def peak(self, start: float, end: float) -> int:
+        """Highest RSS sampled in [start, end], or the last sample before it."""
+        first = bisect.bisect_left(self.times, start)
+        last = bisect.bisect_right(self.times, end)
+        if first < last:
+            return max(self.values[first:last])
+        return self.values[max(0, first - 1)] if self.values else _current_rss_bytes()
+
+
+class Recorder:
+    """Timings of harness operations and finished spans, with their time windows."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> [(start, end, succeeded)]
+        self.operations: Dict[str, List[Tuple[float, float, bool]]] = defaultdict(list)
+        self.stages: Dict[str, List[Tuple[float, float, bool]]] = defaultdict(list)
+
+    def on_span(self, name: str, duration: float) -> None:
+        end = time.perf_counter()
+        with self._lock:
+            self.stages[name].append((end - duration, end, True))
+
+    async def time(self, name: str, operation: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.perf_counter()
+        succeeded = False
+        try:
+            result = await operation()
+            succeeded = True
+            return result
+        except Exception as e:
+            logger.warning(f"{name} failed: {e}")
+        finally:
+            with self._lock:
+                self.operations[name].append((start, time.perf_counter(), succeeded))
+
+    def reset(self) -> None:
+        with self._lock:
+            self.operations.clear()
+            self.stages.clear()
+
+
+def summarise(samples: Dict[str, List[Tuple[float, float, bool]]], wall_seconds: float, rss: RssSampler) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for name, windows in sorted(samples.items()):
+        durations = sorted(end - start for start, end, _ in windows)
+        summary[name] = {
+            "count": len(windows),
+            "errors": sum(1 for *_, succeeded in windows if not succeeded),
+            "throughput_per_s": len(windows) / wall_seconds if wall_seconds else 0.0,
+            "p50_ms": percentile(durations, 50) * 1000,
+            "p95_ms": percentile(durations, 95) * 1000,
+            "p99_ms": percentile(durations, 99) * 1000,
+            "peak_rss_mb": max(rss.peak(start, end) for start, end, _ in windows) / 1024 / 1024,
+        }
+    return summary
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n{title}")
+    header = f"{'name':<40} {'count':>6} {'errors':>6} {'per s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'RSS MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, row in rows.items():
+        print(
+            f"{name:<40} {row['count']:>6} {row['errors']:>6} {row['throughput_per_s']:>8.2f} "
+            f"{row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} {row['p99_ms']:>9.1f} {row['peak_rss_mb']:>8.1f}"
+        )
+
+
+def seed_incidents(count: int, seed: int) -> None:
+    """Insert synthetic incidents (variations of the recorded extraction) into the fake database."""
+    from db.models import AccidentData
+    from db.queries import insert_incidents_bulk
+
+    rng = random.Random(seed)
+    base = json.loads((RECORDINGS_DIR / "AccidentData.json").read_text())
+    start = datetime.now() - timedelta(days=3 * 365)
+    incidents = []
+    for index in range(count):
+        incidents.append(AccidentData(**{
+            **base,
+            "date": start + timedelta(days=rng.randrange(3 * 365)),
+            "vessel_name": rng.choice(VESSELS),
+            "sea_state": rng.choice(["Calm", "Slight", "Moderate", "Rough"]),
+            "swell_height_m": round(rng.uniform(0.2, 4.0), 1),
+            "dropped_object": rng.random() < 0.3,
+            "work_at_height": rng.random() < 0.2,
+            "incident_description": f"{base['incident_description']} (seed incident {index})",
+        }))
+    insert_incidents_bulk(incidents)
+
+
+async def run_pipeline(corpus: Dict[str, List[Path]], iterations: int, concurrency: int, recorder: Recorder) -> None:
+    from services.extractor import process_incident_report, process_ptw_report
+
+    processors = {"incident": process_incident_report, "ptw": process_ptw_report}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def extract(kind: str, path: Path) -> None:
+        async with semaphore:
+            await recorder.time(f"extract {kind}", lambda: processors[kind](str(path)))
+
+    await asyncio.gather(*(
+        extract(kind, path)
+        for _ in range(iterations)
+        for kind, paths in corpus.items()
+        for path in paths
+    ))
+
+
+async def run_api(corpus: Dict[str, List[Path]], requests: int, concurrency: int, recorder: Recorder, seed: int) -> None:
+    import httpx
+
+    from app import app
+    from auth.dependencies import get_current_user
+    from db.models import User
+
+    user = User(id="benchmark-user", email="benchmark@example.com", created_at=datetime.now())
+    app.dependency_overrides[get_current_user] = lambda: user
+    rng = random.Random(seed)
+    pdfs = [(kind, path.read_bytes(), path.name) for kind, paths in corpus.items() for path in paths]
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=600) as client:
+
+        async def upload_job() -> None:
+            kind, content, filename = rng.choice(pdfs)
+            endpoint = "/dashboard/jobs/upload" if kind == "incident" else "/dashboard/jobs/upload-ptw"
+            response = await client.post(endpoint, files={"file": (filename, content, "application/pdf")})
+            response.raise_for_status()
+            job = response.json()
+            while job["status"] not in ("succeeded", "failed"):
+                await asyncio.sleep(JOB_POLL_SECONDS)
+                response = await client.get(f"/dashboard/jobs/{job['id']}")
+                response.raise_for_status()
+                job = response.json()
+            if job["status"] == "failed":
+                raise RuntimeError(job["error"])
+
+        async def get(path: str) -> None:
+            (await client.get(path)).raise_for_status()
+
+        async def chat() -> None:
+            response = await client.post("/dashboard/chat", json={"question": rng.choice(CHAT_QUESTIONS)})
+            response.raise_for_status()
+            if not response.json()["success"]:
+                raise RuntimeError(response.json().get("error"))
+
+        workload = [
+            ("upload job (end to end)", upload_job, 2),
+            ("POST /dashboard/chat", chat, 2),
+            ("GET /dashboard/stats", lambda: get("/dashboard/stats"), 3),
+            ("GET /dashboard/incidents", lambda: get("/dashboard/incidents?limit=50"), 3),
+        ]
+        names, operations, weights = zip(*workload)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one() -> None:
+            index = rng.choices(range(len(workload)), weights=weights)[0]
+            async with semaphore:
+                await recorder.time(names[index], operations[index])
+
+        await asyncio.gather(*(one() for _ in range(requests)))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=Path, help="Directory with incident/*.pdf and ptw/*.pdf (default: synthetic)")
+    parser.add_argument("--documents", type=int, default=10, help="Synthetic documents per kind")
+    parser.add_argument("--pages", type=int, default=2, help="Form pages per synthetic document")
+    parser.add_argument("--scanned-ratio", type=float, default=0.5, help="Share of synthetic documents without a text layer")
+    parser.add_argument("--phases", default="pipeline,api", help="Comma-separated phases to run")
+    parser.add_argument("--iterations", type=int, default=1, help="Passes over the corpus in the pipeline phase")
+    parser.add_argument("--requests", type=int, default=200, help="Requests in the api phase")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed-incidents", type=int, default=2000, help="Incidents in the fake database")
+    parser.add_argument("--llm-first-token", type=float, default=0.5, help="Simulated seconds to first token")
+    parser.add_argument("--llm-seconds-per-image", type=float, default=0.2, help="Simulated seconds per page image")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0, help="Simulated generation speed")
+    parser.add_argument("--db-latency", type=float, default=0.02, help="Simulated seconds per Supabase request")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the fake OpenRouter server")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the extraction cache enabled")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="Also write the results to this file")
+    parser.add_argument("--log-level", default="WARNING")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> Dict[str, Any]:
+    latency = FakeLatency(
+        first_token_seconds=args.llm_first_token,
+        seconds_per_image=args.llm_seconds_per_image,
+        tokens_per_second=args.llm_tokens_per_second,
+    )
+    fake_llm = FakeOpenRouter(latency, args.port).start()
+
+    # Configuration is read at import time, so it is set before importing the app
+    os.environ.update({
+        "OPENROUTER_BASE_URL": fake_llm.base_url,
+        "OPENROUTER_API_KEY": "benchmark",
+        "OPENAI_BASE_URL": fake_llm.base_url,
+        "OPENAI_API_BASE": fake_llm.base_url,
+        "OPENAI_API_KEY": "benchmark",
+        # The fake server has no embeddings endpoint
+        "EMBEDDING_BACKEND": "hashing",
+    })
+    if not args.with_cache:
+        os.environ.update({"EXTRACTION_CACHE_SIZE": "0", "EXTRACTION_CACHE_DIR": ""})
+    database = fake_supabase.install()
+
+    from services.llm import close_client
+    from services.metrics import add_span_listener
+
+    logging.getLogger().setLevel(args.log_level)
+    seed_incidents(args.seed_incidents, args.seed)
+    database.latency_seconds = args.db_latency
+
+    with tempfile.TemporaryDirectory(prefix="safetyadvisor-bench-") as corpus_dir:
+        if args.corpus:
+            corpus = load_corpus(args.corpus)
+        else:
+            corpus = generate_corpus(Path(corpus_dir), args.documents, args.pages, args.scanned_ratio, args.seed)
+            if args.scanned_ratio > 0 and shutil.which("pdftoppm") is None:
+                logger.warning("pdftoppm (poppler) not found: scanned documents will fail to render")
+
+        recorder = Recorder()
+        add_span_listener(recorder.on_span)
+        rss = RssSampler().start()
+        results: Dict[str, Any] = {
+            "config": {key: str(value) for key, value in vars(args).items()},
+            "corpus": {kind: len(paths) for kind, paths in corpus.items()},
+            "phases": {},
+        }
+        try:
+            for phase in args.phases.split(","):
+                recorder.reset()
+                started = time.perf_counter()
+                if phase == "pipeline":
+                    await run_pipeline(corpus, args.iterations, args.concurrency, recorder)
+                elif phase == "api":
+                    await run_api(corpus, args.requests, args.concurrency, recorder, args.seed)
+                else:
+                    raise ValueError(f"Unknown phase: {phase}")
+                wall_seconds = time.perf_counter() - started
+                results["phases"][phase] = {
+                    "wall_seconds": wall_seconds,
+                    "peak_rss_mb": rss.peak(started, time.perf_counter()) / 1024 / 1024,
+                    "operations": summarise(recorder.operations, wall_seconds, rss),
+                    "stages": summarise(recorder.stages, wall_seconds, rss),
+                }
+        finally:
+            rss.stop()
+            await close_client()
+            fake_llm.stop()
+
+    return results
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    logging.basicConfig(level=args.log_level)
+    results = asyncio.run(main(args))
+
+    for phase, result in results["phases"].items():
+        print(f"\n=== {phase}: {result['wall_seconds']:.1f} s, peak RSS {result['peak_rss_mb']:.1f} MB ===")
+        print_table("Operations", result["operations"])
+        print_table("Stages", result["stages"])
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.json}")
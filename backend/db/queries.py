@@ -1,14 +1,46 @@
+import base64
+import hashlib
+import json
 import logging
 import uuid
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from pydantic import TypeAdapter
+
+from services.metrics import timed
 
 from .connection import get_supabase_client
 from .models import AccidentData
 
 logger = logging.getLogger(__name__)
 
+# Callbacks notified with newly inserted or updated incident rows, used to keep
+# derived data (dashboard aggregates, caches) in sync with the incidents table.
+# Listeners must replace rows whose id they already hold rather than add them again.
+_insert_listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
 
+
+def add_insert_listener(listener: Callable[[List[Dict[str, Any]]], None]) -> None:
+    """
+    Register a callback to run after incidents are inserted or updated.
+    
+    Args:
+        listener: Called with the list of written incident records; a record
+            whose id was seen before replaces the earlier version
+    """
+    _insert_listeners.append(listener)
+
+
+def _notify_insert_listeners(incidents: List[Dict[str, Any]]) -> None:
+    for listener in _insert_listeners:
+        try:
+            listener(incidents)
+        except Exception as e:
+            logger.error(f"Incident insert listener failed: {str(e)}")
+
+
+@timed("db.get_all_incidents")
 def get_all_incidents() -> List[Dict[str, Any]]:
     """
     Retrieve all incidents from the incidents table.
@@ -37,6 +69,135 @@ def get_all_incidents() -> List[Dict[str, Any]]:
         raise Exception(f"Failed to retrieve incidents: {str(e)}")
 
 
+INCIDENT_FIELDS = ["id"] + list(AccidentData.model_fields)
+
+# Boolean incident flags that can be filtered on
+INCIDENT_FLAG_FIELDS = [
+    name for name, field in AccidentData.model_fields.items() if field.annotation is bool
+]
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_incident_cursor(incident: Dict[str, Any]) -> str:
+    """Encode the keyset position (date, id) of an incident as an opaque cursor."""
+    position = json.dumps({"date": incident["date"], "id": incident["id"]})
+    return base64.urlsafe_b64encode(position.encode("utf-8")).decode("ascii")
+
+
+def decode_incident_cursor(cursor: str) -> Dict[str, str]:
+    """
+    Decode a cursor produced by encode_incident_cursor.
+    
+    The values end up in a PostgREST filter, so the date must be an ISO
+    timestamp and the id a UUID.
+    
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        incident_date, incident_id = str(position["date"]), str(position["id"])
+        datetime.fromisoformat(incident_date)
+        uuid.UUID(incident_id)
+        return {"date": incident_date, "id": incident_id}
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {str(e)}")
+
+
+@timed("db.query_incidents")
+def query_incidents(
+    fields: Optional[List[str]] = None,
+    vessel_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    classification: Optional[str] = None,
+    flags: Optional[Dict[str, bool]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Query incidents with filtering, column projection and keyset pagination
+    evaluated by Postgres.
+    
+    Incidents are ordered newest first by (date, id). When `limit` is set,
+    the result carries a `next_cursor` to pass back for the following page.
+    
+    Args:
+        fields: Columns to return (defaults to all); id and date are always included
+        vessel_name: Exact vessel name
+        date_from: Earliest incident date (inclusive)
+        date_to: Latest incident date (inclusive)
+        classification: Case-insensitive substring of the classification
+        flags: Boolean incident flags to match, e.g. {"dropped_object": True}
+        limit: Page size, at most MAX_PAGE_SIZE; None returns every match
+        cursor: Cursor returned with the previous page
+    
+    Returns:
+        Dict[str, Any]: {"incidents": [...], "next_cursor": Optional[str]}
+        
+    Raises:
+        ValueError: If a field, flag or cursor is invalid
+        Exception: If there's an error fetching data from Supabase
+    """
+    fields = fields or INCIDENT_FIELDS
+    unknown_fields = [f for f in fields if f not in INCIDENT_FIELDS]
+    if unknown_fields:
+        raise ValueError(f"Unknown fields: {', '.join(unknown_fields)}")
+    unknown_flags = [f for f in (flags or {}) if f not in INCIDENT_FLAG_FIELDS]
+    if unknown_flags:
+        raise ValueError(f"Unknown flags: {', '.join(unknown_flags)}")
+
+    # Keyset pagination needs the sort columns in every row
+    columns = list(dict.fromkeys(["id", "date", *fields]))
+    if cursor and limit is None:
+        limit = MAX_PAGE_SIZE
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+    position = decode_incident_cursor(cursor) if cursor else None
+
+    try:
+        supabase = get_supabase_client()
+
+        query = supabase.table("incidents").select(",".join(columns))
+        if vessel_name:
+            query = query.eq("vessel_name", vessel_name)
+        if date_from:
+            query = query.gte("date", date_from.isoformat())
+        if date_to:
+            query = query.lt("date", (date_to + timedelta(days=1)).isoformat())
+        if classification:
+            query = query.ilike("classification", f"*{classification}*")
+        for flag, value in (flags or {}).items():
+            query = query.eq(flag, str(value).lower())
+        if position:
+            query = query.or_(
+                f'date.lt."{position["date"]}",'
+                f'and(date.eq."{position["date"]}",id.lt."{position["id"]}")'
+            )
+
+        query = query.order("date", desc=True).order("id", desc=True)
+        if limit is not None:
+            # Fetch one extra row to know whether another page exists
+            query = query.limit(limit + 1)
+
+        response = query.execute()
+        incidents = response.data or []
+
+        next_cursor = None
+        if limit is not None and len(incidents) > limit:
+            incidents = incidents[:limit]
+            next_cursor = encode_incident_cursor(incidents[-1])
+
+        logger.info(f"Successfully queried {len(incidents)} incidents")
+        return {"incidents": incidents, "next_cursor": next_cursor}
+        
+    except Exception as e:
+        logger.error(f"Error querying incidents: {str(e)}")
+        raise Exception(f"Failed to query incidents: {str(e)}")
+
+
+@timed("db.get_incident_by_id")
 def get_incident_by_id(incident_id: str) -> Optional[Dict[str, Any]]:
     """
     Retrieve a single incident by ID from the incidents table.
@@ -68,98 +229,182 @@ def get_incident_by_id(incident_id: str) -> Optional[Dict[str, Any]]:
         raise Exception(f"Failed to retrieve incident: {str(e)}")
 
 
-def get_similar_incidents() -> List[Dict[str, Any]]:
+INSERT_BATCH_SIZE = 500
+
+
+# Namespace of the deterministic IDs given to inserted incidents
+INCIDENT_ID_NAMESPACE = uuid.UUID("6f1c2a8e-4f0b-4d4e-9a55-3c2b7d9e1f10")
+
+_incident_list_adapter = TypeAdapter(List[AccidentData])
+
+
+def _normalise_key_part(value: Any) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+def incident_natural_key(record: Dict[str, Any]) -> str:
+    """
+    Natural key of an incident row: vessel, date, PTW number and a hash of the description.
+    
+    Args:
+        record: Incident row with JSON-serialised values
+        
+    Returns:
+        str: Key that is equal for rows describing the same incident
+    """
+    description = _normalise_key_part(record.get("incident_description"))
+    return "|".join([
+        _normalise_key_part(record.get("vessel_name")),
+        str(record.get("date") or "")[:10],
+        _normalise_key_part(record.get("ptw_number")),
+        hashlib.sha256(description.encode("utf-8")).hexdigest(),
+    ])
+
+
+# Natural-key fields besides the date; a row with all of them empty has no usable key
+_NATURAL_KEY_FIELDS = ["vessel_name", "ptw_number", "incident_description"]
+
+
+def _incident_id(record: Dict[str, Any]) -> str:
+    """Natural-key ID of an incident row, or a random one if the row is too sparse to identify."""
+    if not any(_normalise_key_part(record.get(field)) for field in _NATURAL_KEY_FIELDS):
+        # Different sparse reports from the same day would otherwise share a key
+        return str(uuid.uuid4())
+    return str(uuid.uuid5(INCIDENT_ID_NAMESPACE, incident_natural_key(record)))
+
+
+def _incident_record(accident_data: AccidentData) -> Dict[str, Any]:
+    """Convert an AccidentData object into an incidents row with its natural-key ID."""
+    incident_dict = accident_data.model_dump()
+
+    # Convert datetime objects to strings for Supabase
+    if incident_dict.get('ip_sign_on_datetime'):
+        incident_dict['ip_sign_on_datetime'] = incident_dict['ip_sign_on_datetime'].isoformat()
+
+    # Convert date to string if it's a datetime object
+    if isinstance(incident_dict.get('date'), datetime):
+        incident_dict['date'] = incident_dict['date'].isoformat()
+
+    # Handle hours_until_return_to_work - convert to string as per table schema
+    if incident_dict.get('hours_until_return_to_work') is not None:
+        incident_dict['hours_until_return_to_work'] = str(incident_dict['hours_until_return_to_work'])
+
+    incident_dict['id'] = _incident_id(incident_dict)
+    return incident_dict
+
+
+@timed("db.insert_incident")
+def insert_incident(accident_data: AccidentData) -> Dict[str, Any]:
     """
-    Retrieve similar incidents from the incidents table using hardcoded IDs.
+    Save an incident to the incidents table.
     
+    The ID is derived from the incident's natural key, as for bulk inserts,
+    so an incident that is already stored (by either path) isn't duplicated:
+    saving it again updates the stored row with the new field values.
+    
+    Args:
+        accident_data: AccidentData object containing incident details
+        
     Returns:
-        List[Dict[str, Any]]: List of similar incidents with only required fields
+        Dict[str, Any]: Contains:
+            - incident: The saved incident record
+            - updated: True if an existing incident was updated rather than inserted
         
     Raises:
-        Exception: If there's an error fetching data from Supabase
+        Exception: If there's an error inserting data into Supabase
     """
     try:
         supabase = get_supabase_client()
         
-        # Hardcoded incident IDs for similarity matching (placeholder for future algorithm)
-        hardcoded_incident_ids = [
-            "45e87e95-e58f-4cb7-a2cb-acc4a073a5a1",
-            "dacf145e-fed9-4c4f-b6bd-8d5486c6734f", 
-            "466860e5-108c-4d1b-b2e3-0a4dec5a8344"
-        ]
+        incident_dict = _incident_record(accident_data)
+        incident_id = incident_dict['id']
+        
+        existing = supabase.table("incidents").select("id").eq("id", incident_id).limit(1).execute()
+        updated = bool(existing.data)
         
-        # Query specific incidents by ID, selecting only required fields
-        response = supabase.table("incidents").select(
-            "id, date, time_of_day, vessel_name, incident_location_on_vessel, incident_description, tools_used, injury_status"
-        ).in_("id", hardcoded_incident_ids).execute()
+        # An explicit save is the user's latest version, so it overwrites a stored row
+        response = (
+            supabase.table("incidents")
+            .upsert(incident_dict, on_conflict="id")
+            .execute()
+        )
         
         if not response.data:
-            logger.info("No similar incidents found in database")
-            # Fallback: get first 3 incidents if hardcoded IDs don't exist
-            fallback_response = supabase.table("incidents").select(
-                "id, date, time_of_day, vessel_name, incident_location_on_vessel, incident_description, tools_used, injury_status"
-            ).limit(3).execute()
-            
-            if fallback_response.data:
-                logger.info(f"Using fallback: retrieved {len(fallback_response.data)} incidents")
-                return fallback_response.data
-            else:
-                return []
-        
-        logger.info(f"Successfully retrieved {len(response.data)} similar incidents")
-        return response.data
+            raise Exception("No data returned from insert operation")
+        
+        saved_incident = response.data[0]
+        logger.info(f"Successfully {'updated' if updated else 'inserted'} incident with ID: {incident_id}")
+        _notify_insert_listeners([saved_incident])
+        
+        return {"incident": saved_incident, "updated": updated}
         
     except Exception as e:
-        logger.error(f"Error fetching similar incidents: {str(e)}")
-        raise Exception(f"Failed to retrieve similar incidents: {str(e)}")
+        logger.error(f"Error inserting incident: {str(e)}")
+        raise Exception(f"Failed to insert incident: {str(e)}")
 
 
-def insert_incident(accident_data: AccidentData) -> Dict[str, Any]:
+@timed("db.insert_incidents_bulk")
+def insert_incidents_bulk(
+    incidents: List[AccidentData],
+    batch_size: int = INSERT_BATCH_SIZE,
+    update_existing: bool = False,
+) -> Dict[str, List[str]]:
     """
-    Insert a new incident into the incidents table.
+    Insert many incidents with multi-row upserts, skipping duplicates.
+    
+    Rows get a deterministic ID derived from their natural key (see
+    incident_natural_key), so duplicates within the input collapse into one
+    row and rows already in the table are matched on the primary key.
     
     Args:
-        accident_data: AccidentData object containing incident details
+        incidents: AccidentData objects to insert
+        batch_size: Maximum number of rows per upsert request
+        update_existing: Overwrite rows that already exist instead of keeping them
         
     Returns:
-        Dict[str, Any]: The inserted incident record with generated ID
+        Dict[str, List[str]]: Contains:
+            - ids: The incident ID of every input, in input order; duplicates share an ID
+            - written: IDs of the rows this call inserted (or updated); rows that
+              already existed and were skipped are left out
         
     Raises:
-        Exception: If there's an error inserting data into Supabase
+        Exception: If a batch fails to insert; earlier batches stay inserted
     """
+    written: List[str] = []
     try:
         supabase = get_supabase_client()
         
-        # Generate a unique ID for the incident
-        incident_id = str(uuid.uuid4())
-        
-        # Convert AccidentData to dict and add ID
-        incident_dict = accident_data.model_dump()
-        incident_dict['id'] = incident_id
-        
-        # Convert datetime objects to strings for Supabase
-        if incident_dict.get('ip_sign_on_datetime'):
-            incident_dict['ip_sign_on_datetime'] = incident_dict['ip_sign_on_datetime'].isoformat()
-        
-        # Convert date to string if it's a datetime object
-        if isinstance(incident_dict.get('date'), datetime):
-            incident_dict['date'] = incident_dict['date'].isoformat()
+        # Serialise every record in one pass through pydantic-core
+        records = _incident_list_adapter.dump_python(incidents, mode="json")
+        ids = []
+        unique: Dict[str, Dict[str, Any]] = {}
+        for record in records:
+            incident_id = _incident_id(record)
+            record["id"] = incident_id
+            # Handle hours_until_return_to_work - convert to string as per table schema
+            if record.get("hours_until_return_to_work") is not None:
+                record["hours_until_return_to_work"] = str(record["hours_until_return_to_work"])
+            ids.append(incident_id)
+            unique[incident_id] = record
         
-        # Handle hours_until_return_to_work - convert to string as per table schema
-        if incident_dict.get('hours_until_return_to_work') is not None:
-            incident_dict['hours_until_return_to_work'] = str(incident_dict['hours_until_return_to_work'])
+        rows = list(unique.values())
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            response = (
+                supabase.table("incidents")
+                .upsert(batch, on_conflict="id", ignore_duplicates=not update_existing)
+                .execute()
+            )
+            # Only new (or updated) rows are returned; listeners replace updated ones by id
+            written.extend(str(row["id"]) for row in response.data or [])
+            if response.data:
+                _notify_insert_listeners(response.data)
         
-        # Insert the incident
-        response = supabase.table("incidents").insert(incident_dict).execute()
-        
-        if not response.data:
-            raise Exception("No data returned from insert operation")
-        
-        inserted_incident = response.data[0]
-        logger.info(f"Successfully inserted incident with ID: {incident_id}")
-        
-        return inserted_incident
+        logger.info(
+            f"Bulk inserted {len(incidents)} incidents: {len(rows)} unique, {len(written)} written"
+        )
+        return {"ids": ids, "written": written}
         
     except Exception as e:
-        logger.error(f"Error inserting incident: {str(e)}")
-        raise Exception(f"Failed to insert incident: {str(e)}") 
\ No newline at end of file
+        logger.error(f"Error bulk inserting incidents after {len(written)} rows: {str(e)}")
+        raise Exception(f"Failed to insert incidents: {str(e)}")
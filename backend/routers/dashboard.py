@@ -1,25 +1,47 @@
+import asyncio
+import json
 import logging
 import os
 import tempfile
+from datetime import date
+from typing import Any, Dict, List, Optional, Set
 
-import pandas as pd
 from auth.dependencies import get_current_user
 from db.models import AccidentData, DashboardStats, PTWData, User
 from db.queries import (
-    get_all_incidents,
+    MAX_PAGE_SIZE,
     get_incident_by_id,
-    get_similar_incidents,
     insert_incident,
+    query_incidents,
 )
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from services.dfagent import ask_dataframe
+from services.batch import expand_uploads, process_incident_batch, remove_batch_files
+from services.chat import CHAT_ANSWERS, answer_aggregation, chat_answer_cache
+from services.dfagent import agent_pool
 from services.extractor import process_incident_report, process_ptw_report
+from services.jobs import Job, job_manager
+from services.llm import model_stats
+from services.similarity import build_similarity_summary, find_similar_incidents
+from services.singleflight import SingleFlight
+from services.snapshot import incident_snapshot
+from services.stats import dashboard_stats
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
+# Identical incident queries in flight at once (e.g. several users opening
+# the dashboard) share one database round trip
+incident_query_flight = SingleFlight("incident_query")
+
+# How often a streaming chat checks whether its client has gone away
+CHAT_DISCONNECT_POLL_SECONDS = 0.5
+# Agent runs of streaming chats, kept referenced until they have shut down
+_chat_agent_tasks: Set[asyncio.Task] = set()
+
 
 class ChatRequest(BaseModel):
     question: str
@@ -32,6 +54,31 @@ class ChatResponse(BaseModel):
     error: str = None
 
 
+def _validate_pdf_upload(file: UploadFile) -> None:
+    if not file.filename or not file.filename.lower().endswith(".pdf"):
+        logger.error(f"Invalid file type: {file.filename}")
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+
+
+def _write_temp_pdf(content: bytes) -> str:
+    """Write uploaded PDF bytes to a temporary file and return its path."""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+        temp_file.write(content)
+    logger.info(f"Temporary file created: {temp_file.name}")
+    return temp_file.name
+
+
+def _remove_temp_file(temp_file_path: Optional[str]) -> None:
+    if temp_file_path and os.path.exists(temp_file_path):
+        try:
+            os.unlink(temp_file_path)
+            logger.info(f"Cleaned up temporary file: {temp_file_path}")
+        except Exception as e:
+            logger.warning(
+                f"Failed to clean up temporary file {temp_file_path}: {str(e)}"
+            )
+
+
 @router.get("/user", response_model=DashboardStats)
 async def get_dashboard_user_info(current_user: User = Depends(get_current_user)):
     """
@@ -47,19 +94,104 @@ async def get_dashboard_user_info(current_user: User = Depends(get_current_user)
 
 
 @router.get("/incidents")
-async def get_all_dashboard_incidents(current_user: User = Depends(get_current_user)):
+async def get_all_dashboard_incidents(
+    fields: Optional[str] = Query(None, description="Comma-separated columns to return"),
+    vessel_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    classification: Optional[str] = None,
+    work_at_height: Optional[bool] = None,
+    work_in_confined_space: Optional[bool] = None,
+    lifting_operation_incident: Optional[bool] = None,
+    dropped_object: Optional[bool] = None,
+    environmental_loss_of_containment: Optional[bool] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+):
     """
-    Get all incidents for dashboard visualizations
+    Get incidents for dashboard visualizations.
+
+    Filters, column projection and pagination are evaluated by the database.
+    Without `limit` every matching incident is returned; with it, pass the
+    returned `next_cursor` back to fetch the following page.
     """
+    flags = {
+        name: value
+        for name, value in {
+            "work_at_height": work_at_height,
+            "work_in_confined_space": work_in_confined_space,
+            "lifting_operation_incident": lifting_operation_incident,
+            "dropped_object": dropped_object,
+            "environmental_loss_of_containment": environmental_loss_of_containment,
+        }.items()
+        if value is not None
+    }
+    field_list = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    query_key = (
+        "incidents", tuple(field_list or ()), vessel_name, date_from, date_to, classification,
+        tuple(sorted(flags.items())), limit, cursor,
+    )
     try:
-        incidents = get_all_incidents()
-        logger.info(f"Retrieved {len(incidents)} incidents for dashboard")
-        return {"incidents": incidents}
+        result = await incident_query_flight.do(query_key, lambda: run_in_threadpool(
+            query_incidents,
+            fields=field_list,
+            vessel_name=vessel_name,
+            date_from=date_from,
+            date_to=date_to,
+            classification=classification,
+            flags=flags,
+            limit=limit,
+            cursor=cursor,
+        ))
+        logger.info(f"Retrieved {len(result['incidents'])} incidents for dashboard")
+        return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching incidents for dashboard: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to retrieve incidents")
 
 
+@router.get("/stats")
+async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
+    """
+    Get precomputed dashboard chart aggregates
+    """
+    try:
+        return await run_in_threadpool(dashboard_stats.get_stats)
+    except Exception as e:
+        logger.error(f"Error computing dashboard stats: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to compute dashboard stats")
+
+
+@router.get("/stats/chart")
+async def get_dashboard_chart(
+    x: str = "sea_state",
+    y: str = "count",
+    hue: str = "vessel_name",
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Get incidents grouped by `x` and `hue`, counted or averaged over a numerical `y`
+    """
+    try:
+        return await run_in_threadpool(dashboard_stats.get_chart, x, y, hue)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error computing dashboard chart: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to compute dashboard chart")
+
+
+@router.get("/models/stats")
+async def get_model_stats(current_user: User = Depends(get_current_user)):
+    """
+    Request counts, latency percentiles and token/cost usage per extraction model
+    """
+    return model_stats.snapshot()
+
+
 @router.get("/incident/{incident_id}")
 async def get_incident_details(
     incident_id: str, current_user: User = Depends(get_current_user)
@@ -68,7 +200,9 @@ async def get_incident_details(
     Get detailed information about a specific incident by ID
     """
     try:
-        incident = get_incident_by_id(incident_id)
+        incident = await incident_query_flight.do(
+            ("incident", incident_id), lambda: run_in_threadpool(get_incident_by_id, incident_id)
+        )
         if not incident:
             raise HTTPException(status_code=404, detail="Incident not found")
         
@@ -81,53 +215,19 @@ async def get_incident_details(
         raise HTTPException(status_code=500, detail="Failed to retrieve incident details")
 
 
-@router.get("/similar-incidents")
-async def get_similar_incidents_endpoint(current_user: User = Depends(get_current_user)):
+@router.post("/similar-incidents")
+async def get_similar_incidents_endpoint(
+    ptw_data: PTWData,
+    k: int = Query(3, ge=1, le=20),
+    current_user: User = Depends(get_current_user),
+):
     """
-    Get similar incidents for PTW analysis using hardcoded incident IDs
+    Get the incidents most similar to the work described in a PTW, with a summary of why they matter
     """
     try:
-        similar_incidents = get_similar_incidents()
+        similar_incidents = await run_in_threadpool(find_similar_incidents, ptw_data, k)
         logger.info(f"Retrieved {len(similar_incidents)} similar incidents")
-        summary = """
-        <h2>Why These 3 Incidents Are Important for PTW Decision</h2>
-
-        <h3>Incident 1: Fire/Explosion During Welding (High Potential Near Miss)</h3>
-
-        <p><strong>Why it's critical:</strong></p>
-        <ul>
-            <li>Same vessel (HELIX 1), same location (Main Deck), same task (welding)</li>
-            <li>JSA was NOT completed properly - directly relevant to your JSA-055 requirement</li>
-            <li>Shows what happens when safety barriers fail during welding operations</li>
-            <li>Sparks ignited combustible materials - major fire risk for hot work</li>
-        </ul>
-
-        <p><strong>Decision impact:</strong> Requires enhanced fire watch, mandatory fire blankets, and strict JSA verification</p>
-
-        <h3>Incident 2: Severe Burn Injury from Torch Malfunction (Lost Time Injury)</h3>
-
-        <p><strong>Why it's critical:</strong></p>
-        <ul>
-            <li>Same equipment type (torch) that's listed in your PTW equipment requirements</li>
-            <li>Major injury requiring helicopter evacuation - shows severity potential</li>
-            <li>Equipment failure during cutting operation - equipment inspection concerns</li>
-            <li>Same vessel and location as proposed work</li>
-        </ul>
-
-        <p><strong>Decision impact:</strong> Mandates pre-work equipment inspection and enhanced emergency response protocols</p>
-
-        <h3>Incident 3: Grinding Wheel Explosion During Surface Prep (Medical Treatment Case)</h3>
-
-        <p><strong>Why it's critical:</strong></p>
-        <ul>
-            <li>Same equipment (sander) listed in your PTW requirements</li>
-            <li>Surface preparation is typically required before welding/cutting</li>
-            <li>Projectile hazard from equipment failure - shows need for exclusion zones</li>
-            <li>Same vessel and location as proposed work</li>
-        </ul>
-
-        <p><strong>Decision impact:</strong> Requires grinding wheel inspection protocol and enhanced PPE requirements</p>
-        """
+        summary = build_similarity_summary(ptw_data, similar_incidents)
         return {"similar_incidents": similar_incidents, "summary": summary}
     except Exception as e:
         logger.error(f"Error fetching similar incidents: {str(e)}")
@@ -142,14 +242,14 @@ async def save_incident_to_database(
     Save an incident to the database
     """
     try:
-        inserted_incident = insert_incident(accident_data)
-        logger.info(
-            f"Successfully saved incident to database with ID: {inserted_incident['id']}"
-        )
+        saved = await run_in_threadpool(insert_incident, accident_data)
+        incident_id = saved["incident"]["id"]
+        logger.info(f"Successfully saved incident to database with ID: {incident_id}")
         return {
             "success": True,
-            "message": "Incident saved successfully",
-            "incident_id": inserted_incident["id"],
+            "message": "Existing incident updated" if saved["updated"] else "Incident saved successfully",
+            "incident_id": incident_id,
+            "updated": saved["updated"],
         }
     except Exception as e:
         logger.error(f"Error saving incident to database: {str(e)}")
@@ -167,23 +267,17 @@ async def upload_accident_report(
     """
     logger.info(f"Received file upload: {file.filename} from user {current_user.email}")
 
-    if not file.filename or not file.filename.lower().endswith(".pdf"):
-        logger.error(f"Invalid file type: {file.filename}")
-        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    _validate_pdf_upload(file)
 
     temp_file_path = None
     try:
         # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-            content = await file.read()
-            logger.info(f"File size: {len(content)} bytes")
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-
-        logger.info(f"Temporary file created: {temp_file_path}")
+        content = await file.read()
+        logger.info(f"File size: {len(content)} bytes")
+        temp_file_path = _write_temp_pdf(content)
 
         # Process the PDF and extract accident data
-        accident_data = process_incident_report(temp_file_path)
+        accident_data = await process_incident_report(temp_file_path)
         logger.info("Successfully processed PDF and extracted accident data")
         return accident_data
 
@@ -202,14 +296,7 @@ async def upload_accident_report(
         )
     finally:
         # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                logger.info(f"Cleaned up temporary file: {temp_file_path}")
-            except Exception as e:
-                logger.warning(
-                    f"Failed to clean up temporary file {temp_file_path}: {str(e)}"
-                )
+        _remove_temp_file(temp_file_path)
 
 
 @router.post("/upload-ptw", response_model=PTWData)
@@ -221,23 +308,17 @@ async def upload_ptw_report(
     """
     logger.info(f"Received PTW file upload: {file.filename} from user {current_user.email}")
 
-    if not file.filename or not file.filename.lower().endswith(".pdf"):
-        logger.error(f"Invalid file type: {file.filename}")
-        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    _validate_pdf_upload(file)
 
     temp_file_path = None
     try:
         # Create temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
-            content = await file.read()
-            logger.info(f"PTW file size: {len(content)} bytes")
-            temp_file.write(content)
-            temp_file_path = temp_file.name
-
-        logger.info(f"Temporary PTW file created: {temp_file_path}")
+        content = await file.read()
+        logger.info(f"PTW file size: {len(content)} bytes")
+        temp_file_path = _write_temp_pdf(content)
 
         # Process the PDF and extract PTW data
-        ptw_data = process_ptw_report(temp_file_path)
+        ptw_data = await process_ptw_report(temp_file_path)
         logger.info("Successfully processed PTW PDF and extracted data")
         return ptw_data
 
@@ -256,14 +337,134 @@ async def upload_ptw_report(
         )
     finally:
         # Clean up temporary file
-        if temp_file_path and os.path.exists(temp_file_path):
-            try:
-                os.unlink(temp_file_path)
-                logger.info(f"Cleaned up temporary PTW file: {temp_file_path}")
-            except Exception as e:
-                logger.warning(
-                    f"Failed to clean up temporary PTW file {temp_file_path}: {str(e)}"
-                )
+        _remove_temp_file(temp_file_path)
+
+
+async def _submit_extraction_job(
+    file: UploadFile, current_user: User, kind: str, process_func
+) -> Job:
+    """Save the upload and queue its extraction as a background job."""
+    _validate_pdf_upload(file)
+
+    content = await file.read()
+    logger.info(f"Queueing {kind} extraction for {file.filename} ({len(content)} bytes)")
+    temp_file_path = _write_temp_pdf(content)
+
+    async def work(progress):
+        try:
+            return await process_func(temp_file_path, progress)
+        finally:
+            _remove_temp_file(temp_file_path)
+
+    return job_manager.submit(kind, current_user.id, work)
+
+
+@router.post("/jobs/upload", response_model=Job, status_code=202)
+async def submit_accident_report_job(
+    file: UploadFile = File(...), current_user: User = Depends(get_current_user)
+):
+    """
+    Queue extraction of an accident report PDF and return the job immediately
+    """
+    return await _submit_extraction_job(file, current_user, "incident", process_incident_report)
+
+
+@router.post("/jobs/upload-ptw", response_model=Job, status_code=202)
+async def submit_ptw_report_job(
+    file: UploadFile = File(...), current_user: User = Depends(get_current_user)
+):
+    """
+    Queue extraction of a PTW report PDF and return the job immediately
+    """
+    return await _submit_extraction_job(file, current_user, "ptw", process_ptw_report)
+
+
+@router.post("/jobs/upload-batch", response_model=Job, status_code=202)
+async def submit_incident_batch_job(
+    files: List[UploadFile] = File(...), current_user: User = Depends(get_current_user)
+):
+    """
+    Queue extraction and insertion of many accident report PDFs (or zip archives of PDFs)
+
+    The job's result reports the outcome of every PDF, including failures
+    """
+    uploads = [(file.filename or "", await file.read()) for file in files]
+    try:
+        batch_files = await run_in_threadpool(expand_uploads, uploads)
+    except ValueError as e:
+        logger.error(f"Invalid batch upload: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info(f"Queueing batch of {len(batch_files)} PDFs from user {current_user.email}")
+
+    async def work(progress):
+        try:
+            return await process_incident_batch(batch_files, progress)
+        finally:
+            remove_batch_files(batch_files)
+
+    return job_manager.submit("incident-batch", current_user.id, work)
+
+
+@router.get("/jobs/{job_id}", response_model=Job)
+async def get_job_status(job_id: str, current_user: User = Depends(get_current_user)):
+    """
+    Poll the status of an extraction job; `result` holds the extracted data once it succeeded
+    """
+    job = job_manager.get(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, current_user: User = Depends(get_current_user)):
+    """
+    Subscribe to an extraction job's progress as server-sent events
+    """
+    if not job_manager.get(job_id, current_user.id):
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for job in job_manager.watch(job_id):
+            yield f"event: {job.status.value}\ndata: {job.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _question_with_history(request: ChatRequest) -> str:
+    """Combine the current question with context from the chat history."""
+    history_context = ""
+    if request.chat_history:
+        history_context = "\n\nPrevious conversation context:\n"
+        for i, msg in enumerate(request.chat_history[-6:]):  # Last 6 messages for context
+            if msg.get('type') == 'user':
+                history_context += f"User: {msg.get('content', '')}\n"
+            elif msg.get('type') == 'bot':
+                history_context += f"Assistant: {msg.get('content', '')}\n"
+    return f"{request.question}{history_context}"
+
+
+async def _quick_chat_answer(request: ChatRequest, incidents, version: int) -> Optional[str]:
+    """Cached answer or snapshot aggregation for the question, if there is one."""
+    # Answers without chat history only depend on the question and the data
+    if not request.chat_history:
+        cached_answer = chat_answer_cache.get(request.question, version)
+        if cached_answer is not None:
+            logger.info(f"Answering chat question from cache: {request.question}")
+            CHAT_ANSWERS.inc(source="cache")
+            return cached_answer
+
+    # Simple aggregations are answered from the snapshot without the agent
+    answer = await run_in_threadpool(answer_aggregation, incidents, request.question)
+    if answer is not None:
+        logger.info(f"Answering chat question with an aggregation: {request.question}")
+        CHAT_ANSWERS.inc(source="aggregation")
+        chat_answer_cache.set(request.question, version, answer)
+    return answer
 
 
 @router.post("/chat", response_model=ChatResponse)
@@ -274,35 +475,22 @@ async def chat_with_data(
     Ask a question about the incidents data using the dataframe agent with chat history context
     """
     try:
-        # Get all incidents data
-        incidents = get_all_incidents()
-        
-        if not incidents:
+        incidents = await run_in_threadpool(incident_snapshot.get)
+        version = incident_snapshot.version
+
+        quick_answer = await _quick_chat_answer(request, incidents, version)
+        if quick_answer is not None:
+            return ChatResponse(answer=quick_answer, success=True)
+
+        # Use the dataframe agent to answer the question
+        logger.info(f"Processing chat question with history: {request.question}")
+        result = await agent_pool.ask(_question_with_history(request))
+        if result is None:
             return ChatResponse(
                 answer="No incident data is currently available in the database.",
                 success=True
             )
         
-        # Convert to pandas DataFrame
-        df = pd.DataFrame(incidents)
-        
-        # Build context from chat history
-        history_context = ""
-        if request.chat_history:
-            history_context = "\n\nPrevious conversation context:\n"
-            for i, msg in enumerate(request.chat_history[-6:]):  # Last 6 messages for context
-                if msg.get('type') == 'user':
-                    history_context += f"User: {msg.get('content', '')}\n"
-                elif msg.get('type') == 'bot':
-                    history_context += f"Assistant: {msg.get('content', '')}\n"
-        
-        # Combine current question with history context
-        full_question = f"{request.question}{history_context}"
-        
-        # Use the dataframe agent to answer the question
-        logger.info(f"Processing chat question with history: {request.question}")
-        result = ask_dataframe(df, full_question)
-        
         # Extract the answer from the agent result
         if isinstance(result, dict) and 'output' in result:
             answer = result['output']
@@ -311,6 +499,9 @@ async def chat_with_data(
         else:
             answer = str(result)
         
+        CHAT_ANSWERS.inc(source="agent")
+        if not request.chat_history:
+            chat_answer_cache.set(request.question, version, answer)
         return ChatResponse(answer=answer, success=True)
         
     except Exception as e:
@@ -320,3 +511,86 @@ async def chat_with_data(
             success=False,
             error=str(e)
         )
+
+
+async def _run_chat_agent(question: str, events: "asyncio.Queue[Optional[Dict[str, Any]]]") -> None:
+    """Feed the agent's streamed events into `events`; cancelling the task stops the agent."""
+    async for agent_event in agent_pool.stream(question):
+        events.put_nowait(agent_event)
+
+
+async def _cancel_on_disconnect(http_request: Request, agent_task: asyncio.Task) -> None:
+    """Cancel the agent run as soon as the client disconnects, even mid-step."""
+    while not agent_task.done():
+        if await http_request.is_disconnected():
+            agent_task.cancel()
+            return
+        await asyncio.sleep(CHAT_DISCONNECT_POLL_SECONDS)
+
+
+@router.post("/chat/stream")
+async def stream_chat_with_data(
+    request: ChatRequest, http_request: Request, current_user: User = Depends(get_current_user)
+):
+    """
+    Ask a question about the incidents data, streaming the agent's steps and answer as server-sent events
+
+    Events are `step`, `observation` and `token` while the agent works, then
+    one `answer` (or `error`) event. The agent run is cancelled when the
+    client disconnects.
+    """
+
+    def event(kind: str, data: dict) -> str:
+        return f"event: {kind}\ndata: {json.dumps(data)}\n\n"
+
+    async def event_stream():
+        try:
+            incidents = await run_in_threadpool(incident_snapshot.get)
+            version = incident_snapshot.version
+
+            quick_answer = await _quick_chat_answer(request, incidents, version)
+            if quick_answer is not None:
+                yield event("answer", {"content": quick_answer})
+                return
+
+            logger.info(f"Streaming chat question with history: {request.question}")
+            answer = None
+            agent_events: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+            agent_task = asyncio.create_task(_run_chat_agent(_question_with_history(request), agent_events))
+            _chat_agent_tasks.add(agent_task)
+            agent_task.add_done_callback(_chat_agent_tasks.discard)
+            # Marks the end of the events however the run ends, even if cancelled before it started
+            agent_task.add_done_callback(lambda _: agent_events.put_nowait(None))
+            watcher = asyncio.create_task(_cancel_on_disconnect(http_request, agent_task))
+            try:
+                while (agent_event := await agent_events.get()) is not None:
+                    if agent_event["type"] == "answer":
+                        answer = agent_event["content"]
+                    yield event(agent_event["type"], agent_event)
+            finally:
+                # Not awaited: the agent task shuts itself down, even if this
+                # generator is being cancelled because the response was dropped
+                watcher.cancel()
+                agent_task.cancel()
+
+            if agent_task.cancelled():
+                logger.info(f"Client disconnected, cancelled chat question: {request.question}")
+                return
+            # Raises the agent's error, if it failed
+            await agent_task
+
+            if answer is None:
+                yield event("answer", {"content": "No incident data is currently available in the database."})
+                return
+            CHAT_ANSWERS.inc(source="agent")
+            if not request.chat_history:
+                chat_answer_cache.set(request.question, version, answer)
+        except Exception as e:
+            logger.error(f"Error streaming chat question: {str(e)}")
+            yield event("error", {"error": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
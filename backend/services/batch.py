@@ -0,0 +1,196 @@
+import asyncio
+import io
+import logging
+import os
+import tempfile
+import time
+import zipfile
+from typing import List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from db.models import AccidentData
+from db.queries import insert_incidents_bulk
+from services.extractor import process_incident_report
+from services.jobs import ProgressCallback
+
+logger = logging.getLogger(__name__)
+
+# Extractions running at once within a batch
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "3"))
+# LLM extraction requests a batch may start per minute (0 disables the limit)
+BATCH_REQUESTS_PER_MINUTE = int(os.getenv("BATCH_REQUESTS_PER_MINUTE", "30"))
+# Extracted rows are inserted once this many are ready
+BATCH_INSERT_CHUNK_SIZE = int(os.getenv("BATCH_INSERT_CHUNK_SIZE", "25"))
+
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "200"))
+BATCH_MAX_UNCOMPRESSED_MB = int(os.getenv("BATCH_MAX_UNCOMPRESSED_MB", "1024"))
+
+# (display name, temporary file path) of a PDF in a batch
+BatchFile = Tuple[str, str]
+
+
+class BatchFileResult(BaseModel):
+    """Outcome of one PDF in a batch upload"""
+
+    filename: str
+    status: str  # "inserted", "duplicate" (already stored, or repeated in the batch) or "failed"
+    incident_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    """Outcome of a batch upload, with one entry per PDF"""
+
+    total: int
+    inserted: int
+    duplicates: int
+    failed: int
+    files: List[BatchFileResult]
+
+
+class RateLimiter:
+    """Spaces out acquisitions so at most `per_minute` happen in any minute."""
+
+    def __init__(self, per_minute: int):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def _write_temp_file(content: bytes) -> str:
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as temp_file:
+        temp_file.write(content)
+    return temp_file.name
+
+
+def expand_uploads(uploads: List[Tuple[str, bytes]]) -> List[BatchFile]:
+    """
+    Write uploaded PDFs, and the PDFs inside uploaded zip archives, to temporary files.
+
+    Args:
+        uploads: (filename, content) of every uploaded file
+
+    Returns:
+        List[BatchFile]: The PDFs to process; zip members are named "archive.zip/member.pdf"
+
+    Raises:
+        ValueError: If a file isn't a PDF or zip, an archive is invalid, or
+            the batch exceeds BATCH_MAX_FILES or BATCH_MAX_UNCOMPRESSED_MB
+    """
+    files: List[BatchFile] = []
+    uncompressed_bytes = 0
+    try:
+        for filename, content in uploads:
+            name = filename.lower()
+            if name.endswith(".pdf"):
+                files.append((filename, _write_temp_file(content)))
+            elif name.endswith(".zip"):
+                try:
+                    archive = zipfile.ZipFile(io.BytesIO(content))
+                except zipfile.BadZipFile:
+                    raise ValueError(f"{filename} is not a valid zip archive")
+                with archive:
+                    for member in archive.infolist():
+                        if member.is_dir() or not member.filename.lower().endswith(".pdf"):
+                            continue
+                        # Check declared sizes before decompressing anything
+                        uncompressed_bytes += member.file_size
+                        if uncompressed_bytes > BATCH_MAX_UNCOMPRESSED_MB * 1024 * 1024:
+                            raise ValueError(f"Batch exceeds {BATCH_MAX_UNCOMPRESSED_MB} MB of PDFs")
+                        files.append((f"{filename}/{member.filename}", _write_temp_file(archive.read(member))))
+            else:
+                raise ValueError(f"{filename}: only PDF and zip files are supported")
+
+            if len(files) > BATCH_MAX_FILES:
+                raise ValueError(f"Batch exceeds {BATCH_MAX_FILES} PDF files")
+    except Exception:
+        remove_batch_files(files)
+        raise
+
+    if not files:
+        raise ValueError("No PDF files found in the upload")
+    return files
+
+
+def remove_batch_files(files: List[BatchFile]) -> None:
+    for _, path in files:
+        try:
+            os.unlink(path)
+        except OSError as e:
+            logger.warning(f"Failed to remove temporary file {path}: {str(e)}")
+
+
+async def process_incident_batch(files: List[BatchFile], progress: ProgressCallback) -> BatchResult:
+    """
+    Extract and insert a batch of incident report PDFs.
+
+    Extractions run concurrently, at most BATCH_CONCURRENCY at a time and
+    BATCH_REQUESTS_PER_MINUTE started per minute. Extracted incidents are
+    bulk inserted in chunks as they become ready. A failing file (or
+    insert chunk) is reported in its result without stopping the batch.
+    """
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+    rate_limiter = RateLimiter(BATCH_REQUESTS_PER_MINUTE)
+    results = [BatchFileResult(filename=filename, status="failed") for filename, _ in files]
+    pending: List[Tuple[int, AccidentData]] = []
+    insert_lock = asyncio.Lock()
+    finished = 0
+
+    async def flush(force: bool = False) -> None:
+        async with insert_lock:
+            if not pending or (len(pending) < BATCH_INSERT_CHUNK_SIZE and not force):
+                return
+            chunk = pending[:]
+            pending.clear()
+            try:
+                inserted = await run_in_threadpool(insert_incidents_bulk, [data for _, data in chunk])
+                # Only the first file of each written row inserted it; the rest are duplicates
+                new_ids = set(inserted["written"])
+                for (index, _), incident_id in zip(chunk, inserted["ids"]):
+                    results[index].status = "inserted" if incident_id in new_ids else "duplicate"
+                    results[index].incident_id = incident_id
+                    new_ids.discard(incident_id)
+            except Exception as e:
+                for index, _ in chunk:
+                    results[index].error = str(e)
+
+    async def extract(index: int, filename: str, path: str) -> None:
+        nonlocal finished
+        async with semaphore:
+            await rate_limiter.acquire()
+            try:
+                pending.append((index, await process_incident_report(path)))
+            except Exception as e:
+                logger.error(f"Batch extraction failed for {filename}: {str(e)}")
+                results[index].error = str(e)
+        finished += 1
+        progress(f"extracted {finished}/{len(files)}")
+        await flush()
+
+    await asyncio.gather(*(extract(index, filename, path) for index, (filename, path) in enumerate(files)))
+    await flush(force=True)
+
+    inserted_count = sum(1 for result in results if result.status == "inserted")
+    duplicate_count = sum(1 for result in results if result.status == "duplicate")
+    logger.info(
+        f"Batch finished: {inserted_count}/{len(files)} incidents inserted, {duplicate_count} duplicates"
+    )
+    return BatchResult(
+        total=len(files),
+        inserted=inserted_count,
+        duplicates=duplicate_count,
+        failed=len(files) - inserted_count - duplicate_count,
+        files=results,
+    )
@@ -0,0 +1,150 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Type, TypeVar
+
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+M = TypeVar('M', bound=BaseModel)
+
+EXTRACTION_CACHE_SIZE = int(os.getenv("EXTRACTION_CACHE_SIZE", "256"))
+# Cached results contain extracted incident data; the default lives in the
+# (git-ignored) backend data directory regardless of the working directory
+EXTRACTION_CACHE_DIR = os.getenv(
+    "EXTRACTION_CACHE_DIR", str(Path(__file__).resolve().parent.parent / "data" / "extraction_cache")
+)
+EXTRACTION_CACHE_MAX_BYTES = int(os.getenv("EXTRACTION_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+
+
+def sha256_file(path: str) -> str:
+    """SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def extraction_cache_key(pdf_hash: str, prompt_hash: str, model_name: str, model_class: Type[BaseModel]) -> str:
+    """Content address of an extraction result."""
+    raw = f"{pdf_hash}:{prompt_hash}:{model_name}:{model_class.__name__}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """
+    Two-tier cache of validated extraction results.
+
+    An in-memory LRU holds the most recent `max_entries` results as JSON; a
+    disk tier under `directory` survives restarts and is trimmed to
+    `max_disk_bytes`, evicting the least recently used files first. The
+    directory is only created when the first result is written.
+    """
+
+    def __init__(self, max_entries: int, directory: Optional[str], max_disk_bytes: int):
+        self.max_entries = max_entries
+        self.directory = directory or None
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, model_class: Type[M]) -> Optional[M]:
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+
+        if payload is None:
+            payload = self._read_disk(key)
+            if payload is None:
+                return None
+            self._remember(key, payload)
+
+        try:
+            return model_class.model_validate_json(payload)
+        except ValueError as e:
+            logger.warning(f"Discarding invalid cache entry {key}: {str(e)}")
+            self.delete(key)
+            return None
+
+    def set(self, key: str, value: BaseModel) -> None:
+        payload = value.model_dump_json()
+        self._remember(key, payload)
+        self._write_disk(key, payload)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._memory.pop(key, None)
+        if self.directory:
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def _remember(self, key: str, payload: str) -> None:
+        with self._lock:
+            self._memory[key] = payload
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_disk(self, key: str) -> Optional[str]:
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                payload = file.read()
+            # Bump mtime so disk eviction is least-recently-used
+            os.utime(path)
+            return payload
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Failed to read cache entry {key}: {str(e)}")
+            return None
+
+    def _write_disk(self, key: str, payload: str) -> None:
+        if not self.directory:
+            return
+        path = self._path(key)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as file:
+                file.write(payload)
+            os.replace(temp_path, path)
+            self._trim_disk()
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {key}: {str(e)}")
+
+    def _trim_disk(self) -> None:
+        entries = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except FileNotFoundError:
+                pass
+
+
+extraction_cache = ExtractionCache(EXTRACTION_CACHE_SIZE, EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_BYTES)
@@ -0,0 +1,329 @@
+import logging
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from services.metrics import registry
+from services.stats import _contains
+
+logger = logging.getLogger(__name__)
+
+CHAT_ANSWER_CACHE_SIZE = 512
+
+CHAT_ANSWERS = registry.counter("chat_answers", "Chat questions answered, by where the answer came from", ("source",))
+
+# Phrases naming a categorical column, for "most common ..." questions
+CATEGORY_PHRASES = {
+    "sea state": "sea_state",
+    "vessel": "vessel_name",
+    "ship": "vessel_name",
+    "classification": "classification",
+    "type of event": "type_of_event",
+    "event type": "type_of_event",
+    "job role": "job_role",
+    "role": "job_role",
+    "injury status": "injury_status",
+    "injury type": "injury_status",
+    "client": "client",
+    "ptw type": "ptw_type",
+    "permit type": "ptw_type",
+    "location": "incident_location_on_vessel",
+    "time of day": "time_of_day",
+    "swell direction": "swell_direction",
+    "task": "task_being_performed",
+}
+
+# Phrases naming a numerical column, for "average ..." questions
+NUMERIC_PHRASES = {
+    "swell height": "swell_height_m",
+    "wave height": "swell_height_m",
+    "swell period": "swell_period_s",
+    "hours after sign on": "hours_after_sign_on",
+    "hours after sign-on": "hours_after_sign_on",
+    "hours until return to work": "hours_until_return_to_work",
+}
+
+# Phrases restricting which incidents are counted, with the matching row mask
+SUBJECT_FILTERS: Dict[str, Tuple[str, Callable[[pd.DataFrame], pd.Series]]] = {
+    "dropped object": ("dropped object incidents", lambda df: df["dropped_object"]),
+    "work at height": ("work at height incidents", lambda df: df["work_at_height"]),
+    "confined space": ("confined space incidents", lambda df: df["work_in_confined_space"]),
+    "lifting": ("lifting operation incidents", lambda df: df["lifting_operation_incident"]),
+    "loss of containment": (
+        "loss of containment incidents", lambda df: df["environmental_loss_of_containment"]
+    ),
+    "near miss": (
+        "near misses",
+        lambda df: _contains(df["classification"].astype(str), "near miss")
+        | _contains(df["type_of_event"].astype(str), "near miss"),
+    ),
+    "high potential": (
+        "high potential incidents",
+        lambda df: _contains(df["classification"].astype(str), "high potential", "hipo"),
+    ),
+    "hot work": ("hot work incidents", lambda df: _contains(df["ptw_type"].astype(str), "hot work")),
+    "first aid": ("incidents with first aid provided", lambda df: df["first_aid_provided"]),
+    "medivac": ("medivacs", lambda df: df["injured_person_medivac"]),
+    "medevac": ("medivacs", lambda df: df["injured_person_medivac"]),
+    "injur": (
+        "injuries",
+        lambda df: (df["injury_status"].astype(str) != "")
+        & ~_contains(df["injury_status"].astype(str), "no injury"),
+    ),
+}
+
+_COUNT_PATTERN = re.compile(r"^(how many|number of|count of|count|total number of|total)\b")
+_TOP_PATTERN = re.compile(r"\b(most common|most frequent|most incidents|most often|top (\d+))\b")
+_AVERAGE_PATTERN = re.compile(r"^(what is |what's )?(the )?(average|mean)\b")
+_YEAR_PATTERN = re.compile(r"\b(in|during|since|for) (\d{4})\b")
+_RECENT_PATTERN = re.compile(r"\b(?:last|past) (\d+) (day|week|month)s?\b")
+# Words that make an answer depend on when the question is asked
+_RELATIVE_TIME_PATTERN = re.compile(
+    r"\b(this|last|past|current|currently|previous|recent|recently|latest|today|yesterday|ago|now|ytd|so far)\b"
+)
+
+# Questions the fast-path can't answer reliably go to the agent
+UNSUPPORTED_TERMS = {
+    "why", "trend", "trends", "compare", "comparison", "correlation", "correlate",
+    "chart", "plot", "per", "each", "breakdown", "those", "these", "them", "that", "they",
+    "it", "ratio", "percentage", "explain", "summarise", "summarize",
+}
+
+# Negations, alternatives and comparisons change which incidents are counted in
+# ways the filters below can't express, so those questions also go to the agent
+QUALIFYING_TERMS = {
+    "not", "no", "non", "none", "never", "nor", "without", "except", "excluding", "exclude", "other",
+    "or", "and", "but", "versus", "vs", "before", "after", "between", "until", "than", "more", "less",
+    "fewer", "greater", "higher", "lower", "over", "under", "above", "below", "least", "only",
+}
+
+# Words a supported question may contain besides the phrases the fast path
+# matches; anything else (an unknown vessel, a value to filter on) goes to the agent
+QUESTION_WORDS = {
+    "how", "many", "number", "count", "total", "incident", "incidents", "event", "events", "case",
+    "cases", "happened", "occurred", "recorded", "reported", "logged", "been", "which", "most",
+    "common", "frequent", "often", "average", "mean", "value", "overall", "all", "so", "far",
+    "vessel", "ship",
+}
+
+STOPWORDS = {
+    "a", "an", "the", "of", "on", "in", "for", "to", "is", "are", "was", "were", "be", "there",
+    "did", "do", "does", "have", "has", "had", "we", "our", "please", "me", "tell", "show",
+    "what", "whats", "s", "with",
+}
+
+
+def normalise_question(question: str) -> str:
+    """Question in lower case, without stopwords, punctuation or plural s; word order is kept."""
+    words = re.findall(r"[a-z0-9]+", question.lower())
+    stems = [word[:-1] if len(word) > 3 and word.endswith("s") else word for word in words]
+    return " ".join(stem for stem in stems if stem not in STOPWORDS)
+
+
+def _find_phrase(question: str, phrases: Dict[str, str]) -> Tuple[Optional[str], str]:
+    """The column named in the question, and the question without its name."""
+    for phrase in sorted(phrases, key=len, reverse=True):
+        match = re.search(rf"\b{re.escape(phrase)}\w*", question)
+        if match:
+            return phrases[phrase], question[:match.start()] + question[match.end():]
+    return None, question
+
+
+def _label(field: str) -> str:
+    """Readable column name, without the unit suffix (e.g. swell_height_m -> swell height)."""
+    return re.sub(r" (m|s)$", "", field.replace("_", " "))
+
+
+def _remove(question: str, match: re.Match) -> str:
+    return question[:match.start()] + " " + question[match.end():]
+
+
+def _vessel_filter(df: pd.DataFrame, question: str) -> Tuple[Optional[str], str]:
+    """The vessel named in the question, matched against the known vessel names, and the question without it."""
+    names = [name for name in df["vessel_name"].astype(str).unique() if name.strip()]
+    for name in sorted(names, key=len, reverse=True):
+        match = re.search(rf"\b{re.escape(name.lower())}\b", question)
+        if match:
+            return name, _remove(question, match)
+    return None, question
+
+
+def _period_filter(df: pd.DataFrame, question: str, now: datetime) -> Tuple[Optional[pd.Series], str, str]:
+    """Row mask and description of the time period in the question, if any, and the question without it."""
+    dates = df["date"]
+    last_month = now.replace(day=1) - timedelta(days=1)
+    periods = {
+        "this year": (lambda: dates.dt.year == now.year, f"in {now.year}"),
+        "last year": (lambda: dates.dt.year == now.year - 1, f"in {now.year - 1}"),
+        "this month": (lambda: (dates.dt.year == now.year) & (dates.dt.month == now.month), "this month"),
+        "last month": (
+            lambda: (dates.dt.year == last_month.year) & (dates.dt.month == last_month.month),
+            "last month",
+        ),
+    }
+    for phrase, (period_mask, description) in periods.items():
+        match = re.search(rf"\b{phrase}\b", question)
+        if match:
+            return period_mask(), description, _remove(question, match)
+    recent = _RECENT_PATTERN.search(question)
+    if recent:
+        amount, unit = int(recent.group(1)), recent.group(2)
+        days = amount * {"day": 1, "week": 7, "month": 30}[unit]
+        return (
+            dates >= pd.Timestamp(now - timedelta(days=days)),
+            f"in the last {amount} {unit}s",
+            _remove(question, recent),
+        )
+    year = _YEAR_PATTERN.search(question)
+    if year:
+        preposition, value = year.group(1), int(year.group(2))
+        if preposition == "since":
+            return dates.dt.year >= value, f"since {value}", _remove(question, year)
+        return dates.dt.year == value, f"in {value}", _remove(question, year)
+    return None, "", question
+
+
+def answer_aggregation(df: pd.DataFrame, question: str, now: Optional[datetime] = None) -> Optional[str]:
+    """
+    Answer simple aggregation questions directly from the incident snapshot.
+
+    Handles counts ("how many dropped objects on HELIX 1 this year"), most
+    common values ("most common sea state") and averages ("average swell
+    height last year"), optionally restricted by vessel, time period and
+    incident type. Anything it can't fully account for (negations,
+    comparisons, vessels or values it doesn't know) is left to the agent
+    rather than answered with a count that ignores part of the question.
+
+    Returns:
+        Optional[str]: The answer, or None if the question needs the agent
+    """
+    question = " ".join(question.lower().replace("?", " ").split())
+    words = set(re.findall(r"[a-z]+", question))
+    if words & (UNSUPPORTED_TERMS | QUALIFYING_TERMS) or len(words) > 20 or df.empty:
+        return None
+
+    count = _COUNT_PATTERN.search(question)
+    top = _TOP_PATTERN.search(question)
+    average = _AVERAGE_PATTERN.search(question)
+    if sum([bool(count), bool(top), bool(average)]) != 1:
+        return None
+    # "which" only makes sense as "which <field> has the most ..."
+    if "which" in words and not top:
+        return None
+
+    # The column being aggregated, kept out of the filters below. Each part of
+    # the question that is understood is removed from it as it is matched.
+    field = None
+    if count:
+        question = _remove(question, count)
+    elif top:
+        field, question = _find_phrase(_remove(question, top), CATEGORY_PHRASES)
+    else:
+        field, question = _find_phrase(_remove(question, average), NUMERIC_PHRASES)
+    if (top or average) and field is None:
+        return None
+
+    now = now or datetime.now(timezone.utc)
+    mask = pd.Series(True, index=df.index)
+    qualifiers = []
+
+    subject = "incidents"
+    for phrase, (label, subject_mask) in SUBJECT_FILTERS.items():
+        match = re.search(rf"\b{re.escape(phrase)}\w*", question)
+        if match:
+            mask &= subject_mask(df).astype(bool)
+            subject = label
+            question = _remove(question, match)
+            break
+
+    vessel, question = _vessel_filter(df, question)
+    if vessel:
+        mask &= df["vessel_name"].astype(str) == vessel
+        qualifiers.append(f"on {vessel}")
+
+    period_mask, period, question = _period_filter(df, question, now)
+    if period_mask is not None:
+        mask &= period_mask.fillna(False)
+        qualifiers.append(period)
+
+    unmatched = set(re.findall(r"[a-z0-9]+", question)) - STOPWORDS - QUESTION_WORDS
+    if unmatched:
+        logger.info(f"Chat fast path can't place {sorted(unmatched)}; leaving the question to the agent")
+        return None
+
+    selected = df[mask]
+    scope = " ".join([subject, *qualifiers])
+
+    if count:
+        return f"There were **{len(selected)}** {scope}."
+
+    if average:
+        values = pd.to_numeric(selected[field], errors="coerce").dropna()
+        if values.empty:
+            return f"No {scope} have a recorded {_label(field)}."
+        return f"The average {_label(field)} across {len(values)} {scope} is **{values.mean():.2f}**."
+
+    if vessel and field == "vessel_name":
+        return None
+    counts = selected[field].astype(str).replace("", pd.NA).dropna().value_counts()
+    if counts.empty:
+        return f"No {scope} have a recorded {_label(field)}."
+    limit = int(top.group(2)) if top.group(2) else 5
+    label = _label(field)
+    leader, leader_count = counts.index[0], int(counts.iloc[0])
+    lines = [f"The most common {label} for {scope} is **{leader}** ({leader_count} of {len(selected)})."]
+    if len(counts) > 1:
+        lines.append("")
+        lines.extend(f"{rank}. {value}: {int(count)}" for rank, (value, count) in enumerate(counts.head(limit).items(), start=1))
+    return "\n".join(lines)
+
+
+class ChatAnswerCache:
+    """
+    Answers keyed on the normalised question and the snapshot version.
+
+    Rephrasings that normalise to the same words hit the same entry, and the
+    whole cache is dropped when the incident snapshot changes version.
+    Questions about relative periods ("this year", "last 30 days") are also
+    keyed on the current date, so they aren't answered for a stale window.
+    """
+
+    def __init__(self, max_entries: int = CHAT_ANSWER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._answers: "OrderedDict[str, str]" = OrderedDict()
+
+    def _key(self, question: str, now: Optional[datetime]) -> str:
+        key = normalise_question(question)
+        if _RELATIVE_TIME_PATTERN.search(question.lower()):
+            key += f" @{(now or datetime.now(timezone.utc)).date().isoformat()}"
+        return key
+
+    def get(self, question: str, version: int, now: Optional[datetime] = None) -> Optional[str]:
+        key = self._key(question, now)
+        with self._lock:
+            if version != self._version:
+                return None
+            answer = self._answers.get(key)
+            if answer is not None:
+                self._answers.move_to_end(key)
+            return answer
+
+    def set(self, question: str, version: int, answer: str, now: Optional[datetime] = None) -> None:
+        key = self._key(question, now)
+        with self._lock:
+            if version != self._version:
+                self._answers.clear()
+                self._version = version
+            self._answers[key] = answer
+            self._answers.move_to_end(key)
+            while len(self._answers) > self.max_entries:
+                self._answers.popitem(last=False)
+
+
+chat_answer_cache = ChatAnswerCache()
@@ -1,18 +1,184 @@
+import asyncio
+import functools
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Set
+
 import pandas as pd
+from fastapi.concurrency import run_in_threadpool
 from langchain.agents.agent_types import AgentType
 from langchain_experimental.agents.agent_toolkits import create_pandas_dataframe_agent
 from langchain_openai import ChatOpenAI
 
-def ask_dataframe(df: pd.DataFrame, question: str) -> str:
-    """
-    Ask a question about a dataframe.
-    """
-    agent = create_pandas_dataframe_agent(
-        ChatOpenAI(model="gpt-4.1"),
+from services.metrics import registry, span
+from services.snapshot import IncidentSnapshot, incident_snapshot
+
+logger = logging.getLogger(__name__)
+
+CHAT_MODEL = os.getenv("CHAT_MODEL", "gpt-4.1")
+# Agents (each with its own copy of the incidents) kept ready for questions
+CHAT_AGENT_POOL_SIZE = int(os.getenv("CHAT_AGENT_POOL_SIZE", "2"))
+CHAT_AGENT_VERBOSE = os.getenv("CHAT_AGENT_VERBOSE", "false").lower() == "true"
+
+# Tool output included in streamed agent steps
+STEP_OUTPUT_MAX_CHARS = 2000
+# Longest a cancelled agent run may take to shut down before it is left to finish in the background
+AGENT_CLOSE_TIMEOUT_SECONDS = 5.0
+
+AGENT_STEPS = registry.counter("chat_agent_steps", "Tool calls made by the chat agent", ("tool",))
+
+@functools.lru_cache(maxsize=None)
+def _chat_model() -> ChatOpenAI:
+    """One chat model client, shared by every agent; created on first use so import needs no API key."""
+    return ChatOpenAI(model=CHAT_MODEL)
+
+
+def _create_agent(df: pd.DataFrame):
+    return create_pandas_dataframe_agent(
+        _chat_model(),
         df,
-        verbose=True,
+        verbose=CHAT_AGENT_VERBOSE,
         agent_type=AgentType.OPENAI_FUNCTIONS,
         allow_dangerous_code=True
     )
 
-    return agent.invoke(question)
+
+def _content_hash(df: pd.DataFrame) -> int:
+    """Hash of a frame's rows together with their index labels."""
+    return int(pd.util.hash_pandas_object(df).sum())
+
+
+class _PooledAgent:
+    def __init__(self, df: pd.DataFrame, version: int):
+        self.df = df
+        self.version = version
+        self.columns = list(df.columns)
+        self.content_hash = _content_hash(df)
+        self.agent = _create_agent(df)
+        # Variables of the Python REPL tool the agent's generated code runs in
+        self._namespace = self.agent.tools[0].locals
+
+    def is_intact(self) -> bool:
+        """False if generated code rebound or modified the agent's frame. Slow on large frames."""
+        if self._namespace.get("df") is not self.df or list(self.df.columns) != self.columns:
+            return False
+        try:
+            return _content_hash(self.df) == self.content_hash
+        except TypeError:
+            # Cells set to unhashable values
+            return False
+
+    def reset(self) -> None:
+        """Drop variables left in the REPL by earlier questions."""
+        for name in [name for name in self._namespace if name != "df"]:
+            del self._namespace[name]
+
+
+class DataFrameAgentPool:
+    """
+    Long-lived pandas agents over the incident snapshot.
+
+    The agent runs generated pandas code, so each agent gets its own copy of
+    the snapshot and serves one question at a time; at most `size` questions
+    are answered concurrently. Agents are built once per snapshot version
+    and reused, so a question only costs the model calls. After each
+    question the agent's frame is checked against a content hash in the
+    background, and agents whose frame was modified are discarded.
+    """
+
+    def __init__(self, snapshot: IncidentSnapshot, size: int = CHAT_AGENT_POOL_SIZE):
+        self._snapshot = snapshot
+        self._size = size
+        self._slots = asyncio.Semaphore(size)
+        self._idle: List[_PooledAgent] = []
+        self._returning: Set[asyncio.Task] = set()
+
+    async def _checkout(self) -> Optional[_PooledAgent]:
+        df = await run_in_threadpool(self._snapshot.get)
+        version = self._snapshot.version
+        if df.empty:
+            return None
+        # Drop agents built from an older snapshot
+        self._idle = [pooled for pooled in self._idle if pooled.version == version]
+        if self._idle:
+            return self._idle.pop()
+        logger.info(f"Building dataframe agent for snapshot version {version}")
+        with span("chat.agent_build"):
+            return await run_in_threadpool(lambda: _PooledAgent(df.copy(), version))
+
+    @asynccontextmanager
+    async def _lease(self) -> AsyncIterator[Optional[_PooledAgent]]:
+        with span("chat.agent_wait"):
+            await self._slots.acquire()
+        try:
+            pooled = await self._checkout()
+            try:
+                yield pooled
+            finally:
+                if pooled is not None:
+                    # Hashing a large frame takes a while; don't hold up the answer for it
+                    task = asyncio.ensure_future(self._return(pooled))
+                    self._returning.add(task)
+                    task.add_done_callback(self._returning.discard)
+        finally:
+            self._slots.release()
+
+    async def _return(self, pooled: _PooledAgent) -> None:
+        intact = await run_in_threadpool(pooled.is_intact)
+        if intact and pooled.version == self._snapshot.version and len(self._idle) < self._size:
+            pooled.reset()
+            self._idle.append(pooled)
+        else:
+            logger.info("Discarding dataframe agent")
+
+    async def ask(self, question: str) -> Optional[Any]:
+        """Answer a question about the incidents; None if there are no incidents."""
+        async with self._lease() as pooled:
+            if pooled is None:
+                return None
+            with span("chat.agent"):
+                return await pooled.agent.ainvoke(question)
+
+    async def stream(self, question: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Answer a question, yielding the agent's progress as it happens.
+
+        Yields dicts with a `type` of "step" (a tool call and its input),
+        "observation" (the tool's output), "token" (answer text as it is
+        generated) and finally "answer". Nothing is yielded if there are no
+        incidents. Closing the iterator cancels the agent run.
+        """
+        async with self._lease() as pooled:
+            if pooled is None:
+                return
+            events = pooled.agent.astream_events(question, version="v2")
+            try:
+                async for event in events:
+                    kind = event["event"]
+                    data = event.get("data", {})
+                    if kind == "on_chat_model_stream":
+                        content = getattr(data.get("chunk"), "content", "")
+                        if content:
+                            yield {"type": "token", "content": content}
+                    elif kind == "on_tool_start":
+                        AGENT_STEPS.inc(tool=event["name"])
+                        yield {"type": "step", "tool": event["name"], "input": str(data.get("input", ""))}
+                    elif kind == "on_tool_end":
+                        output = str(getattr(data.get("output"), "content", data.get("output", "")))
+                        yield {"type": "observation", "tool": event["name"], "output": output[:STEP_OUTPUT_MAX_CHARS]}
+                    elif kind == "on_chain_end" and not event.get("parent_ids"):
+                        output = data.get("output")
+                        answer = output.get("output") if isinstance(output, dict) else output
+                        yield {"type": "answer", "content": str(answer)}
+            finally:
+                # Stops the agent (and its LLM calls) when the caller goes away early.
+                # Shielded so a repeated cancellation can't cut the shutdown short,
+                # and bounded so a stuck call can't hold the agent's slot forever.
+                try:
+                    await asyncio.wait_for(asyncio.shield(events.aclose()), AGENT_CLOSE_TIMEOUT_SECONDS)
+                except asyncio.TimeoutError:
+                    logger.warning("Chat agent run did not shut down in time; leaving it to finish")
+
+
+agent_pool = DataFrameAgentPool(incident_snapshot)
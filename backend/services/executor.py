@@ -0,0 +1,32 @@
+import asyncio
+import contextvars
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar('R')
+
+# PDF parsing and rasterisation are CPU/subprocess bound (PyPDF2, pdftoppm).
+# They run on a dedicated bounded pool so a large upload can't starve the
+# default threadpool used for Supabase calls and sync dependencies.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pdf_executor = ThreadPoolExecutor(max_workers=PDF_WORKERS, thread_name_prefix="pdf-worker")
+
+
+async def run_cpu_bound(func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+    """Run a blocking, CPU-heavy function on the bounded PDF worker pool."""
+    loop = asyncio.get_running_loop()
+    # Carry the caller's context so spans timed in the worker reach the request
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_pdf_executor, partial(context.run, func, *args, **kwargs))
+
+
+def shutdown_executor() -> None:
+    """Shut down the PDF worker pool, waiting for in-flight work to finish."""
+    logger.info("Shutting down PDF worker pool")
+    _pdf_executor.shutdown(wait=True, cancel_futures=True)
@@ -1,72 +1,285 @@
 import PyPDF2
-import tempfile
+import asyncio
+import functools
 import os
 import logging
-from pdf2image import convert_from_path
-from services.llm import extract_incident_data, extract_ptw_data
+import re
+import shutil
+import uuid
+from typing import Dict, FrozenSet, List, Optional
+from fastapi.concurrency import run_in_threadpool
+from services.cache import extraction_cache, extraction_cache_key, sha256_file
+from services.executor import run_cpu_bound
+from services.llm import EXTRACTION_MODELS, extract_incident_data, extract_ptw_data
+from services.metrics import registry, span
+from services.prompts import prompt_registry
+from services.rendering import PageImageStats, page_image_stats, render_pdf_pages
+from services.singleflight import SingleFlight
 from db.models import AccidentData, PTWData
 
 logger = logging.getLogger(__name__)
 
-INCIDENT_PROMPT_PATH = "prompts/incident_prompt.txt"
-PTW_PROMPT_PATH = "prompts/ptw_prompt.txt"
+INCIDENT_PROMPT = "incident"
+PTW_PROMPT = "ptw"
 
-def _process_pdf_to_images(file_path: str, prompt_path: str, extract_func, data_type: str):
+EXTRACTIONS = registry.counter("extractions", "PDF extractions by document type and outcome", ("document", "outcome"))
+DOCUMENT_PAGES = registry.counter("document_pages", "PDF pages read, and how many were sent to the LLM", ("payload",))
+
+# Concurrent extractions of the same PDF (e.g. a double-submitted upload) share one run
+extraction_flight = SingleFlight("extraction")
+
+# Digital PDFs are extracted from their text layer instead of page images
+TEXT_EXTRACTION_ENABLED = os.getenv("TEXT_EXTRACTION_ENABLED", "true").lower() == "true"
+MIN_TEXT_CHARS_PER_PAGE = 50
+MIN_TEXT_PAGE_RATIO = 0.8
+MIN_READABLE_CHAR_RATIO = 0.9
+MIN_WORD_RATIO = 0.5
+
+def _text_layer_is_usable(page_texts: List[str]) -> bool:
+    """Heuristic check that a PDF's text layer is complete enough to extract from.
+
+    Scanned pages, partially scanned packs and text layers with broken font
+    encodings fail the check and fall back to page images.
+    """
+    if not page_texts:
+        return False
+
+    pages_with_text = [text for text in page_texts if len(text.strip()) >= MIN_TEXT_CHARS_PER_PAGE]
+    if len(pages_with_text) / len(page_texts) < MIN_TEXT_PAGE_RATIO:
+        return False
+
+    all_text = "".join(pages_with_text)
+    readable_chars = sum(1 for c in all_text if c.isalnum() or c.isspace() or c in ".,:;()/-%'\"")
+    if readable_chars / len(all_text) < MIN_READABLE_CHAR_RATIO:
+        return False
+
+    tokens = all_text.split()
+    word_like = sum(1 for token in tokens if token.strip(".,:;()").isalpha() and 1 < len(token) <= 20)
+    return bool(tokens) and word_like / len(tokens) >= MIN_WORD_RATIO
+
+# Only pages that look relevant are rendered and sent as images
+PAGE_FILTER_ENABLED = os.getenv("PAGE_FILTER_ENABLED", "true").lower() == "true"
+MAX_RELEVANT_PAGES = int(os.getenv("MAX_RELEVANT_PAGES", "12"))
+MIN_PAGE_SCORE = 0.2
+# Thumbnails with less ink than this are blank; busier, high-entropy ones are photos
+BLANK_PAGE_INK_RATIO = 0.005
+PHOTO_PAGE_ENTROPY = 6.0
+PHOTO_PAGE_INK_RATIO = 0.3
+SIGNATURE_TERMS = {"signature", "signatures", "signed", "sign"}
+# Field words too common to tell a form page from a sign-off page
+GENERIC_FIELD_WORDS = {
+    "after", "available", "being", "completed", "date", "datetime", "during", "first", "hours",
+    "including", "level", "meters", "name", "number", "provided", "related", "return", "seconds",
+    "this", "time", "type", "until", "used", "using", "well", "were", "when", "where", "whether",
+    "with", "words",
+} | SIGNATURE_TERMS
+
+_WORD_PATTERN = re.compile(r"[a-z]+")
+
+@functools.lru_cache(maxsize=8)
+def _model_keywords(model_class) -> FrozenSet[str]:
+    """Words of the fields being extracted, from their names and descriptions, e.g. "vessel", "injury"."""
+    words = set()
+    for name, field in model_class.model_fields.items():
+        words.update(name.split("_"))
+        words.update(_WORD_PATTERN.findall((field.description or "").lower()))
+    return frozenset(word for word in words if len(word) > 3 and word not in GENERIC_FIELD_WORDS)
+
+def _score_page(text: str, keywords: FrozenSet[str], image_stats: Optional[PageImageStats]) -> float:
+    """Relevance of a page to the extraction, from 0 (blank) upwards."""
+    if len(text.strip()) < MIN_TEXT_CHARS_PER_PAGE:
+        # No usable text layer: judge the rendered thumbnail instead
+        if image_stats is None:
+            return 0.5
+        entropy, ink_ratio = image_stats
+        if ink_ratio < BLANK_PAGE_INK_RATIO:
+            return 0.0
+        if entropy > PHOTO_PAGE_ENTROPY and ink_ratio > PHOTO_PAGE_INK_RATIO:
+            return 0.1
+        return 0.5
+
+    words = set(_WORD_PATTERN.findall(text.lower()))
+    hits = len(words & keywords)
+    if not hits and words & SIGNATURE_TERMS:
+        return 0.1
+    return 1.0 + hits + min(len(text), 3000) / 3000
+
+def _select_pages(page_texts: List[str], keywords: FrozenSet[str], image_stats: Dict[int, PageImageStats]) -> List[int]:
+    """
+    Pick the 1-based pages worth sending to the LLM.
+
+    Blank pages, photo appendices and signature-only pages are dropped, the
+    first page is always kept, and at most MAX_RELEVANT_PAGES of the best
+    scoring pages are returned in document order.
+    """
+    scores = {
+        number: _score_page(text, keywords, image_stats.get(number))
+        for number, text in enumerate(page_texts, start=1)
+    }
+    relevant = [number for number, score in scores.items() if score >= MIN_PAGE_SCORE or number == 1]
+    if len(relevant) > MAX_RELEVANT_PAGES:
+        relevant = sorted(relevant, key=lambda number: (number != 1, -scores[number], number))[:MAX_RELEVANT_PAGES]
+    return sorted(relevant)
+
+def _prepare_document(file_path: str, model_class):
+    """Turn the PDF into an LLM payload.
+
+    PDFs with a usable text layer are sent as text; everything else is
+    rasterised into base64 encoded page images. This is the CPU-bound part
+    of the pipeline and runs on the PDF worker pool.
+
+    Returns:
+        Tuple of (base64_images, document_text); exactly one of them is set
+    """
+    logger.info(f"Starting PDF processing for file: {file_path}")
+
+    with open(file_path, "rb") as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        logger.info(f"PDF has {len(pdf_reader.pages)} pages")
+        page_sizes = [
+            (float(page.mediabox.width), float(page.mediabox.height)) for page in pdf_reader.pages
+        ]
+
+        # Check if PDF has a usable text layer
+        page_texts = [page.extract_text() or "" for page in pdf_reader.pages]
+        has_text = any(text.strip() for text in page_texts)
+        logger.info(f"PDF has extractable text: {has_text}")
+
+    DOCUMENT_PAGES.inc(len(page_texts), payload="read")
+    if TEXT_EXTRACTION_ENABLED and _text_layer_is_usable(page_texts):
+        DOCUMENT_PAGES.inc(len(page_texts), payload="text")
+        document_text = "\n\n".join(
+            f"--- Page {i + 1} ---\n{text.strip()}" for i, text in enumerate(page_texts)
+        )
+        logger.info(f"Using text layer for extraction ({len(document_text)} characters)")
+        return None, document_text
+
+    # Render pages in memory for LLM processing
+    logger.info("Converting PDF to images...")
+    try:
+        page_numbers = None
+        if PAGE_FILTER_ENABLED and page_texts:
+            textless = [
+                number for number, text in enumerate(page_texts, start=1)
+                if len(text.strip()) < MIN_TEXT_CHARS_PER_PAGE
+            ]
+            with span("extract.page_filter"):
+                image_stats = page_image_stats(file_path, textless) if textless else {}
+            page_numbers = _select_pages(page_texts, _model_keywords(model_class), image_stats)
+            logger.info(f"Selected {len(page_numbers)} of {len(page_texts)} pages as relevant: {page_numbers}")
+
+        base64_images = list(render_pdf_pages(file_path, page_sizes, page_numbers))
+        logger.info(f"Converted PDF to {len(base64_images)} images")
+        DOCUMENT_PAGES.inc(len(base64_images), payload="image")
+        return base64_images, None
+    except Exception as e:
+        logger.error(f"Error during PDF to image conversion: {str(e)}")
+        raise ValueError(f"Failed to convert PDF to images: {str(e)}")
+
+def _claim_file(file_path: str) -> str:
+    """A private path to the same PDF, unaffected by the original being deleted."""
+    claimed_path = f"{file_path}.{uuid.uuid4().hex}"
+    try:
+        os.link(file_path, claimed_path)
+    except OSError:
+        shutil.copyfile(file_path, claimed_path)
+    return claimed_path
+
+def _release_file(file_path: str) -> None:
+    try:
+        os.unlink(file_path)
+    except OSError as e:
+        logger.warning(f"Failed to remove temporary file {file_path}: {str(e)}")
+
+def _release_abandoned_claim(claim: asyncio.Future) -> None:
+    if not claim.cancelled() and claim.exception() is None:
+        _release_file(claim.result())
+
+async def _claim_file_async(file_path: str) -> str:
+    """_claim_file in a worker thread, since it may copy the whole PDF."""
+    claim = asyncio.ensure_future(run_in_threadpool(_claim_file, file_path))
+    try:
+        return await asyncio.shield(claim)
+    except asyncio.CancelledError:
+        # The thread can't be stopped; remove its link once it has been made
+        claim.add_done_callback(_release_abandoned_claim)
+        raise
+
+def _cache_key(file_path: str, prompt_sha256: str, model_class) -> str:
+    return extraction_cache_key(sha256_file(file_path), prompt_sha256, EXTRACTION_MODELS, model_class)
+
+async def _process_pdf_to_images(file_path: str, prompt_name: str, extract_func, model_class, data_type: str, progress=None):
     """Common PDF processing logic for both incident and PTW reports."""
+    progress = progress or (lambda stage, partial=None: None)
     try:
-        logger.info(f"Starting PDF processing for file: {file_path}")
-        
-        with open(prompt_path, "rb") as file:
-            prompt = file.read().decode("utf-8")
-
-        with open(file_path, "rb") as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            logger.info(f"PDF has {len(pdf_reader.pages)} pages")
-
-            # Check if PDF has extractable text
-            has_text = False
-            all_text = ""
-            for page in pdf_reader.pages:
-                text = page.extract_text()
-                if text and len(text.strip()) > 0:
-                    has_text = True
-                    all_text += text + "\n"
-                    
-            logger.info(f"PDF has extractable text: {has_text}")
-            
-            if has_text:
-                pass
-            
-            # Convert PDF to images for LLM processing
-            logger.info("Converting PDF to images...")
-            with tempfile.TemporaryDirectory() as temp_dir:
-                try:
-                    images = convert_from_path(file_path)
-                    logger.info(f"Converted PDF to {len(images)} images")
-                    
-                    # Save images to temporary directory
-                    for i, image in enumerate(images):
-                        image_path = os.path.join(temp_dir, f"page_{i + 1}.jpg")
-                        image.save(image_path, "JPEG")
-                        logger.info(f"Saved image: {image_path}")
-                    
-                    # Extract data using LLM
-                    logger.info(f"Extracting {data_type} data using LLM...")
-                    extracted_data = extract_func(temp_dir, prompt)
-                    logger.info(f"Successfully extracted {data_type} data")
-                    return extracted_data
-                    
-                except Exception as e:
-                    logger.error(f"Error during PDF to image conversion: {str(e)}")
-                    raise ValueError(f"Failed to convert PDF to images: {str(e)}")
+        prompt = prompt_registry.get(prompt_name)
+
+        # Identical PDFs with the same prompt and model reuse the earlier result
+        with span("extract.cache_lookup"):
+            cache_key = await run_cpu_bound(_cache_key, file_path, prompt.sha256, model_class)
+            cached_data = await run_cpu_bound(extraction_cache.get, cache_key, model_class)
+        if cached_data is not None:
+            logger.info(f"Using cached {data_type} extraction for {file_path}")
+            EXTRACTIONS.inc(document=data_type, outcome="cached")
+            progress("cached")
+            return cached_data
+
+        async def extract(pdf_path: str):
+            try:
+                progress("rendering")
+                with span("extract.prepare"):
+                    base64_images, document_text = await run_cpu_bound(_prepare_document, pdf_path, model_class)
+            finally:
+                _release_file(pdf_path)
+
+            # Extract data using LLM
+            progress("extracting")
+            logger.info(f"Extracting {data_type} data using LLM (prompt '{prompt.name}' version {prompt.version})...")
+            with span("extract.llm"):
+                extracted_data = await extract_func(
+                    prompt.text,
+                    base64_images=base64_images,
+                    document_text=document_text,
+                    on_partial=lambda fields: progress("extracting", fields),
+                )
+            logger.info(f"Successfully extracted {data_type} data")
+
+            with span("extract.cache_store"):
+                await run_cpu_bound(extraction_cache.set, cache_key, extracted_data)
+            EXTRACTIONS.inc(document=data_type, outcome="extracted")
+            return extracted_data
+
+        # The shared run can outlive the caller that started it (and that
+        # caller's temporary file), so it is started on its own link to the PDF.
+        # The link is made before joining the flight: there must be no await
+        # between checking for a run in flight and starting one.
+        claimed_path = await _claim_file_async(file_path)
+        claim_used = False
+
+        def start_extraction():
+            nonlocal claim_used
+            claim_used = True
+            return extract(claimed_path)
+
+        # The cache key covers the PDF's content hash, prompt and models, so an
+        # identical extraction already in flight is joined instead of repeated
+        if extraction_flight.is_running(cache_key):
+            progress("extracting")
+        try:
+            return await extraction_flight.do(cache_key, start_extraction)
+        finally:
+            if not claim_used:
+                # Joined a run in flight, which has its own link to the PDF
+                _release_file(claimed_path)
     except Exception as e:
+        EXTRACTIONS.inc(document=data_type, outcome="failed")
         logger.error(f"Error processing PDF file: {str(e)}")
         raise ValueError(f"Failed to process PDF file: {str(e)}")
 
-def process_ptw_report(file_path: str) -> PTWData:
+async def process_ptw_report(file_path: str, progress=None) -> PTWData:
     """Process PDF file and extract PTW data using LLM."""
-    return _process_pdf_to_images(file_path, PTW_PROMPT_PATH, extract_ptw_data, "PTW")
+    return await _process_pdf_to_images(file_path, PTW_PROMPT, extract_ptw_data, PTWData, "PTW", progress)
 
-def process_incident_report(file_path: str) -> AccidentData:
+async def process_incident_report(file_path: str, progress=None) -> AccidentData:
     """Process PDF file and extract accident data using LLM."""
-    return _process_pdf_to_images(file_path, INCIDENT_PROMPT_PATH, extract_incident_data, "accident")
+    return await _process_pdf_to_images(file_path, INCIDENT_PROMPT, extract_incident_data, AccidentData, "accident", progress)
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from enum import Enum
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_JOB_WORKERS = int(os.getenv("EXTRACTION_JOB_WORKERS", "4"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+# Reports the current stage of a running job, optionally with the result
+# fields extracted so far; safe to call from any thread
+ProgressCallback = Callable[..., None]
+
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+TERMINAL_STATUSES = {JobStatus.SUCCEEDED, JobStatus.FAILED}
+
+
+class Job(BaseModel):
+    """State of a background extraction job"""
+
+    id: str
+    kind: str
+    owner_id: str = Field(exclude=True)
+    status: JobStatus = JobStatus.QUEUED
+    stage: str = "queued"
+    partial: Optional[Dict[str, Any]] = None
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float = Field(default_factory=time.time)
+    updated_at: float = Field(default_factory=time.time)
+
+
+class JobManager:
+    """
+    In-process job queue for long-running extractions.
+
+    Jobs run as asyncio tasks, at most `max_workers` at a time; the CPU-bound
+    parts of each job still go through the PDF worker pool. Finished jobs are
+    kept for `retention_seconds` so clients can collect the result.
+    """
+
+    def __init__(self, max_workers: int = EXTRACTION_JOB_WORKERS, retention_seconds: int = JOB_RETENTION_SECONDS):
+        self.retention_seconds = retention_seconds
+        self._semaphore = asyncio.Semaphore(max_workers)
+        self._jobs: Dict[str, Job] = {}
+        self._waiters: Dict[str, asyncio.Event] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def submit(
+        self,
+        kind: str,
+        owner_id: str,
+        work: Callable[[ProgressCallback], Awaitable[Any]],
+    ) -> Job:
+        """Queue `work` and return its job immediately."""
+        self._purge_expired()
+
+        job = Job(id=str(uuid.uuid4()), kind=kind, owner_id=owner_id)
+        self._jobs[job.id] = job
+
+        task = asyncio.create_task(self._run(job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        logger.info(f"Queued {kind} job {job.id}")
+        return job
+
+    def get(self, job_id: str, owner_id: str) -> Optional[Job]:
+        """Return the job if it exists and belongs to `owner_id`."""
+        job = self._jobs.get(job_id)
+        if job is None or job.owner_id != owner_id:
+            return None
+        return job
+
+    async def watch(self, job_id: str, heartbeat_seconds: float = 15.0) -> AsyncIterator[Job]:
+        """Yield the job on every state change (or heartbeat) until it finishes."""
+        while True:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return
+            # Grab the waiter before yielding so no update can be missed
+            waiter = self._waiters.setdefault(job_id, asyncio.Event())
+            yield job
+            if job.status in TERMINAL_STATUSES:
+                return
+            try:
+                await asyncio.wait_for(waiter.wait(), timeout=heartbeat_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, job: Job, work: Callable[[ProgressCallback], Awaitable[Any]]) -> None:
+        loop = asyncio.get_running_loop()
+
+        def report(stage: str, partial: Optional[Dict[str, Any]] = None) -> None:
+            loop.call_soon_threadsafe(self._update, job, None, stage, partial)
+
+        async with self._semaphore:
+            self._update(job, JobStatus.RUNNING, "started")
+            try:
+                result = await work(report)
+                job.result = result.model_dump(mode="json") if isinstance(result, BaseModel) else result
+                self._update(job, JobStatus.SUCCEEDED, "done")
+                logger.info(f"{job.kind} job {job.id} succeeded")
+            except Exception as e:
+                logger.error(f"{job.kind} job {job.id} failed: {str(e)}")
+                job.error = str(e)
+                self._update(job, JobStatus.FAILED, "failed")
+
+    def _update(
+        self, job: Job, status: Optional[JobStatus], stage: str, partial: Optional[Dict[str, Any]] = None
+    ) -> None:
+        if job.status in TERMINAL_STATUSES:
+            return
+        if status is not None:
+            job.status = status
+        job.stage = stage
+        if partial is not None:
+            job.partial = jsonable_encoder(partial)
+        job.updated_at = time.time()
+        waiter = self._waiters.pop(job.id, None)
+        if waiter is not None:
+            waiter.set()
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.retention_seconds
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status in TERMINAL_STATUSES and job.updated_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            self._waiters.pop(job_id, None)
+
+
+job_manager = JobManager()
@@ -1,84 +1,503 @@
-import base64
+import asyncio
+import functools
 import json
 import os
 import logging
-from typing import Type, TypeVar
+import re
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple, Type, TypeVar, Union
 
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from jiter import from_json
+from openai import NOT_GIVEN, APIConnectionError, APIStatusError, AsyncOpenAI, OpenAIError
+from pydantic import BaseModel, TypeAdapter, ValidationError
 
 from db.models import AccidentData, PTWData
+from services.metrics import registry, span
+from services.rendering import IMAGE_MIME_TYPE
 
 logger = logging.getLogger(__name__)
 
 T = TypeVar('T', AccidentData, PTWData)
 
+# Receives the fields validated so far while a response is still streaming
+PartialCallback = Callable[[Dict[str, Any]], None]
+
 load_dotenv()
 
-client = OpenAI(
-    base_url="https://openrouter.ai/api/v1",
+EXTRACTION_MODEL = os.getenv("EXTRACTION_MODEL", "google/gemini-2.5-pro")
+
+# Cheaper, faster model tried first for PTW forms, text-layer PDFs and short
+# documents; it escalates to EXTRACTION_MODEL on failure or a sparse result.
+# Set it to EXTRACTION_MODEL to disable routing.
+EXTRACTION_FAST_MODEL = os.getenv("EXTRACTION_FAST_MODEL", "google/gemini-2.5-flash")
+FAST_MODEL_MAX_PAGES = int(os.getenv("FAST_MODEL_MAX_PAGES", "2"))
+# Fast results with fewer non-default fields than this are escalated
+FAST_MODEL_MIN_FILLED_RATIO = float(os.getenv("FAST_MODEL_MIN_FILLED_RATIO", "0.3"))
+
+# Identifies the model configuration extraction results depend on
+EXTRACTION_MODELS = f"{EXTRACTION_FAST_MODEL}>{EXTRACTION_MODEL}"
+
+# Full extraction attempts; with schema-constrained output a retry is only
+# needed for transport errors, 5xx/429 responses or a truncated response
+EXTRACTION_ATTEMPTS = int(os.getenv("EXTRACTION_ATTEMPTS", "2"))
+# Wait before retrying after a transport or server error, multiplied by the attempt number
+EXTRACTION_RETRY_BACKOFF_SECONDS = float(os.getenv("EXTRACTION_RETRY_BACKOFF_SECONDS", "1"))
+
+# One pooled, keep-alive HTTP client is shared by every LLM call, so
+# concurrent extractions reuse warm connections instead of new TLS handshakes
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "180"))
+
+# OpenAI-compatible endpoint; pointed at a local fake server by the benchmarks
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_KEEPALIVE_SECONDS,
+    ),
+    timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0),
+)
+
+client = AsyncOpenAI(
+    base_url=OPENROUTER_BASE_URL,
     api_key=os.getenv("OPENROUTER_API_KEY"),
+    http_client=http_client,
 )
 
-def generate_response(prompt: str) -> str:
-    completion = client.chat.completions.create(
-        extra_headers={
-                    "HTTP-Referer": "https://safety-advisor.vercel.app",
-                    "X-Title": "Global Safety Agent",
-                },
-        model="google/gemini-2.5-pro",
-        messages=[{"role": "user", "content": prompt}],
+EXTRA_HEADERS = {
+    "HTTP-Referer": "https://safety-advisor.vercel.app",
+    "X-Title": "Global Safety Agent",
+}
+
+
+class ModelStats:
+    """Per-model request counts, latency and token/cost usage, since process start."""
+
+    def __init__(self, window: int = 500):
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+        self._latencies: Dict[str, Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, model: str, latency_s: float, succeeded: bool, usage: Any = None) -> None:
+        with self._lock:
+            totals = self._totals[model]
+            totals["requests"] += 1
+            totals["failures"] += 0 if succeeded else 1
+            totals["latency_s"] += latency_s
+            if usage is not None:
+                totals["prompt_tokens"] += usage.prompt_tokens or 0
+                totals["completion_tokens"] += usage.completion_tokens or 0
+                # OpenRouter reports the charged cost (USD) alongside the token counts
+                totals["cost_usd"] += (usage.model_extra or {}).get("cost") or 0.0
+            self._latencies[model].append(latency_s)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Totals per model, plus mean/p50/p95 latency over recent requests."""
+        with self._lock:
+            result = {}
+            for model, totals in self._totals.items():
+                latencies = sorted(self._latencies[model])
+                result[model] = {
+                    **totals,
+                    "mean_latency_s": totals["latency_s"] / totals["requests"],
+                    "p50_latency_s": latencies[len(latencies) // 2],
+                    "p95_latency_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+                }
+            return result
+
+
+model_stats = ModelStats()
+
+LLM_REQUEST_SECONDS = registry.histogram("llm_request_seconds", "LLM request latency until the last chunk", ("model", "outcome"))
+LLM_FIRST_TOKEN_SECONDS = registry.histogram("llm_first_token_seconds", "LLM latency until the first streamed text", ("model",))
+LLM_TOKENS = registry.counter("llm_tokens", "LLM tokens used", ("model", "kind"))
+LLM_COST_USD = registry.counter("llm_cost_usd", "LLM cost reported by OpenRouter, in USD", ("model",))
+# Re-requests after a failed attempt, field repairs and fast-to-large model escalations
+LLM_RETRIES = registry.counter("llm_retries", "Extra LLM requests made to get valid data", ("model", "reason"))
+
+
+async def close_client() -> None:
+    """Close the pooled HTTP connections."""
+    await client.close()
+
+
+async def stream_response(
+    prompt: Union[str, List[Dict[str, Any]]],
+    response_format: Optional[Dict[str, Any]] = None,
+    model: str = EXTRACTION_MODEL,
+) -> AsyncIterator[str]:
+    """Yield the completion text as it is generated, recording the model's latency and usage."""
+    started = time.monotonic()
+    succeeded = False
+    usage = None
+    first_token = True
+    try:
+        stream = await client.chat.completions.create(
+            extra_headers=EXTRA_HEADERS,
+            extra_body={"usage": {"include": True}},
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            response_format=response_format or NOT_GIVEN,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        try:
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta.content:
+                    if first_token:
+                        LLM_FIRST_TOKEN_SECONDS.observe(time.monotonic() - started, model=model)
+                        first_token = False
+                    yield chunk.choices[0].delta.content
+        finally:
+            # Closing early (e.g. on malformed output) releases the connection
+            await stream.close()
+        succeeded = True
+    finally:
+        latency_s = time.monotonic() - started
+        model_stats.record(model, latency_s, succeeded, usage)
+        LLM_REQUEST_SECONDS.observe(latency_s, model=model, outcome="success" if succeeded else "failure")
+        if usage is not None:
+            LLM_TOKENS.inc(usage.prompt_tokens or 0, model=model, kind="prompt")
+            LLM_TOKENS.inc(usage.completion_tokens or 0, model=model, kind="completion")
+            LLM_COST_USD.inc((usage.model_extra or {}).get("cost") or 0.0, model=model)
+
+
+async def generate_response(
+    prompt: Union[str, List[Dict[str, Any]]],
+    response_format: Optional[Dict[str, Any]] = None,
+    model: str = EXTRACTION_MODEL,
+) -> str:
+    return "".join([text async for text in stream_response(prompt, response_format, model)])
+
+
+def _strict_property(schema: Dict[str, Any]) -> Dict[str, Any]:
+    # Strict schemas don't support defaults; titles are noise in the prompt
+    return {key: value for key, value in schema.items() if key not in ("default", "title")}
+
+
+@functools.lru_cache(maxsize=None)
+def json_schema_format(model_class: type, fields: Optional[Tuple[str, ...]] = None) -> Dict[str, Any]:
+    """
+    Structured-output response format generated from a Pydantic model.
+
+    Args:
+        model_class: Model the response must match
+        fields: Only ask for these fields (defaults to all of them)
+
+    Returns:
+        Dict[str, Any]: A strict `json_schema` response_format; every field is
+        required, so the model states defaults explicitly
+    """
+    properties = model_class.model_json_schema()["properties"]
+    if fields is not None:
+        properties = {name: properties[name] for name in fields}
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": model_class.__name__,
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {name: _strict_property(prop) for name, prop in properties.items()},
+                "required": list(properties),
+                "additionalProperties": False,
+            },
+        },
+    }
+
+
+# A leading ```json fence, and a closing fence that may still be arriving
+_FENCE_PATTERN = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*`{1,3}\s*$")
+
+
+def _strip_fences(text: str) -> str:
+    """Drop one leading ```json fence and one trailing fence, leaving backticks inside values alone."""
+    return _FENCE_PATTERN.sub("", text)
+
+
+@functools.lru_cache(maxsize=None)
+def _field_adapter(model_class: type, name: str) -> TypeAdapter:
+    return TypeAdapter(model_class.model_fields[name].annotation)
+
+
+class StreamingJSONParser:
+    """
+    Parses a JSON object response while it streams in.
+
+    Every fed chunk that may close a value re-parses the buffer in partial
+    mode; top-level fields whose value is complete are validated against the
+    model on their own. Syntax errors raise ValueError straight away, so a
+    broken response can be abandoned mid-stream; invalid field values are
+    left out of `fields` and collected in `errors` for a repair pass.
+    """
+
+    def __init__(self, model_class: Type[T]):
+        self.model_class = model_class
+        self.fields: Dict[str, Any] = {}
+        self.errors: Dict[str, str] = {}
+        self._buffer = ""
+
+    def feed(self, text: str) -> Dict[str, Any]:
+        """Add a chunk of the response and return the fields newly completed by it."""
+        self._buffer += text
+        if not any(char in text for char in ",}]"):
+            return {}
+        data = self._parse(partial=True)
+        # The last key's value may still be growing
+        complete = list(data)[:-1]
+        return self._validate({key: data[key] for key in complete if key not in self.fields and key not in self.errors})
+
+    def finish(self) -> Dict[str, Any]:
+        """Parse the complete response, validating any remaining fields."""
+        data = self._parse(partial=False)
+        self._validate({key: value for key, value in data.items() if key not in self.fields and key not in self.errors})
+        return data
+
+    def _parse(self, partial: bool) -> Dict[str, Any]:
+        body = _strip_fences(self._buffer)
+        if not body:
+            if partial:
+                return {}
+            raise ValueError("Empty response")
+        if not body.startswith("{"):
+            raise ValueError(f"Response is not a JSON object: {body[:40]!r}")
+        data = from_json(body.encode("utf-8"), partial_mode="trailing-strings" if partial else "off")
+        if not isinstance(data, dict):
+            raise ValueError("Response is not a JSON object")
+        return data
+
+    def _validate(self, fields: Dict[str, Any]) -> Dict[str, Any]:
+        validated = {}
+        for name, value in fields.items():
+            if name not in self.model_class.model_fields:
+                continue
+            try:
+                validated[name] = _field_adapter(self.model_class, name).validate_python(value)
+            except ValidationError as e:
+                logger.warning(f"Invalid value for field '{name}' in LLM response: {value!r}")
+                self.errors[name] = e.errors()[0]["msg"]
+        self.fields.update(validated)
+        return validated
+
+
+async def _stream_json(
+    content: Union[str, List[Dict[str, Any]]],
+    model_class: Type[T],
+    model: str,
+    fields: Optional[Tuple[str, ...]] = None,
+    on_partial: Optional[PartialCallback] = None,
+) -> Dict[str, Any]:
+    parser = StreamingJSONParser(model_class)
+    async for text in stream_response(content, json_schema_format(model_class, fields), model):
+        completed = parser.feed(text)
+        if completed and on_partial is not None:
+            on_partial(dict(parser.fields))
+    return parser.finish()
+
+
+def _field_errors(model_class: Type[T], data: Dict[str, Any]) -> Dict[str, str]:
+    """Validation error message per top-level field of `data`."""
+    try:
+        model_class(**data)
+        return {}
+    except ValidationError as e:
+        return {str(error["loc"][0]): error["msg"] for error in e.errors() if error["loc"]}
+
+
+async def _repair_fields(
+    model_class: Type[T],
+    model: str,
+    data: Dict[str, Any],
+    errors: Dict[str, str],
+    document_text: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Re-ask the model for only the invalid fields, as a text-only request.
+
+    The valid fields (and the document text layer, if there is one) are sent
+    as context instead of the page images.
+    """
+    names = tuple(sorted(errors))
+    logger.info(f"Repairing invalid fields: {', '.join(names)}")
+    problems = "\n".join(
+        f"- {name} ({model_class.model_fields[name].description}): {errors[name]}; "
+        f"got {json.dumps(data.get(name), default=str)}"
+        for name in names
+    )
+    valid = {name: value for name, value in data.items() if name not in errors}
+    prompt = (
+        "These fields extracted from a document are missing or invalid:\n"
+        f"{problems}\n\n"
+        "The other extracted fields are:\n"
+        f"{json.dumps(valid, default=str)}\n\n"
+        "Return a JSON object with a valid value for each listed field only."
+    )
+    if document_text:
+        prompt += f"\n\nDocument text extracted from the PDF:\n\n{document_text}"
+
+    repaired = await _stream_json(prompt, model_class, model, names)
+    return {**data, **{name: repaired[name] for name in names if name in repaired}}
+
+
+def choose_extraction_model(
+    model_class: Type[T], base64_images: Optional[List[str]], document_text: Optional[str]
+) -> str:
+    """Fast model for PTW forms, text-layer PDFs and short documents; the large model otherwise."""
+    if model_class is PTWData or document_text or len(base64_images or []) <= FAST_MODEL_MAX_PAGES:
+        return EXTRACTION_FAST_MODEL
+    return EXTRACTION_MODEL
+
+
+def _filled_ratio(data: BaseModel) -> float:
+    """Share of fields that differ from their default."""
+    fields = type(data).model_fields
+    filled = sum(
+        1 for name, field in fields.items() if field.is_required() or getattr(data, name) != field.default
     )
-    return completion.choices[0].message.content
-
-def _extract_data(images_folder_path: str, prompt: str, model_class: Type[T], data_type: str) -> T:
-    """Common extraction logic for both incident and PTW data."""
-    # Load and encode images
-    image_files = [
-        f
-        for f in os.listdir(images_folder_path)
-        if f.lower().endswith((".png", ".jpg", ".jpeg"))
-    ]
-    base64_images = []
-
-    for image_file in image_files:
-        with open(os.path.join(images_folder_path, image_file), "rb") as f:
-            base64_images.append(base64.b64encode(f.read()).decode("utf-8"))
-
-    # Build content with all images
-    content = [{"type": "text", "text": prompt}]
-    for img in base64_images:
+    return filled / len(fields)
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether a failed request is worth retrying: connection problems, timeouts, rate limits and 5xx."""
+    if isinstance(error, APIStatusError):
+        return error.status_code >= 500 or error.status_code in (408, 429)
+    return isinstance(error, (APIConnectionError, httpx.TransportError))
+
+
+async def _extract_with_model(
+    model: str,
+    content: List[Dict[str, Any]],
+    model_class: Type[T],
+    data_type: str,
+    document_text: Optional[str],
+    on_partial: Optional[PartialCallback],
+    attempts: int,
+    allow_defaults: bool,
+) -> T:
+    for attempt in range(attempts):
+        try:
+            data = await _stream_json(content, model_class, model, on_partial=on_partial)
+            logger.info(f"LLM response from {model}: {data}")
+            break
+        except (ValueError, APIStatusError, APIConnectionError, httpx.TransportError) as e:
+            transient = _is_transient(e)
+            if not transient and not isinstance(e, ValueError):
+                raise
+            logger.error(f"Error getting LLM response from {model}: {e}")
+            if attempt == attempts - 1:
+                raise ValueError(
+                    f"Failed to get valid {data_type} data after {attempts} attempts. Last error: {e}"
+                )
+            LLM_RETRIES.inc(model=model, reason="transport_error" if transient else "invalid_response")
+            if transient:
+                await asyncio.sleep(EXTRACTION_RETRY_BACKOFF_SECONDS * (attempt + 1))
+
+    errors = _field_errors(model_class, data)
+    if errors:
+        LLM_RETRIES.inc(model=model, reason="field_repair")
+        try:
+            with span("llm.repair"):
+                data = await _repair_fields(model_class, model, data, errors, document_text)
+        except ValueError as e:
+            logger.error(f"Error repairing {data_type} fields: {e}")
+        errors = _field_errors(model_class, data)
+
+    # Fields that are still invalid fall back to their defaults where they have one
+    if allow_defaults:
+        for name in errors:
+            if not model_class.model_fields[name].is_required():
+                logger.warning(f"Using default for invalid {data_type} field '{name}'")
+                data.pop(name, None)
+
+    try:
+        return model_class(**data)
+    except ValidationError as e:
+        raise ValueError(f"Failed to get valid {data_type} data: {e}")
+
+
+async def _extract_data(
+    prompt: str,
+    model_class: Type[T],
+    data_type: str,
+    base64_images: Optional[List[str]] = None,
+    document_text: Optional[str] = None,
+    on_partial: Optional[PartialCallback] = None,
+) -> T:
+    """Common extraction logic for both incident and PTW data.
+
+    The document is given either as page images or as its extracted text layer.
+    The response is constrained to the model's JSON schema, streamed and parsed
+    incrementally; `on_partial` receives the fields validated so far as they
+    arrive. Fields that still fail validation are repaired with a text-only
+    follow-up request instead of resending the document.
+
+    Small documents go to the fast model first; the large model is only used
+    when the fast one fails, leaves fields invalid or returns a sparse result.
+    """
+    # The instruction block is identical for every document of a kind; marking
+    # it cacheable lets providers reuse the processed prefix instead of billing it again
+    content = [{"type": "text", "text": prompt, "cache_control": {"type": "ephemeral"}}]
+    if document_text:
+        content.append(
+            {"type": "text", "text": f"Document text extracted from the PDF:\n\n{document_text}"}
+        )
+
+    # Add all page images
+    for img in base64_images or []:
         content.append(
-            {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{img}"}}
+            {"type": "image_url", "image_url": {"url": f"data:{IMAGE_MIME_TYPE};base64,{img}"}}
         )
 
-    # Try up to 3 times to get valid data
-    for attempt in range(3):
+    model = choose_extraction_model(model_class, base64_images, document_text)
+    if model != EXTRACTION_MODEL:
         try:
-            # Make API call
-            completion = generate_response(content)
-
-            # Parse JSON response
-            response_text = completion.replace("```json", "").replace("```", "")
-            data = json.loads(response_text)
-            logger.info(f"LLM response: {data}")
-            
-            # Validate against Pydantic model
-            validated_data = model_class(**data)
-            return validated_data
-            
-        except (json.JSONDecodeError, ValueError) as e:
-            logger.error(f"Error parsing LLM response: {e}")
-            if attempt == 2:  # Last attempt
-                raise ValueError(f"Failed to get valid {data_type} data after 3 attempts. Last error: {e}")
-            continue
-    
-    raise ValueError(f"Failed to get valid {data_type} data after 3 attempts")
-
-def extract_incident_data(images_folder_path: str, prompt: str) -> AccidentData:
-    """Extract incident data from images using LLM."""
-    return _extract_data(images_folder_path, prompt, AccidentData, "accident")
-
-def extract_ptw_data(images_folder_path: str, prompt: str) -> PTWData:
-    """Extract PTW data from images using LLM."""
-    return _extract_data(images_folder_path, prompt, PTWData, "PTW")
\ No newline at end of file
+            result = await _extract_with_model(
+                model, content, model_class, data_type, document_text, on_partial,
+                attempts=1, allow_defaults=False,
+            )
+            filled_ratio = _filled_ratio(result)
+            if filled_ratio >= FAST_MODEL_MIN_FILLED_RATIO:
+                return result
+            logger.info(
+                f"Escalating {data_type} extraction to {EXTRACTION_MODEL}: "
+                f"only {filled_ratio:.0%} of fields filled by {model}"
+            )
+            LLM_RETRIES.inc(model=model, reason="escalated_sparse")
+        except (ValueError, OpenAIError, httpx.TransportError) as e:
+            logger.warning(f"Escalating {data_type} extraction to {EXTRACTION_MODEL} after {model} failed: {e}")
+            LLM_RETRIES.inc(model=model, reason="escalated_failure")
+
+    return await _extract_with_model(
+        EXTRACTION_MODEL, content, model_class, data_type, document_text, on_partial,
+        attempts=EXTRACTION_ATTEMPTS, allow_defaults=True,
+    )
+
+
+async def extract_incident_data(
+    prompt: str,
+    base64_images: Optional[List[str]] = None,
+    document_text: Optional[str] = None,
+    on_partial: Optional[PartialCallback] = None,
+) -> AccidentData:
+    """Extract incident data from page images or document text using LLM."""
+    return await _extract_data(prompt, AccidentData, "accident", base64_images, document_text, on_partial)
+
+async def extract_ptw_data(
+    prompt: str,
+    base64_images: Optional[List[str]] = None,
+    document_text: Optional[str] = None,
+    on_partial: Optional[PartialCallback] = None,
+) -> PTWData:
+    """Extract PTW data from page images or document text using LLM."""
+    return await _extract_data(prompt, PTWData, "PTW", base64_images, document_text, on_partial)
@@ -0,0 +1,306 @@
+import asyncio
+import functools
+import inspect
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+METRIC_PREFIX = "safetyadvisor_"
+
+# Latency buckets (seconds) covering cache hits up to multi-page LLM extractions
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+# (label values, value) of one sample
+Sample = Tuple[Dict[str, str], float]
+# (name, type, help, samples) produced by a collector at scrape time
+CollectedMetric = Tuple[str, str, str, List[Sample]]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = METRIC_PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: Tuple[str, ...], **extra: str) -> Dict[str, str]:
+        return {**dict(zip(self.labelnames, key)), **extra}
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        return [
+            f"{self.name}_total{_format_labels(self._labels(key))} {_format_value(value)}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram(_Metric):
+    """Bucketed observations (e.g. latencies) per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # Per label set: [count per bucket..., sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0.0] * (len(self.buckets) + 1)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values[index] += 1
+                    break
+            values[-1] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        lines = []
+        for key, counts in sorted(values.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                labels = self._labels(key, le=_format_value(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(labels)} {_format_value(cumulative)}")
+            lines.append(f"{self.name}_sum{_format_labels(self._labels(key))} {_format_value(counts[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(self._labels(key))} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics, rendered in the Prometheus text exposition format.
+
+    Counters and histograms are updated in place by the code they measure;
+    collectors are called at scrape time for values that are cheaper to read
+    than to track (e.g. prompt versions).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[CollectedMetric]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def collector(self, collect: Callable[[], Iterable[CollectedMetric]]) -> None:
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            try:
+                collected = list(collect())
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, help, samples in collected:
+                name = METRIC_PREFIX + name
+                lines.extend([f"# HELP {name} {help}", f"# TYPE {name} {kind}"])
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(value)}" for labels, value in samples)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+SPAN_SECONDS = registry.histogram(
+    "span_seconds", "Time spent in instrumented stages (auth, extraction, LLM, DB, chat)", ("span",)
+)
+SPAN_ERRORS = registry.counter("span_errors", "Instrumented stages that raised", ("span",))
+SPAN_CANCELLATIONS = registry.counter(
+    "span_cancellations", "Instrumented stages cancelled before finishing (e.g. client disconnects)", ("span",)
+)
+HTTP_REQUESTS = registry.counter("http_requests", "HTTP requests handled", ("method", "route", "status"))
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_seconds", "HTTP request latency until the response is fully sent", ("method", "route")
+)
+
+# Spans finished while handling the current request, for its Server-Timing header
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+# Callbacks notified with (span name, duration in seconds) whenever a span finishes
+_span_listeners: List[Callable[[str, float], None]] = []
+
+
+def add_span_listener(listener: Callable[[str, float], None]) -> None:
+    """Register a callback for finished spans (e.g. to collect raw timings in benchmarks)."""
+    _span_listeners.append(listener)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """
+    Time a stage of the current request.
+
+    The duration is recorded in the span histogram and, inside an HTTP
+    request, reported in the response's Server-Timing header (if the span
+    finishes before the response starts). Cancellation is counted apart from
+    errors, and a closed generator is neither.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SPAN_ERRORS.inc(span=name)
+        raise
+    except asyncio.CancelledError:
+        SPAN_CANCELLATIONS.inc(span=name)
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        SPAN_SECONDS.observe(duration, span=name)
+        spans = _request_spans.get()
+        if spans is not None:
+            spans.append((name, duration))
+        for listener in _span_listeners:
+            listener(name, duration)
+
+
+def timed(name: str):
+    """Decorator wrapping every call of a sync or async function in `span(name)`."""
+
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def server_timing(spans: List[Tuple[str, float]]) -> str:
+    """Server-Timing header value, with repeated spans summed (e.g. `db.get_incident_by_id;dur=12.3`)."""
+    totals: Dict[str, float] = defaultdict(float)
+    for name, duration in spans:
+        totals[name] += duration
+    return ", ".join(f"{name};dur={duration * 1000:.1f}" for name, duration in totals.items())
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording request counts and latency per route, and
+    adding a Server-Timing header with the spans of each request.
+
+    Written as plain ASGI (not BaseHTTPMiddleware) so streaming responses are
+    passed through untouched and timed until their last chunk is sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        spans: List[Tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                spans.append(("app", time.perf_counter() - started))
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(spans).encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            # Label by route template, not raw path, to keep label cardinality bounded
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            HTTP_REQUESTS.inc(method=scope["method"], route=route_path, status=str(status_code))
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, method=scope["method"], route=route_path)
@@ -0,0 +1,96 @@
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict
+
+from pydantic import BaseModel
+
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Resolved from this file, so prompts load regardless of the working directory
+PROMPTS_DIR = Path(os.getenv("PROMPTS_DIR", Path(__file__).resolve().parent.parent / "prompts"))
+# Re-read prompt files when they change on disk (for development)
+PROMPT_HOT_RELOAD = os.getenv("PROMPT_HOT_RELOAD", "false").lower() == "true"
+
+PROMPT_SUFFIX = "_prompt.txt"
+
+
+class Prompt(BaseModel):
+    """A loaded prompt and its content hash"""
+
+    name: str
+    text: str
+    sha256: str
+    mtime: float
+
+    @property
+    def version(self) -> str:
+        """Short content hash, used in cache keys, logs and metrics."""
+        return self.sha256[:12]
+
+
+class PromptRegistry:
+    """
+    Prompts loaded once from `<name>_prompt.txt` files in a directory.
+
+    Each prompt is read, decoded and hashed when the registry is created; with
+    `hot_reload` a prompt whose file changed is reloaded on its next lookup.
+    """
+
+    def __init__(self, directory: Path, hot_reload: bool = False):
+        self.directory = directory
+        self.hot_reload = hot_reload
+        self._lock = threading.Lock()
+        self._prompts: Dict[str, Prompt] = {}
+        for path in sorted(directory.glob(f"*{PROMPT_SUFFIX}")):
+            self._load(path.name[: -len(PROMPT_SUFFIX)])
+
+    def _path(self, name: str) -> Path:
+        return self.directory / f"{name}{PROMPT_SUFFIX}"
+
+    def _load(self, name: str) -> Prompt:
+        path = self._path(name)
+        content = path.read_bytes()
+        prompt = Prompt(
+            name=name,
+            text=content.decode("utf-8"),
+            sha256=hashlib.sha256(content).hexdigest(),
+            mtime=path.stat().st_mtime,
+        )
+        self._prompts[name] = prompt
+        logger.info(f"Loaded prompt '{name}' (version {prompt.version})")
+        return prompt
+
+    def get(self, name: str) -> Prompt:
+        """
+        Return a prompt by name.
+
+        Raises:
+            ValueError: If there is no prompt with that name
+        """
+        with self._lock:
+            prompt = self._prompts.get(name)
+            if prompt is None:
+                raise ValueError(f"Unknown prompt: {name}")
+            if self.hot_reload and self._path(name).stat().st_mtime != prompt.mtime:
+                prompt = self._load(name)
+            return prompt
+
+    def versions(self) -> Dict[str, str]:
+        """Current version of every prompt, by name."""
+        return {name: self.get(name).version for name in list(self._prompts)}
+
+
+prompt_registry = PromptRegistry(PROMPTS_DIR, PROMPT_HOT_RELOAD)
+
+# Exposes the prompt versions in use, to line up metric changes with prompt edits
+registry.collector(lambda: [(
+    "prompt_info",
+    "gauge",
+    "Loaded extraction prompts and their versions",
+    [({"name": name, "version": version}, 1.0) for name, version in prompt_registry.versions().items()],
+)])
@@ -0,0 +1,181 @@
+import base64
+import io
+import logging
+import math
+import os
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pdf2image import convert_from_path
+from PIL import Image
+
+from services.metrics import span
+
+logger = logging.getLogger(__name__)
+
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", "150"))
+PDF_RENDER_GRAYSCALE = os.getenv("PDF_RENDER_GRAYSCALE", "false").lower() == "true"
+PDF_RENDER_MAX_SIDE = int(os.getenv("PDF_RENDER_MAX_SIDE", "2000"))
+PDF_RENDER_JPEG_QUALITY = int(os.getenv("PDF_RENDER_JPEG_QUALITY", "85"))
+
+# Large packs are rendered in chunks whose decoded bitmaps fit the memory
+# budget; pages within a chunk are split across pdftoppm processes.
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "30"))
+PDF_RENDER_MEMORY_BUDGET_MB = int(os.getenv("PDF_RENDER_MEMORY_BUDGET_MB", "256"))
+PDF_RENDER_THREADS = int(os.getenv("PDF_RENDER_THREADS", str(min(4, os.cpu_count() or 1))))
+
+# Low resolution used to judge pages without a text layer (blank, photo, scan)
+PAGE_THUMBNAIL_DPI = int(os.getenv("PAGE_THUMBNAIL_DPI", "20"))
+INK_THRESHOLD = 200
+
+IMAGE_MIME_TYPE = "image/jpeg"
+
+POINTS_PER_INCH = 72.0
+
+# (width, height) of a PDF page in points
+PageSize = Tuple[float, float]
+# (grayscale entropy in bits, share of dark "ink" pixels) of a rendered page
+PageImageStats = Tuple[float, float]
+
+
+def encode_page(image: Image.Image) -> str:
+    """Downscale a rendered page to the size cap and base64 encode it as JPEG in memory."""
+    if max(image.size) > PDF_RENDER_MAX_SIDE:
+        image.thumbnail((PDF_RENDER_MAX_SIDE, PDF_RENDER_MAX_SIDE))
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=PDF_RENDER_JPEG_QUALITY, optimize=True)
+    return base64.b64encode(buffer.getvalue()).decode("utf-8")
+
+
+def _bitmap_bytes(page_size: PageSize, dpi: int) -> int:
+    """Estimated size of a decoded page bitmap rendered at `dpi`."""
+    channels = 1 if PDF_RENDER_GRAYSCALE else 3
+    width_px = page_size[0] / POINTS_PER_INCH * dpi
+    height_px = page_size[1] / POINTS_PER_INCH * dpi
+    return int(width_px * height_px * channels)
+
+
+def _render_dpi(page_sizes: Sequence[PageSize], budget_bytes: int) -> int:
+    """Configured DPI, lowered if the largest page alone would exceed the budget."""
+    largest = max(page_sizes, key=lambda size: size[0] * size[1])
+    largest_bytes = _bitmap_bytes(largest, PDF_RENDER_DPI)
+    if largest_bytes <= budget_bytes:
+        return PDF_RENDER_DPI
+    return max(36, int(PDF_RENDER_DPI * math.sqrt(budget_bytes / largest_bytes)))
+
+
+def _plan_chunks(page_numbers: Sequence[int], page_bytes: Sequence[int], budget_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Group pages into contiguous (first_page, last_page) ranges whose combined
+    bitmap size stays within the memory budget.
+    """
+    chunks: List[Tuple[int, int]] = []
+    start = previous = None
+    chunk_bytes = 0
+
+    for page_number, size in zip(page_numbers, page_bytes):
+        contiguous = previous is not None and page_number == previous + 1
+        if start is not None and (not contiguous or chunk_bytes + size > budget_bytes):
+            chunks.append((start, previous))
+            start = None
+        if start is None:
+            start = page_number
+            chunk_bytes = 0
+        chunk_bytes += size
+        previous = page_number
+
+    if start is not None:
+        chunks.append((start, previous))
+    return chunks
+
+
+def _contiguous_ranges(page_numbers: Sequence[int]) -> List[Tuple[int, int]]:
+    ranges: List[Tuple[int, int]] = []
+    for page_number in page_numbers:
+        if ranges and page_number == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], page_number)
+        else:
+            ranges.append((page_number, page_number))
+    return ranges
+
+
+def page_image_stats(file_path: str, page_numbers: Sequence[int]) -> Dict[int, PageImageStats]:
+    """
+    Render the given pages as small grayscale thumbnails and measure them.
+
+    Returns:
+        Dict[int, PageImageStats]: Entropy and ink coverage per page number
+    """
+    stats: Dict[int, PageImageStats] = {}
+    for first_page, last_page in _contiguous_ranges(sorted(page_numbers)):
+        images = convert_from_path(
+            file_path,
+            dpi=PAGE_THUMBNAIL_DPI,
+            grayscale=True,
+            first_page=first_page,
+            last_page=last_page,
+            thread_count=min(PDF_RENDER_THREADS, last_page - first_page + 1),
+        )
+        for page_number, image in zip(range(first_page, last_page + 1), images):
+            histogram = image.convert("L").histogram()
+            ink_ratio = sum(histogram[:INK_THRESHOLD]) / max(1, sum(histogram))
+            stats[page_number] = (image.entropy(), ink_ratio)
+            image.close()
+    return stats
+
+
+def render_pdf_pages(
+    file_path: str, page_sizes: Sequence[PageSize], page_numbers: Optional[Sequence[int]] = None
+) -> Iterator[str]:
+    """
+    Render a PDF into base64 encoded JPEGs, in page order.
+
+    Args:
+        file_path: Path of the PDF file
+        page_sizes: (width, height) in points of every page in the document
+        page_numbers: 1-based pages to render (defaults to every page)
+
+    At most PDF_MAX_PAGES pages are rendered. Pages are rendered in chunks
+    whose decoded bitmaps fit PDF_RENDER_MEMORY_BUDGET_MB, each chunk split
+    across PDF_RENDER_THREADS pdftoppm processes, and every chunk is encoded
+    and released before the next one is rendered. Nothing is written to disk.
+    """
+    if not page_sizes:
+        return
+
+    page_numbers = sorted(page_numbers) if page_numbers is not None else list(range(1, len(page_sizes) + 1))
+    if not page_numbers:
+        return
+    if len(page_numbers) > PDF_MAX_PAGES:
+        logger.warning(f"Asked to render {len(page_numbers)} pages, only rendering the first {PDF_MAX_PAGES}")
+        page_numbers = page_numbers[:PDF_MAX_PAGES]
+
+    budget_bytes = PDF_RENDER_MEMORY_BUDGET_MB * 1024 * 1024
+    selected_sizes = [page_sizes[n - 1] for n in page_numbers]
+    dpi = _render_dpi(selected_sizes, budget_bytes)
+    if dpi != PDF_RENDER_DPI:
+        logger.warning(f"Lowering render DPI to {dpi} to stay within the memory budget")
+
+    page_bytes = [_bitmap_bytes(size, dpi) for size in selected_sizes]
+    chunks = _plan_chunks(page_numbers, page_bytes, budget_bytes)
+    logger.info(f"Rendering {len(page_numbers)} pages at {dpi} DPI in {len(chunks)} chunk(s)")
+
+    for first_page, last_page in chunks:
+        with span("render.rasterise"):
+            images = convert_from_path(
+                file_path,
+                dpi=dpi,
+                grayscale=PDF_RENDER_GRAYSCALE,
+                first_page=first_page,
+                last_page=last_page,
+                thread_count=min(PDF_RENDER_THREADS, last_page - first_page + 1),
+            )
+        for page_number, image in zip(range(first_page, last_page + 1), images):
+            with span("render.encode"):
+                encoded = encode_page(image)
+            image.close()
+            logger.info(f"Rendered page {page_number} ({len(encoded)} base64 bytes)")
+            yield encoded
+        del images
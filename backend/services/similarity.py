@@ -0,0 +1,631 @@
+import functools
+import heapq
+import html
+import logging
+import math
+import os
+import re
+import threading
+import zlib
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Protocol, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from db.models import PTWData
+from db.queries import add_insert_listener
+from services.snapshot import IncidentSnapshot, incident_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Embedding model: "openai" (any OpenAI-compatible embeddings API), "sentence-transformers"
+# (a local model) or "hashing" (offline hashed features, for tests and air-gapped runs)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai").lower()
+# Model name for the backend; defaults to text-embedding-3-small or all-MiniLM-L6-v2
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "")
+EMBEDDING_BASE_URL = os.getenv("EMBEDDING_BASE_URL") or None
+# Texts sent per embeddings API request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "256"))
+# Embedding width, stored as float16: 512 bytes per incident. API models that
+# support it (text-embedding-3-*) are asked for this many dimensions.
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "256"))
+# Texts embedded per vectorised pass; bounds the float64 accumulator to a few MB
+EMBED_CHUNK_SIZE = 4096
+
+# Incident columns that describe the work and hazards, embedded for retrieval
+INCIDENT_TEXT_FIELDS = [
+    "incident_description",
+    "task_being_performed",
+    "tools_used",
+    "equipment_involved_affected",
+    "incident_location_on_vessel",
+    "vessel_name",
+]
+
+# Columns returned for each similar incident
+SIMILAR_INCIDENT_FIELDS = [
+    "id",
+    "date",
+    "time_of_day",
+    "vessel_name",
+    "incident_location_on_vessel",
+    "incident_description",
+    "tools_used",
+    "injury_status",
+]
+
+# Structured fields matched exactly between permits and incidents
+FACET_FIELDS = ["vessel_name", "ptw_type"]
+
+# BM25 candidates passed on to embedding scoring
+CANDIDATE_LIMIT = 500
+# Incidents scored with embeddings when BM25 finds no lexical match at all
+FALLBACK_SCAN_LIMIT = 5000
+
+# Blend of the final ranking score
+VECTOR_WEIGHT = 0.6
+LEXICAL_WEIGHT = 0.4
+VESSEL_BOOST = 0.1
+PTW_TYPE_BOOST = 0.05
+
+# Work that makes a permit HOT WORK, as classified in incident ptw_type
+HOT_WORK_TERMS = {"weld", "welding", "cutting", "grinding", "grinder", "torch", "burning", "brazing", "hot"}
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "into", "is", "it",
+    "of", "on", "or", "the", "to", "was", "were", "with",
+}
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+def index_terms(text: str) -> List[str]:
+    """Tokens used for lexical matching: no stopwords or single characters."""
+    return [token for token in tokenize(text) if len(token) > 1 and token not in STOPWORDS]
+
+
+def normalise_facet(value: Any) -> str:
+    return " ".join(str(value or "").lower().split())
+
+
+def infer_ptw_type(ptw: PTWData) -> str:
+    """Classify a permit as HOT WORK or COLD WORK from its description and equipment."""
+    terms = set(tokenize(f"{ptw.description_of_work} {ptw.equipment_required}"))
+    return "HOT WORK" if terms & HOT_WORK_TERMS else "COLD WORK"
+
+
+class TextEmbedder(Protocol):
+    """Turns texts into L2-normalised float16 vectors of width `dim`."""
+
+    dim: int
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray: ...
+
+
+def _normalised_float16(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float16)
+
+
+class OpenAIEmbedder:
+    """Embeddings from an OpenAI-compatible API (OpenAI, OpenRouter or a self-hosted server)."""
+
+    def __init__(self, model: str, dim: int = EMBEDDING_DIM, base_url: Optional[str] = EMBEDDING_BASE_URL):
+        from openai import OpenAI
+
+        self.model = model
+        self.dim = dim
+        self._client = OpenAI(base_url=base_url, api_key=os.getenv("EMBEDDING_API_KEY") or os.getenv("OPENAI_API_KEY"))
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            # The API rejects empty inputs
+            batch = [text or " " for text in texts[start:start + EMBEDDING_BATCH_SIZE]]
+            response = self._client.embeddings.create(model=self.model, input=batch, dimensions=self.dim)
+            for item in response.data:
+                vectors[start + item.index] = item.embedding
+        return _normalised_float16(vectors)
+
+
+class SentenceTransformerEmbedder:
+    """Embeddings from a local sentence-transformers model."""
+
+    def __init__(self, model: str):
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model)
+        self.dim = self._model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        vectors = self._model.encode(list(texts), batch_size=EMBEDDING_BATCH_SIZE, convert_to_numpy=True)
+        return _normalised_float16(vectors.reshape(len(texts), self.dim))
+
+
+class HashingEmbedder:
+    """
+    Deterministic, offline text embedder.
+
+    Words, word bigrams and character trigrams are hashed into a fixed number
+    of signed buckets (the hashing trick) and L2-normalised, so cosine
+    similarity reflects shared vocabulary and tolerates inflections and typos
+    (e.g. "grinder"/"grinding"). Needs no model download or API calls, but
+    only captures shared vocabulary; used in tests and when no model is set up.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM):
+        self.dim = dim
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        digest = zlib.crc32(feature.encode("utf-8"))
+        return digest % self.dim, 1.0 if digest & 0x80000000 else -1.0
+
+    @functools.lru_cache(maxsize=65536)
+    def _word_features(self, word: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Buckets and signed weights of a word and its character trigrams."""
+        padded = f"#{word}#"
+        features = [(f"w:{word}", 1.0)] + [(f"c:{padded[i:i + 3]}", 0.3) for i in range(len(padded) - 2)]
+        buckets = []
+        weights = []
+        for feature, weight in features:
+            bucket, sign = self._bucket(feature)
+            buckets.append(bucket)
+            weights.append(sign * weight)
+        return np.array(buckets, dtype=np.int64), np.array(weights, dtype=np.float32)
+
+    @functools.lru_cache(maxsize=65536)
+    def _word_hash(self, word: str) -> int:
+        return zlib.crc32(f"b:{word}".encode("utf-8"))
+
+    def _bigram_features(self, hashes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Buckets and signed weights of word bigrams, mixed from the two word hashes."""
+        mixed = ((hashes[:-1] << np.uint64(32)) | hashes[1:]) * np.uint64(0x9E3779B97F4A7C15)
+        mixed >>= np.uint64(32)
+        signs = np.where(mixed & np.uint64(0x80000000), 0.7, -0.7).astype(np.float32)
+        return (mixed % np.uint64(self.dim)).astype(np.int64), signs
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """L2-normalised float16 embeddings, one row per text."""
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float16)
+        for start in range(0, len(texts), EMBED_CHUNK_SIZE):
+            documents = [tokenize(text) for text in texts[start:start + EMBED_CHUNK_SIZE]]
+            words = [word for document in documents for word in document]
+            if not words:
+                continue
+            word_rows = np.repeat(np.arange(len(documents)), [len(document) for document in documents])
+            # Features are looked up once per distinct word, then gathered for every occurrence
+            vocabulary: Dict[str, int] = {}
+            word_ids = np.fromiter(
+                (vocabulary.setdefault(word, len(vocabulary)) for word in words), dtype=np.int64, count=len(words)
+            )
+            features = [self._word_features(word) for word in vocabulary]
+            lengths = np.array([len(part[0]) for part in features], dtype=np.int64)
+            offsets = np.cumsum(lengths) - lengths
+            occurrence_lengths = lengths[word_ids]
+            occurrence_starts = np.cumsum(occurrence_lengths) - occurrence_lengths
+            gather = (
+                np.repeat(offsets[word_ids] - occurrence_starts, occurrence_lengths)
+                + np.arange(int(occurrence_lengths.sum()))
+            )
+            buckets = [np.concatenate([part[0] for part in features])[gather]]
+            weights = [np.concatenate([part[1] for part in features])[gather]]
+            rows = [np.repeat(word_rows, occurrence_lengths)]
+
+            # Bigrams of adjacent words within the same text
+            hashes = np.fromiter(
+                (self._word_hash(word) for word in vocabulary), dtype=np.uint64, count=len(vocabulary)
+            )[word_ids]
+            bigram_buckets, bigram_weights = self._bigram_features(hashes)
+            same_text = word_rows[1:] == word_rows[:-1]
+            buckets.append(bigram_buckets[same_text])
+            weights.append(bigram_weights[same_text])
+            rows.append(word_rows[1:][same_text])
+
+            # One bincount over (row, bucket) cells fills the whole chunk
+            chunk = np.bincount(
+                np.concatenate(rows) * self.dim + np.concatenate(buckets),
+                weights=np.concatenate(weights),
+                minlength=len(documents) * self.dim,
+            ).reshape(len(documents), self.dim)
+            norms = np.linalg.norm(chunk, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            vectors[start:start + len(documents)] = chunk / norms
+        return vectors
+
+
+def create_embedder(backend: str = EMBEDDING_BACKEND) -> TextEmbedder:
+    """Embedder for the configured backend, falling back to HashingEmbedder if it can't be set up."""
+    try:
+        if backend == "openai":
+            if not (os.getenv("EMBEDDING_API_KEY") or os.getenv("OPENAI_API_KEY")):
+                raise ValueError("EMBEDDING_API_KEY or OPENAI_API_KEY is not set")
+            return OpenAIEmbedder(EMBEDDING_MODEL or "text-embedding-3-small")
+        if backend == "sentence-transformers":
+            return SentenceTransformerEmbedder(EMBEDDING_MODEL or "sentence-transformers/all-MiniLM-L6-v2")
+        if backend != "hashing":
+            raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+    except (ImportError, ValueError) as e:
+        logger.warning(f"Using hashed embeddings for incident similarity: {str(e)}")
+    return HashingEmbedder()
+
+
+def incident_text(incident: Dict[str, Any]) -> str:
+    return " ".join(str(incident.get(field) or "") for field in INCIDENT_TEXT_FIELDS)
+
+
+def ptw_text(ptw: PTWData) -> str:
+    return " ".join([
+        ptw.description_of_work,
+        ptw.equipment_required,
+        ptw.work_location,
+        ptw.vessel_name,
+    ])
+
+
+class IncidentVectorIndex:
+    """In-memory cosine-similarity index over float16 incident embeddings."""
+
+    def __init__(self, embedder: TextEmbedder):
+        self.embedder = embedder
+        self.ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        self._vectors = np.zeros((0, self.embedder.dim), dtype=np.float16)
+
+    def add(self, incidents: List[Dict[str, Any]]) -> None:
+        vectors = self.embedder.embed([incident_text(i) for i in incidents])
+        count = len(self.ids)
+        if count + len(vectors) > len(self._vectors):
+            # Grow geometrically so single inserts don't copy the whole matrix
+            capacity = max(count + len(vectors), 2 * len(self._vectors))
+            grown = np.zeros((capacity, self.embedder.dim), dtype=np.float16)
+            grown[:count] = self._vectors[:count]
+            self._vectors = grown
+        self._vectors[count:count + len(vectors)] = vectors
+        for incident in incidents:
+            self._positions[str(incident["id"])] = len(self.ids)
+            self.ids.append(str(incident["id"]))
+
+    def remove(self, incident_ids: Set[str]) -> None:
+        keep = [position for position, incident_id in enumerate(self.ids) if incident_id not in incident_ids]
+        self._vectors = self._vectors[keep]
+        self.ids = [self.ids[position] for position in keep]
+        self._positions = {incident_id: i for i, incident_id in enumerate(self.ids)}
+
+    def scores(self, query: np.ndarray, candidate_ids: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Cosine similarity of `query` to every (or every candidate) incident."""
+        if candidate_ids is None:
+            positions = np.arange(len(self.ids))
+            vectors = self._vectors[:len(self.ids)]
+        else:
+            positions = np.array(
+                [self._positions[i] for i in candidate_ids if i in self._positions], dtype=np.int64
+            )
+            vectors = self._vectors[positions]
+        if positions.size == 0:
+            return {}
+        # float16 has no BLAS kernels; upcast for the product
+        similarities = vectors.astype(np.float32) @ query.astype(np.float32)
+        return {self.ids[position]: float(score) for position, score in zip(positions, similarities)}
+
+
+class IncidentLexicalIndex:
+    """
+    Inverted index over incident text with BM25 scoring, plus exact-match
+    facets on structured fields.
+
+    Scoring a query only touches the postings of its terms (as NumPy arrays),
+    so it stays cheap as the corpus grows and is used to prefilter candidates
+    for the more expensive scoring.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._reset()
+
+    def _reset(self) -> None:
+        # Document slot -> incident id; slots of removed incidents are None until reused
+        self._slots: List[Optional[str]] = []
+        self._positions: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._doc_terms: List[Optional[Counter]] = []
+        self._doc_facets: List[Optional[Dict[str, str]]] = []
+        self._lengths: List[int] = []
+        self._total_length = 0
+        self._length_array: Optional[np.ndarray] = None
+        # term -> {doc slot: term frequency}, plus its array form
+        self._postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self._posting_arrays: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._facets: Dict[str, Dict[str, Set[str]]] = {field: defaultdict(set) for field in FACET_FIELDS}
+
+    @property
+    def ids(self) -> List[str]:
+        return list(self._positions)
+
+    def add(self, incidents: List[Dict[str, Any]]) -> None:
+        for incident in incidents:
+            self._add_document(
+                str(incident["id"]),
+                Counter(index_terms(incident_text(incident))),
+                {field: normalise_facet(incident.get(field)) for field in FACET_FIELDS},
+            )
+
+    def _add_document(self, incident_id: str, terms: Counter, facets: Dict[str, str]) -> None:
+        length = sum(terms.values())
+        if self._free:
+            position = self._free.pop()
+            self._slots[position] = incident_id
+            self._doc_terms[position] = terms
+            self._doc_facets[position] = facets
+            self._lengths[position] = length
+            if self._length_array is not None:
+                self._length_array[position] = length
+        else:
+            position = len(self._slots)
+            self._slots.append(incident_id)
+            self._doc_terms.append(terms)
+            self._doc_facets.append(facets)
+            self._lengths.append(length)
+            self._length_array = None
+        self._positions[incident_id] = position
+        self._total_length += length
+        for term, count in terms.items():
+            self._postings[term][position] = count
+            self._posting_arrays.pop(term, None)
+        for field, value in facets.items():
+            if value:
+                self._facets[field][value].add(incident_id)
+
+    def remove(self, incident_ids: Set[str]) -> None:
+        """Drop incidents, touching only the postings of their own terms."""
+        for incident_id in incident_ids:
+            position = self._positions.pop(incident_id, None)
+            if position is None:
+                continue
+            for term in self._doc_terms[position]:
+                postings = self._postings[term]
+                del postings[position]
+                if not postings:
+                    del self._postings[term]
+                self._posting_arrays.pop(term, None)
+            self._total_length -= self._lengths[position]
+            self._lengths[position] = 0
+            if self._length_array is not None:
+                self._length_array[position] = 0
+            for field, value in self._doc_facets[position].items():
+                members = self._facets[field].get(value)
+                if members is not None:
+                    members.discard(incident_id)
+                    if not members:
+                        del self._facets[field][value]
+            self._slots[position] = None
+            self._doc_terms[position] = None
+            self._doc_facets[position] = None
+            self._free.append(position)
+
+    def facet(self, field: str, value: str) -> Set[str]:
+        """Ids of incidents whose `field` exactly matches `value` (case-insensitive)."""
+        return self._facets[field].get(normalise_facet(value), set())
+
+    def _arrays(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if term not in self._postings:
+            return None
+        if term not in self._posting_arrays:
+            postings = self._postings[term]
+            self._posting_arrays[term] = (
+                np.fromiter(postings.keys(), dtype=np.int64, count=len(postings)),
+                np.fromiter(postings.values(), dtype=np.float32, count=len(postings)),
+            )
+        return self._posting_arrays[term]
+
+    def bm25(self, terms: Sequence[str], limit: int) -> Dict[str, float]:
+        """BM25 scores of the `limit` best matching incidents for the query terms."""
+        doc_count = len(self._positions)
+        if not doc_count:
+            return {}
+        if self._length_array is None:
+            self._length_array = np.array(self._lengths, dtype=np.float32)
+        average_length = self._total_length / doc_count or 1.0
+
+        scores = np.zeros(len(self._slots), dtype=np.float32)
+        for term in set(terms):
+            arrays = self._arrays(term)
+            if arrays is None:
+                continue
+            positions, frequencies = arrays
+            idf = math.log(1 + (doc_count - len(positions) + 0.5) / (len(positions) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self._length_array[positions] / average_length)
+            scores[positions] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+
+        matched = np.flatnonzero(scores)
+        if matched.size > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        return {self._slots[position]: float(scores[position]) for position in matched}
+
+
+class IncidentSearchEngine:
+    """
+    Hybrid PTW-to-incident matching.
+
+    BM25 over incident text, together with the vessel and PTW type facets,
+    selects a candidate set; only candidates are scored with embeddings, and
+    the final ranking blends cosine similarity, normalised BM25 and facet
+    matches. Both indexes are updated as incidents are inserted or updated,
+    and are reconciled with the incident snapshot by id before each search.
+    """
+
+    def __init__(
+        self,
+        snapshot: IncidentSnapshot,
+        candidate_limit: int = CANDIDATE_LIMIT,
+        embedder: Optional[TextEmbedder] = None,
+    ):
+        self._snapshot = snapshot
+        self.candidate_limit = candidate_limit
+        self.vectors = IncidentVectorIndex(embedder or create_embedder())
+        self.lexical = IncidentLexicalIndex()
+        self._lock = threading.Lock()
+        self._indexed: Set[str] = set()
+        self._synced_version: Optional[int] = None
+        self._df: Optional[pd.DataFrame] = None
+        self._row_index: Optional[pd.Index] = None
+
+    def add(self, incidents: List[Dict[str, Any]]) -> None:
+        """Index inserted incidents; an incident that is already indexed is replaced."""
+        with self._lock:
+            updated = {str(i["id"]) for i in incidents if i.get("id")} & self._indexed
+            if updated:
+                self.vectors.remove(updated)
+                self.lexical.remove(updated)
+                self._indexed -= updated
+            self._add(incidents)
+
+    def _add(self, incidents: List[Dict[str, Any]]) -> None:
+        new = [i for i in incidents if i.get("id") and str(i["id"]) not in self._indexed]
+        if not new:
+            return
+        self.vectors.add(new)
+        self.lexical.add(new)
+        self._indexed.update(str(i["id"]) for i in new)
+        logger.info(f"Indexed {len(new)} incidents ({len(self._indexed)} total)")
+
+    def _sync(self) -> None:
+        df = self._snapshot.get()
+        if self._synced_version == self._snapshot.version:
+            return
+        snapshot_ids = set(df["id"].astype(str))
+        stale = self._indexed - snapshot_ids
+        if stale:
+            self.vectors.remove(stale)
+            self.lexical.remove(stale)
+            self._indexed -= stale
+        missing = df[~df["id"].astype(str).isin(self._indexed)]
+        if not missing.empty:
+            columns = list(dict.fromkeys(["id", *INCIDENT_TEXT_FIELDS, *FACET_FIELDS]))
+            self._add(missing[columns].astype(str).to_dict("records"))
+        self._df = df
+        self._row_index = pd.Index(df["id"].astype(str))
+        self._synced_version = self._snapshot.version
+
+    def rows(self, incident_ids: List[str], fields: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Snapshot rows of the given incidents, as of the last search."""
+        with self._lock:
+            if self._df is None:
+                return {}
+            positions = self._row_index.get_indexer(incident_ids)
+            selected = self._df.iloc[positions[positions >= 0]]
+        records = selected.reindex(columns=fields).astype(object).to_dict("records")
+        return {str(record["id"]): record for record in records}
+
+    def _fallback_candidates(self, same_vessel: Set[str], same_ptw_type: Set[str]) -> List[str]:
+        """
+        Incidents to score with embeddings alone when no incident shares a term with the permit.
+
+        Rather than scanning the whole index, takes up to FALLBACK_SCAN_LIMIT
+        incidents sharing both facets, then the vessel, then the PTW type,
+        topped up with the most recently indexed ones.
+        """
+        groups = [same_vessel & same_ptw_type, same_vessel, same_ptw_type, reversed(self.vectors.ids)]
+        candidates: Dict[str, None] = {}
+        for group in groups:
+            for incident_id in group:
+                if len(candidates) >= FALLBACK_SCAN_LIMIT:
+                    return list(candidates)
+                candidates[incident_id] = None
+        return list(candidates)
+
+    def search(self, ptw: PTWData, k: int) -> List[Tuple[str, float]]:
+        """Return the ids and scores of the `k` incidents that best match the permit."""
+        text = ptw_text(ptw)
+        query_vector = self.vectors.embedder.embed([text])[0]
+        ptw_type = infer_ptw_type(ptw)
+
+        with self._lock:
+            self._sync()
+            lexical_scores = self.lexical.bm25(index_terms(text), self.candidate_limit)
+            same_vessel = self.lexical.facet("vessel_name", ptw.vessel_name) if ptw.vessel_name else set()
+            same_ptw_type = self.lexical.facet("ptw_type", ptw_type) if ptw_type else set()
+
+            candidates = set(lexical_scores) or self._fallback_candidates(same_vessel, same_ptw_type)
+            vector_scores = self.vectors.scores(query_vector, candidates)
+
+        max_lexical = max(lexical_scores.values(), default=0.0) or 1.0
+        scored = []
+        for incident_id, cosine in vector_scores.items():
+            score = (
+                VECTOR_WEIGHT * cosine
+                + LEXICAL_WEIGHT * lexical_scores.get(incident_id, 0.0) / max_lexical
+                + (VESSEL_BOOST if incident_id in same_vessel else 0.0)
+                + (PTW_TYPE_BOOST if incident_id in same_ptw_type else 0.0)
+            )
+            scored.append((incident_id, score))
+        return heapq.nlargest(k, scored, key=lambda item: item[1])
+
+
+def find_similar_incidents(ptw: PTWData, k: int = 3) -> List[Dict[str, Any]]:
+    """
+    Find the incidents most similar to the work described in a permit to work.
+
+    Returns:
+        List[Dict[str, Any]]: Up to `k` incidents (SIMILAR_INCIDENT_FIELDS plus
+        `score`), most similar first
+    """
+    matches = incident_search.search(ptw, k)
+    if not matches:
+        return []
+
+    rows_by_id = incident_search.rows([incident_id for incident_id, _ in matches], SIMILAR_INCIDENT_FIELDS)
+
+    results = []
+    for incident_id, score in matches:
+        row = rows_by_id.get(incident_id)
+        if row is None:
+            continue
+        if isinstance(row.get("date"), pd.Timestamp):
+            row["date"] = row["date"].isoformat()
+        results.append({**row, "score": round(score, 4)})
+    return results
+
+
+def build_similarity_summary(ptw: PTWData, incidents: List[Dict[str, Any]]) -> str:
+    """Explain, as HTML, what each similar incident has in common with the permit."""
+    if not incidents:
+        return "<p>No similar incidents were found for this permit.</p>"
+
+    ptw_terms = set(tokenize(f"{ptw.equipment_required} {ptw.description_of_work}"))
+    parts = [f"<h2>Why These {len(incidents)} Incidents Are Relevant for the PTW Decision</h2>"]
+
+    for number, incident in enumerate(incidents, start=1):
+        description = str(incident.get("incident_description") or "Incident")
+        title = description if len(description) <= 80 else description[:77] + "..."
+        reasons = []
+        if ptw.vessel_name and str(incident.get("vessel_name", "")).lower() == ptw.vessel_name.lower():
+            reasons.append(f"Same vessel ({html.escape(ptw.vessel_name)})")
+        location = str(incident.get("incident_location_on_vessel") or "")
+        if ptw.work_location and location and set(tokenize(location)) & set(tokenize(ptw.work_location)):
+            reasons.append(f"Similar location ({html.escape(location)})")
+        shared = sorted(
+            term for term in set(tokenize(f"{incident.get('tools_used', '')} {description}")) & ptw_terms
+            if len(term) > 3
+        )
+        if shared:
+            reasons.append(f"Shared work/equipment terms: {html.escape(', '.join(shared[:6]))}")
+        if not reasons:
+            reasons.append("Similar description of work")
+        if incident.get("injury_status"):
+            reasons.append(f"Outcome: {html.escape(str(incident['injury_status']))}")
+
+        parts.append(f"<h3>Incident {number}: {html.escape(title)}</h3>")
+        parts.append("<ul>" + "".join(f"<li>{reason}</li>" for reason in reasons) + "</ul>")
+
+    return "\n".join(parts)
+
+
+incident_search = IncidentSearchEngine(incident_snapshot)
+add_insert_listener(incident_search.add)
@@ -0,0 +1,51 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+R = TypeVar('R')
+
+SINGLEFLIGHT_CALLS = registry.counter(
+    "singleflight_calls", "Coalesced operations; followers shared a leader's execution", ("group", "role")
+)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it is in flight await that task and get the same result (or
+    exception). Nothing is cached: once the work finishes, the next call for
+    the key runs it again. The work is shielded, so a caller that is
+    cancelled (e.g. a client disconnecting) doesn't cancel it for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, work: Callable[[], Awaitable[R]]) -> R:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(work())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="leader")
+        else:
+            logger.info(f"Joining in-flight {self.name} operation")
+            SINGLEFLIGHT_CALLS.inc(group=self.name, role="follower")
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the exception so it isn't reported as unhandled when every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def is_running(self, key: Hashable) -> bool:
+        return key in self._calls
@@ -0,0 +1,127 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from db.models import AccidentData
+from db.queries import INCIDENT_FIELDS, add_insert_listener, get_all_incidents
+
+logger = logging.getLogger(__name__)
+
+# Full reload interval, to pick up rows written outside this process
+INCIDENT_SNAPSHOT_REFRESH_SECONDS = int(os.getenv("INCIDENT_SNAPSHOT_REFRESH_SECONDS", "300"))
+
+# Low-cardinality text columns stored as pandas categoricals
+CATEGORICAL_FIELDS = [
+    "time_of_day",
+    "vessel_name",
+    "vessel_location",
+    "client",
+    "classification",
+    "type_of_event",
+    "level_of_investigation",
+    "sea_state",
+    "swell_direction",
+    "job_role",
+    "injury_status",
+    "injured_person_transported",
+    "ptw_type",
+]
+DATETIME_FIELDS = ["date", "ip_sign_on_datetime"]
+BOOL_FIELDS = [name for name, field in AccidentData.model_fields.items() if field.annotation is bool]
+FLOAT_FIELDS = [
+    name
+    for name, field in AccidentData.model_fields.items()
+    if field.annotation in (float, Optional[float])
+]
+
+
+def to_typed_frame(incidents: List[Dict[str, Any]]) -> pd.DataFrame:
+    """Build a DataFrame of incident rows with proper datetime, bool, float and categorical columns."""
+    df = pd.DataFrame(incidents).reindex(columns=INCIDENT_FIELDS)
+    for field in INCIDENT_FIELDS:
+        if field in DATETIME_FIELDS:
+            df[field] = pd.to_datetime(df[field], errors="coerce", utc=True, format="ISO8601")
+        elif field in BOOL_FIELDS:
+            df[field] = df[field].astype("boolean").fillna(False).astype(bool)
+        elif field in FLOAT_FIELDS:
+            df[field] = pd.to_numeric(df[field], errors="coerce")
+        else:
+            df[field] = df[field].astype(object).fillna("").astype(str)
+            if field in CATEGORICAL_FIELDS:
+                df[field] = df[field].astype("category")
+    return df
+
+
+def frame_fingerprint(df: pd.DataFrame) -> Tuple[int, int]:
+    """Row count and an order-independent hash of a frame's contents."""
+    return len(df), int(pd.util.hash_pandas_object(df, index=False).sum())
+
+
+class IncidentSnapshot:
+    """
+    Process-wide, typed DataFrame of the incidents table.
+
+    The table is loaded once and kept current by appending rows as they are
+    inserted; a full reload every `refresh_seconds` picks up external writes.
+    Every change bumps `version`; a reload that finds the same rows keeps the
+    current frame and version. The frame is shared between requests and
+    must be treated as read-only: callers that may mutate it take a copy.
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]], refresh_seconds: int):
+        self._loader = loader
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._df: Optional[pd.DataFrame] = None
+        self._loaded_at = 0.0
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self) -> pd.DataFrame:
+        """Return the current snapshot, loading or refreshing it if needed."""
+        with self._lock:
+            stale = self.refresh_seconds > 0 and time.time() - self._loaded_at > self.refresh_seconds
+            if self._df is None or stale:
+                self._reload()
+            return self._df
+
+    def append(self, incidents: List[Dict[str, Any]]) -> None:
+        """Add newly inserted incident rows to a loaded snapshot."""
+        with self._lock:
+            if self._df is None:
+                return
+            combined = pd.concat([self._df, to_typed_frame(incidents)], ignore_index=True)
+            # Upserted rows replace their earlier version
+            combined = combined.drop_duplicates("id", keep="last").reset_index(drop=True)
+            # Concatenating categoricals with different categories yields object columns
+            for field in CATEGORICAL_FIELDS:
+                combined[field] = combined[field].astype("category")
+            self._df = combined
+            self._version += 1
+            logger.info(f"Appended {len(incidents)} incidents to snapshot (version {self._version})")
+
+    def _reload(self) -> None:
+        started = time.time()
+        df = to_typed_frame(self._loader())
+        self._loaded_at = time.time()
+        # Unchanged data keeps the version, so caches keyed on it stay valid
+        if self._df is not None and frame_fingerprint(df) == frame_fingerprint(self._df):
+            logger.info(f"Incident snapshot unchanged after reload (version {self._version})")
+            return
+        self._df = df
+        self._version += 1
+        logger.info(
+            f"Loaded incident snapshot with {len(self._df)} rows in {self._loaded_at - started:.2f}s "
+            f"(version {self._version})"
+        )
+
+
+incident_snapshot = IncidentSnapshot(get_all_incidents, INCIDENT_SNAPSHOT_REFRESH_SECONDS)
+add_insert_listener(incident_snapshot.append)
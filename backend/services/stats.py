@@ -0,0 +1,257 @@
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from services.snapshot import IncidentSnapshot, incident_snapshot
+
+logger = logging.getLogger(__name__)
+
+SEA_STATE_ORDER = [
+    "smooth",
+    "calm",
+    "slight",
+    "light",
+    "moderate",
+    "rough",
+    "very rough",
+    "high",
+    "very high",
+    "phenomenal",
+    "unknown",
+]
+
+CHART_CATEGORICAL_FIELDS = [
+    "vessel_name",
+    "classification",
+    "type_of_event",
+    "injury_status",
+    "job_role",
+    "client",
+    "sea_state",
+]
+CHART_NUMERICAL_FIELDS = ["swell_height_m", "swell_period_s", "hours_after_sign_on"]
+CHART_MAX_HUES = 7
+
+TEXT_FIELDS = [
+    "vessel_name",
+    "client",
+    "classification",
+    "type_of_event",
+    "level_of_investigation",
+    "sea_state",
+    "incident_description",
+    "job_role",
+    "injury_status",
+    "ptw_type",
+    "task_being_performed",
+]
+BOOL_FIELDS = ["dropped_object", "injured_person_returned_to_work"]
+
+# Columns the aggregates are computed from
+STATS_FIELDS = ["date", *TEXT_FIELDS, *CHART_NUMERICAL_FIELDS, *BOOL_FIELDS]
+
+
+def _contains(series: pd.Series, *terms: str) -> pd.Series:
+    """Case-insensitive substring match of any of `terms`, vectorised over a text column."""
+    pattern = "|".join(re.escape(term) for term in terms)
+    return series.str.contains(pattern, case=False, regex=True)
+
+
+def _sea_state_rank(state: str) -> int:
+    state = state.lower()
+    return SEA_STATE_ORDER.index(state) if state in SEA_STATE_ORDER else len(SEA_STATE_ORDER)
+
+
+def _counts(series: pd.Series, key: str) -> List[Dict[str, Any]]:
+    return [{key: value, "count": int(count)} for value, count in series.value_counts().items()]
+
+
+def prepare_stats_frame(incidents: pd.DataFrame) -> pd.DataFrame:
+    """Select and normalise the columns the aggregates are computed from."""
+    df = incidents.reindex(columns=STATS_FIELDS)
+    for field in TEXT_FIELDS:
+        df[field] = df[field].astype(object).fillna("").astype(str)
+    for field in CHART_NUMERICAL_FIELDS:
+        df[field] = pd.to_numeric(df[field], errors="coerce")
+    for field in BOOL_FIELDS:
+        df[field] = df[field].astype("boolean").fillna(False).astype(bool)
+    df["date"] = pd.to_datetime(df["date"], errors="coerce", utc=True, format="ISO8601")
+    return df
+
+
+def compute_dashboard_stats(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Compute the dashboard chart aggregates in one vectorised pass.
+
+    Args:
+        df: Frame produced by prepare_stats_frame
+
+    Returns:
+        Dict[str, Any]: Totals and chart series, keyed by chart
+    """
+    total = len(df)
+
+    near_miss = _contains(df["type_of_event"], "near miss") | _contains(df["classification"], "near miss")
+    minor_injury = _contains(df["injury_status"], "minor", "first aid")
+    hand_description = _contains(df["incident_description"], "hand", "finger")
+    injured = (df["injury_status"] != "") & ~_contains(df["injury_status"], "no injury")
+
+    # Routine task incidents, grouped by task
+    routine = _contains(df["task_being_performed"], "routine") | _contains(df["incident_description"], "routine")
+    routine_tasks = df.loc[routine, "task_being_performed"].replace("", "Unknown Task")
+
+    # Dropped objects per month, chronologically
+    dropped = df[df["dropped_object"]]
+    dropped_months = dropped["date"].dropna().dt.tz_localize(None).dt.to_period("M").value_counts().sort_index()
+    dropped_by_month = [
+        {"month": period.strftime("%b %y"), "count": int(count)} for period, count in dropped_months.items()
+    ]
+
+    # High potential incidents per calendar month
+    high_potential = (
+        _contains(df["classification"], "high potential", "hipo")
+        | _contains(df["level_of_investigation"], "high")
+    )
+    hipo_months = df.loc[high_potential, "date"].dropna().dt.month.value_counts().sort_index()
+    high_potential_by_month = [
+        {"month": pd.Timestamp(2000, month, 1).strftime("%b"), "count": int(count)}
+        for month, count in hipo_months.items()
+    ]
+
+    # Weather related incidents by sea state, calm to phenomenal
+    weather = (
+        (df["sea_state"] != "")
+        | (df["swell_height_m"].fillna(0) > 0)
+        | _contains(df["incident_description"], "weather", "sea")
+    )
+    sea_states = _counts(df.loc[weather, "sea_state"].replace("", "Unknown"), "state")
+    sea_states.sort(key=lambda item: _sea_state_rank(item["state"]))
+
+    # Hot work and fire watch: near misses vs actual incidents
+    hot_work = (
+        _contains(df["ptw_type"], "hot work")
+        | _contains(df["task_being_performed"], "fire watch", "hot work")
+        | _contains(df["incident_description"], "fire", "hot work")
+    )
+    hot_work_near_misses = int((hot_work & near_miss).sum())
+
+    minor_count = int(minor_injury.sum())
+    near_miss_count = int(near_miss.sum())
+    hand_injury_count = int((hand_description | _contains(df["job_role"], "hand")).sum())
+
+    return {
+        "total_incidents": total,
+        "open_incidents": int((~df["injured_person_returned_to_work"] & (df["injury_status"] != "No injury")).sum()),
+        "dropped_object_count": int(df["dropped_object"].sum()),
+        "hand_injury_count": int(hand_description.sum()),
+        "minor_injuries_vs_near_misses": [
+            {"name": "Minor Injuries", "value": minor_count},
+            {"name": "Near Misses", "value": near_miss_count},
+            {"name": "Other", "value": total - minor_count - near_miss_count},
+        ],
+        "routine_tasks": _counts(routine_tasks, "task"),
+        "dropped_objects_by_month": dropped_by_month,
+        "dropped_objects_by_vessel": _counts(dropped["vessel_name"].replace("", "Unknown"), "vessel_name"),
+        "hand_injuries": [
+            {"name": "Hand Injuries", "value": hand_injury_count},
+            {"name": "Other Injuries", "value": int(injured.sum()) - hand_injury_count},
+        ],
+        "high_potential_by_month": high_potential_by_month,
+        "sea_states": sea_states,
+        "fire_watch_hot_work": [
+            {"name": "Near Misses", "value": hot_work_near_misses},
+            {"name": "Actual Incidents", "value": int(hot_work.sum()) - hot_work_near_misses},
+        ],
+    }
+
+
+def compute_chart_data(df: pd.DataFrame, x: str, y: str, hue: str) -> Dict[str, Any]:
+    """
+    Group incidents by `x` and `hue`, counting them (y="count") or averaging a numerical `y`.
+
+    Returns:
+        Dict[str, Any]: {"data": one row per x value with a column per hue, "hues": hue values to plot}
+
+    Raises:
+        ValueError: If a field can't be used on the requested axis
+    """
+    if x not in CHART_CATEGORICAL_FIELDS or hue not in CHART_CATEGORICAL_FIELDS:
+        raise ValueError(f"x and hue must be one of: {', '.join(CHART_CATEGORICAL_FIELDS)}")
+    if y != "count" and y not in CHART_NUMERICAL_FIELDS:
+        raise ValueError(f"y must be 'count' or one of: {', '.join(CHART_NUMERICAL_FIELDS)}")
+
+    frame = pd.DataFrame({
+        "x": df[x].replace("", "Unknown"),
+        "hue": df[hue].replace("", "Unknown"),
+    })
+    if y == "count":
+        grouped = frame.groupby(["x", "hue"]).size()
+    else:
+        frame["y"] = df[y]
+        grouped = frame.groupby(["x", "hue"])["y"].mean().dropna()
+
+    table = grouped.unstack("hue")
+    data = []
+    for x_value, row in table.iterrows():
+        point = {"name": x_value, x: x_value}
+        cast = int if y == "count" else float
+        point.update({hue_value: cast(value) for hue_value, value in row.dropna().items()})
+        data.append(point)
+
+    if x == "sea_state":
+        data.sort(key=lambda point: _sea_state_rank(point["name"]))
+    else:
+        data.sort(key=lambda point: point["name"])
+
+    hues = list(dict.fromkeys(value for value in df[hue] if value.strip()))
+    if (df[hue].str.strip() == "").any():
+        hues.append("Unknown")
+
+    return {"data": data, "hues": hues[:CHART_MAX_HUES]}
+
+
+class DashboardStatsCache:
+    """
+    Caches the dashboard aggregates and chart data computed from the incident snapshot.
+
+    Cached results are tied to the snapshot version, so they are recomputed
+    lazily after incidents are inserted or the snapshot is refreshed.
+    """
+
+    def __init__(self, snapshot: IncidentSnapshot):
+        self._snapshot = snapshot
+        self._lock = threading.Lock()
+        self._version: Optional[int] = None
+        self._df: Optional[pd.DataFrame] = None
+        self._stats: Optional[Dict[str, Any]] = None
+        self._charts: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+
+    def _frame(self) -> pd.DataFrame:
+        incidents = self._snapshot.get()
+        if self._df is None or self._version != self._snapshot.version:
+            self._df = prepare_stats_frame(incidents)
+            self._version = self._snapshot.version
+            self._stats = None
+            self._charts = {}
+        return self._df
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            df = self._frame()
+            if self._stats is None:
+                self._stats = compute_dashboard_stats(df)
+            return self._stats
+
+    def get_chart(self, x: str, y: str, hue: str) -> Dict[str, Any]:
+        with self._lock:
+            df = self._frame()
+            key = (x, y, hue)
+            if key not in self._charts:
+                self._charts[key] = compute_chart_data(df, x, y, hue)
+            return self._charts[key]
+
+
+dashboard_stats = DashboardStatsCache(incident_snapshot)
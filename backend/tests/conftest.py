@@ -0,0 +1,28 @@
+"""
+Shared test setup.
+
+db.connection needs Supabase credentials at import, so the in-memory client
+from the benchmarks is installed before any test imports db.queries.
+"""
+import os
+
+import pytest
+
+from benchmarks import fake_supabase
+
+# The extraction client is created at import, and pooled chat agents build the
+# chat model client; tests never reach the APIs
+os.environ.setdefault("OPENROUTER_API_KEY", "test")
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("EXTRACTION_CACHE_DIR", "")
+os.environ.setdefault("EMBEDDING_BACKEND", "hashing")
+
+_supabase = fake_supabase.install()
+
+
+@pytest.fixture
+def supabase():
+    """The in-memory Supabase client, emptied before each test."""
+    with _supabase.lock:
+        _supabase.tables.clear()
+    return _supabase
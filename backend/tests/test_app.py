@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app as app_module
+
+
+@pytest.fixture
+def client():
+    return TestClient(app_module.app)
+
+
+def test_metrics_disabled_without_token(client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", None)
+    assert client.get("/metrics").status_code == 404
+
+
+def test_metrics_requires_token(client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_TOKEN", "secret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+
+    response = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "# TYPE safetyadvisor_http_requests counter" in response.text
+
+
+def test_chat_stream_cancels_agent_when_client_disconnects(monkeypatch):
+    from routers import dashboard
+    from services.snapshot import IncidentSnapshot
+
+    cancelled = asyncio.Event()
+    disconnected = False
+
+    async def stream(question):
+        yield {"type": "step", "tool": "python_repl_ast", "input": "df.head()"}
+        try:
+            # A long agent step that never yields another event
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    class HttpRequest:
+        async def is_disconnected(self):
+            return disconnected
+
+    monkeypatch.setattr(dashboard, "incident_snapshot", IncidentSnapshot(lambda: [], refresh_seconds=0))
+    monkeypatch.setattr(dashboard.agent_pool, "stream", stream)
+    monkeypatch.setattr(dashboard, "CHAT_DISCONNECT_POLL_SECONDS", 0.01)
+
+    async def read_then_disconnect(body):
+        nonlocal disconnected
+        async for chunk in body:
+            yield chunk
+            disconnected = True
+
+    async def run():
+        response = await dashboard.stream_chat_with_data(
+            dashboard.ChatRequest(question="Summarise the last incident"), HttpRequest(), current_user=None
+        )
+        events = [chunk async for chunk in read_then_disconnect(response.body_iterator)]
+        assert events[0].startswith("event: step")
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        return events
+
+    assert len(asyncio.run(run())) == 1
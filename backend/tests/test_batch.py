@@ -0,0 +1,35 @@
+import asyncio
+from datetime import datetime
+
+from db.models import AccidentData
+from db.queries import insert_incident
+from services import batch
+
+
+def _accident(description: str) -> AccidentData:
+    return AccidentData(date=datetime(2024, 3, 14), vessel_name="HELIX 1", incident_description=description)
+
+
+def test_batch_reports_duplicates(supabase, monkeypatch):
+    stored = _accident("Hose burst on the crane slew motor")
+    insert_incident(stored)
+    extracted = {
+        "a.pdf": _accident("Shackle fell from the hook block"),
+        "b.pdf": stored,
+        "c.pdf": _accident("Shackle fell from the hook block"),
+    }
+
+    async def fake_process(path):
+        if path == "bad.pdf":
+            raise ValueError("Unreadable PDF")
+        return extracted[path]
+
+    monkeypatch.setattr(batch, "process_incident_report", fake_process)
+    monkeypatch.setattr(batch, "BATCH_REQUESTS_PER_MINUTE", 0)
+    files = [(name, name) for name in ["a.pdf", "b.pdf", "c.pdf", "bad.pdf"]]
+    result = asyncio.run(batch.process_incident_batch(files, lambda stage, partial=None: None))
+
+    assert [file.status for file in result.files] == ["inserted", "duplicate", "duplicate", "failed"]
+    assert result.files[0].incident_id == result.files[2].incident_id
+    assert (result.inserted, result.duplicates, result.failed) == (1, 2, 1)
+    assert len(supabase.table("incidents").rows()) == 2
@@ -0,0 +1,16 @@
+from db.models import PTWData
+from services.cache import ExtractionCache
+
+
+def test_directory_is_created_on_first_write(tmp_path):
+    directory = tmp_path / "extraction_cache"
+    cache = ExtractionCache(max_entries=1, directory=str(directory), max_disk_bytes=1024 * 1024)
+    assert cache.get("missing", PTWData) is None
+    assert not directory.exists()
+
+    cache.set("key", PTWData(vessel_name="HELIX 1"))
+    assert (directory / "key.json").exists()
+
+    # Evicted from memory, still served from disk
+    cache.set("other", PTWData())
+    assert cache.get("key", PTWData).vessel_name == "HELIX 1"
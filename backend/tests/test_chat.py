@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from services.chat import ChatAnswerCache, answer_aggregation, normalise_question
+from services.snapshot import to_typed_frame
+
+NOW = datetime(2025, 6, 15, tzinfo=timezone.utc)
+
+
+def _incident(index: int, vessel: str, date: str, dropped_object: bool, injury_status: str) -> dict:
+    return {
+        "id": f"incident-{index}",
+        "vessel_name": vessel,
+        "date": date,
+        "dropped_object": dropped_object,
+        "injury_status": injury_status,
+        "sea_state": "Moderate" if index % 3 else "Rough",
+        "swell_height_m": 1.0 + index % 3,
+        "classification": "Near Miss" if index % 2 else "First Aid Case",
+    }
+
+
+@pytest.fixture
+def incidents():
+    rows = [
+        _incident(0, "HELIX 1", "2025-02-01", True, "No Injury"),
+        _incident(1, "HELIX 1", "2025-03-10", True, "Minor Injury"),
+        _incident(2, "HELIX 1", "2024-07-22", False, "No Injury"),
+        _incident(3, "HELIX 2", "2025-01-05", True, "No Injury"),
+        _incident(4, "HELIX 2", "2023-11-30", False, "Lost Time Injury"),
+        _incident(5, "HELIX 3", "2025-05-01", False, "No Injury"),
+    ]
+    return to_typed_frame(rows)
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("How many incidents were there?", "**6** incidents"),
+    ("How many dropped objects on HELIX 1 this year?", "**2** dropped object incidents on HELIX 1 in 2025"),
+    ("How many incidents on HELIX 2?", "**2** incidents on HELIX 2"),
+    ("How many injuries in 2023?", "**1** injuries in 2023"),
+    ("How many incidents since 2025?", "**4** incidents since 2025"),
+])
+def test_counts(incidents, question, expected):
+    assert expected in answer_aggregation(incidents, question, now=NOW)
+
+
+def test_most_common(incidents):
+    answer = answer_aggregation(incidents, "What is the most common sea state?", now=NOW)
+    assert answer.startswith("The most common sea state for incidents is **Moderate** (4 of 6).")
+
+
+def test_average(incidents):
+    answer = answer_aggregation(incidents, "Average swell height on HELIX 1", now=NOW)
+    assert answer == "The average swell height across 3 incidents on HELIX 1 is **2.00**."
+
+
+@pytest.mark.parametrize("question", [
+    "How many incidents were not dropped objects?",
+    "How many incidents without injuries?",
+    "How many incidents except on HELIX 1?",
+    "How many incidents on HELIX 1 or HELIX 2?",
+    "How many incidents on HELIX 1 and HELIX 2?",
+    "How many incidents before 2024?",
+    "How many incidents after 2024?",
+    "How many incidents between 2023 and 2025?",
+    "How many incidents with a swell height more than 2 m?",
+    "How many incidents with no injury?",
+])
+def test_qualified_questions_go_to_agent(incidents, question):
+    assert answer_aggregation(incidents, question, now=NOW) is None
+
+
+@pytest.mark.parametrize("question", [
+    # No such vessel; must not fall back to counting every incident
+    "How many incidents on HELIX 10?",
+    "How many incidents on Seawell?",
+    # Filters the fast path doesn't know about
+    "How many incidents in rough sea state?",
+    "How many uninjured crew?",
+    "How many incidents 2024?",
+])
+def test_unmatched_terms_go_to_agent(incidents, question):
+    assert answer_aggregation(incidents, question, now=NOW) is None
+
+
+def test_normalise_question_ignores_case_stopwords_and_plurals():
+    assert normalise_question("How many dropped objects on HELIX 1?") == normalise_question(
+        "how many dropped object on the helix 1"
+    )
+
+
+@pytest.mark.parametrize("first, second", [
+    ("How many incidents on HELIX 1 before HELIX 2?", "How many incidents on HELIX 2 before HELIX 1?"),
+    ("Incidents on HELIX 1", "Incidents on HELIX 1 HELIX 1"),
+])
+def test_normalise_question_keeps_order_and_repeats(first, second):
+    assert normalise_question(first) != normalise_question(second)
+
+
+def test_relative_period_answers_expire_with_the_day():
+    cache = ChatAnswerCache()
+    cache.set("How many incidents this year?", 1, "There were 3 incidents in 2025.", now=NOW)
+    cache.set("How many incidents in 2025?", 1, "There were 3 incidents in 2025.", now=NOW)
+
+    assert cache.get("how many incidents this year", 1, now=NOW) is not None
+    assert cache.get("how many incidents this year", 1, now=NOW + timedelta(days=1)) is None
+    assert cache.get("how many incidents in 2025", 1, now=NOW + timedelta(days=1)) is not None
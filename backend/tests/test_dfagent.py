@@ -0,0 +1,37 @@
+import pytest
+
+from services.dfagent import _PooledAgent
+from services.snapshot import to_typed_frame
+
+
+@pytest.fixture
+def pooled():
+    rows = [
+        {"id": "a", "date": "2024-03-14", "vessel_name": "HELIX 1", "swell_height_m": 1.5},
+        {"id": "b", "date": "2024-04-02", "vessel_name": "HELIX 2", "swell_height_m": 2.0},
+    ]
+    return _PooledAgent(to_typed_frame(rows), version=1)
+
+
+def _run(pooled: _PooledAgent, code: str) -> str:
+    return pooled.agent.tools[0].run(code)
+
+
+def test_reading_keeps_agent(pooled):
+    _run(pooled, "heights = df['swell_height_m'].mean()")
+    assert pooled.is_intact()
+    pooled.reset()
+    assert list(pooled.agent.tools[0].locals) == ["df"]
+
+
+@pytest.mark.parametrize("code", [
+    "df.loc[0, 'swell_height_m'] = 9.0",
+    "df['vessel_name'] = df['vessel_name'].cat.rename_categories({'HELIX 1': 'HELIX 9'})",
+    "df.sort_values('date', ascending=False, inplace=True, ignore_index=True)",
+    "df.drop(index=1, inplace=True)",
+    "df = df[df['vessel_name'] == 'HELIX 1']",
+    "df['extra'] = 1",
+])
+def test_modified_frame_is_detected(pooled, code):
+    _run(pooled, code)
+    assert not pooled.is_intact()
@@ -0,0 +1,71 @@
+import asyncio
+
+from db.models import AccidentData, PTWData
+from services.extractor import _model_keywords, _select_pages
+
+FORM_PAGE = (
+    "PERMIT TO WORK - COLD WORK. Vessel name: HELIX 1. Description of work: Replace hydraulic hose "
+    "on main deck crane slew motor. Work location: Main deck crane pedestal."
+)
+SIGN_OFF_PAGE = (
+    "Authorisation. Permit to work issued and signed by the area authority. Performing authority "
+    "signature: ________  Date: ________"
+)
+SIGNATURE_ONLY_PAGE = "Signed: ______________________  Signature of witness: ______________________"
+
+
+def test_model_keywords_cover_ptw_fields():
+    keywords = _model_keywords(PTWData)
+    assert {"vessel", "work", "equipment", "safety"} <= keywords
+    assert not keywords & {"sign", "signed", "signature", "name", "number"}
+
+
+def test_ptw_sign_off_page_is_kept():
+    pages = [FORM_PAGE, SIGN_OFF_PAGE, SIGNATURE_ONLY_PAGE]
+    assert _select_pages(pages, _model_keywords(PTWData), {}) == [1, 2]
+
+
+def test_incident_signature_page_is_dropped():
+    pages = ["Vessel name: HELIX 1. Incident description: a shackle fell during a lifting operation.", SIGNATURE_ONLY_PAGE]
+    assert _select_pages(pages, _model_keywords(AccidentData), {}) == [1]
+
+
+def test_shared_extraction_survives_leader_cleanup(tmp_path, monkeypatch):
+    import time
+
+    from benchmarks.corpus import PTW_LINES, write_text_pdf
+    from services import extractor
+    from services.extractor import PTW_PROMPT, _process_pdf_to_images
+
+    calls = []
+    prepare = extractor._prepare_document
+
+    def slow_prepare(file_path, model_class):
+        time.sleep(0.2)
+        return prepare(file_path, model_class)
+
+    monkeypatch.setattr(extractor, "_prepare_document", slow_prepare)
+
+    async def fake_extract(prompt, base64_images=None, document_text=None, on_partial=None):
+        calls.append(document_text)
+        return PTWData(vessel_name="HELIX 1")
+
+    # Two uploads of the same PDF, each in the caller's own temporary file
+    leader_path, follower_path = tmp_path / "leader.pdf", tmp_path / "follower.pdf"
+    write_text_pdf(leader_path, [["Report reference: COALESCE-1", *PTW_LINES]])
+    follower_path.write_bytes(leader_path.read_bytes())
+
+    async def run():
+        leader = asyncio.ensure_future(_process_pdf_to_images(str(leader_path), PTW_PROMPT, fake_extract, PTWData, "PTW"))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(_process_pdf_to_images(str(follower_path), PTW_PROMPT, fake_extract, PTWData, "PTW"))
+        await asyncio.sleep(0.1)
+        # While the PDF is being prepared, the leader's client disconnects and its request deletes the upload
+        leader.cancel()
+        leader_path.unlink()
+        return await follower
+
+    assert asyncio.run(run()).vessel_name == "HELIX 1"
+    assert len(calls) == 1 and "COALESCE-1" in calls[0]
+    # The extraction's own link to the PDF is cleaned up too
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["follower.pdf"]
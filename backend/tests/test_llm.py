@@ -0,0 +1,77 @@
+import asyncio
+
+import httpx
+import pytest
+from openai import APIConnectionError, APIStatusError
+
+from db.models import PTWData
+from services import llm
+
+REQUEST = httpx.Request("POST", "https://openrouter.test/api/v1/chat/completions")
+PTW_FIELDS = {"vessel_name": "HELIX 1", "work_location": "Main deck"}
+
+
+def _status_error(status_code: int) -> APIStatusError:
+    response = httpx.Response(status_code, request=REQUEST)
+    return APIStatusError(f"HTTP {status_code}", response=response, body=None)
+
+
+def _extract(monkeypatch, outcomes, attempts=2):
+    """Run _extract_with_model against a stream that fails or answers per `outcomes`."""
+    calls = []
+
+    async def fake_stream_json(content, model_class, model, on_partial=None):
+        outcome = outcomes[len(calls)]
+        calls.append(model)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return dict(outcome)
+
+    monkeypatch.setattr(llm, "_stream_json", fake_stream_json)
+    monkeypatch.setattr(llm, "EXTRACTION_RETRY_BACKOFF_SECONDS", 0)
+    result = asyncio.run(llm._extract_with_model(
+        "model", [], PTWData, "PTW", None, None, attempts=attempts, allow_defaults=True,
+    ))
+    return result, calls
+
+
+@pytest.mark.parametrize("error", [
+    APIConnectionError(request=REQUEST),
+    httpx.ReadError("connection reset", request=REQUEST),
+    _status_error(502),
+    _status_error(429),
+    ValueError("truncated response"),
+])
+def test_transient_errors_are_retried(monkeypatch, error):
+    result, calls = _extract(monkeypatch, [error, PTW_FIELDS])
+    assert result.vessel_name == "HELIX 1"
+    assert len(calls) == 2
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    with pytest.raises(APIStatusError):
+        _extract(monkeypatch, [_status_error(400), PTW_FIELDS])
+
+
+def test_last_attempt_error_is_raised(monkeypatch):
+    with pytest.raises(ValueError, match="after 2 attempts"):
+        _extract(monkeypatch, [_status_error(503), _status_error(503)])
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": 1}', '{"a": 1}'),
+    ('```json\n{"a": 1}\n```', '{"a": 1}'),
+    ('```\n{"a": 1}```\n', '{"a": 1}'),
+    ('```json\n{"a": 1}\n``', '{"a": 1}'),
+    ('```json\n{"a": "see ```code``` here"}\n```', '{"a": "see ```code``` here"}'),
+    ('```json', ''),
+])
+def test_strip_fences(text, expected):
+    assert llm._strip_fences(text) == expected
+
+
+def test_parser_keeps_backticks_inside_values():
+    parser = llm.StreamingJSONParser(PTWData)
+    for chunk in ['```json\n{"vessel_name": "HELIX 1", ', '"work_location": "Deck ```A```"}', "\n``", "`"]:
+        parser.feed(chunk)
+    assert parser.finish()["work_location"] == "Deck ```A```"
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from services.metrics import SPAN_CANCELLATIONS, SPAN_ERRORS, span
+
+
+def _count(counter, name: str) -> float:
+    return counter._values[counter._key({"span": name})]
+
+
+def test_span_counts_errors_and_cancellations_apart():
+    with pytest.raises(ValueError):
+        with span("test.failing"):
+            raise ValueError("bad page")
+
+    async def cancelled():
+        with span("test.cancelled"):
+            await asyncio.sleep(60)
+
+    async def run():
+        task = asyncio.create_task(cancelled())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+
+    assert _count(SPAN_ERRORS, "test.failing") == 1
+    assert _count(SPAN_ERRORS, "test.cancelled") == 0
+    assert _count(SPAN_CANCELLATIONS, "test.cancelled") == 1
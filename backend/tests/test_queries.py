@@ -0,0 +1,141 @@
+import base64
+import json
+from datetime import datetime
+
+import pytest
+
+from db.models import AccidentData
+from db.queries import (
+    _incident_record,
+    decode_incident_cursor,
+    encode_incident_cursor,
+    incident_natural_key,
+    insert_incident,
+    insert_incidents_bulk,
+    query_incidents,
+)
+
+
+def _accident(**overrides) -> AccidentData:
+    fields = {
+        "date": datetime(2024, 3, 14, 14, 20),
+        "vessel_name": "HELIX 1",
+        "ptw_number": "PTW-2024-0412",
+        "incident_description": "A shackle fell from the crane hook block onto the main deck.",
+    }
+    fields.update(overrides)
+    return AccidentData(**fields)
+
+
+def _key(**overrides) -> str:
+    record = {
+        "vessel_name": "HELIX 1",
+        "date": "2024-03-14T14:20:00",
+        "ptw_number": "PTW-2024-0412",
+        "incident_description": "A shackle fell onto the main deck.",
+    }
+    record.update(overrides)
+    return incident_natural_key(record)
+
+
+@pytest.mark.parametrize("overrides", [
+    {"vessel_name": "  helix   1 "},
+    {"ptw_number": "ptw-2024-0412"},
+    {"incident_description": "a shackle  fell onto\nthe main deck."},
+    # Only the day is part of the key
+    {"date": "2024-03-14T09:00:00Z"},
+    {"date": "2024-03-14"},
+])
+def test_natural_key_ignores_formatting(overrides):
+    assert _key(**overrides) == _key()
+
+
+@pytest.mark.parametrize("overrides", [
+    {"vessel_name": "HELIX 2"},
+    {"date": "2024-03-15T14:20:00"},
+    {"ptw_number": "PTW-2024-0413"},
+    {"incident_description": "A shackle fell onto the upper deck."},
+])
+def test_natural_key_tells_incidents_apart(overrides):
+    assert _key(**overrides) != _key()
+
+
+def test_single_and_bulk_inserts_share_ids(supabase):
+    accident = _accident()
+    assert _incident_record(accident)["id"] == insert_incidents_bulk([accident])["ids"][0]
+
+    saved = insert_incident(accident)
+    assert saved["updated"]
+    assert saved["incident"]["id"] == _incident_record(accident)["id"]
+    assert len(supabase.table("incidents").rows()) == 1
+
+
+def test_saving_incident_again_applies_corrections(supabase):
+    first = insert_incident(_accident(sea_state="Calm"))
+    assert not first["updated"]
+
+    second = insert_incident(_accident(vessel_name="helix 1", sea_state="Rough"))
+    assert second["updated"]
+    assert second["incident"]["id"] == first["incident"]["id"]
+    [stored] = supabase.table("incidents").rows()
+    assert stored["sea_state"] == "Rough"
+
+
+def test_sparse_reports_are_not_merged(supabase):
+    sparse = {"vessel_name": "", "ptw_number": "", "incident_description": ""}
+    insert_incident(_accident(sea_state="Calm", **sparse))
+    insert_incident(_accident(sea_state="Rough", **sparse))
+    insert_incidents_bulk([_accident(**sparse), _accident(**sparse)])
+    assert len(supabase.table("incidents").rows()) == 4
+
+
+def _cursor(position) -> str:
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def test_cursor_round_trip():
+    incident = {"id": "0b6f0d4e-1f0a-5c1e-9d3a-3f6c1d2b4a5e", "date": "2024-03-14T14:20:00+00:00", "vessel_name": "HELIX 1"}
+    assert decode_incident_cursor(encode_incident_cursor(incident)) == {"date": incident["date"], "id": incident["id"]}
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor!",
+    "é",
+    base64.urlsafe_b64encode(b"not json").decode("ascii"),
+    _cursor(["2024-03-14", "0b6f0d4e-1f0a-5c1e-9d3a-3f6c1d2b4a5e"]),
+    _cursor({"date": "2024-03-14"}),
+    _cursor({"date": "yesterday", "id": "0b6f0d4e-1f0a-5c1e-9d3a-3f6c1d2b4a5e"}),
+    # Values are interpolated into a PostgREST filter
+    _cursor({"date": '2024-03-14",id.neq."', "id": "0b6f0d4e-1f0a-5c1e-9d3a-3f6c1d2b4a5e"}),
+    _cursor({"date": "2024-03-14", "id": '1",or(id.gt."0'}),
+])
+def test_malformed_cursor_is_rejected(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        decode_incident_cursor(cursor)
+
+
+@pytest.mark.parametrize("arguments, message", [
+    ({"fields": ["vessel_name", "password"]}, "Unknown fields: password"),
+    ({"flags": {"dropped_object": True, "is_admin": True}}, "Unknown flags: is_admin"),
+    # Only boolean columns are flags
+    ({"flags": {"vessel_name": True}}, "Unknown flags: vessel_name"),
+    ({"cursor": "garbage", "limit": 10}, "Invalid cursor"),
+])
+def test_query_incidents_rejects_invalid_arguments(supabase, arguments, message):
+    with pytest.raises(ValueError, match=message):
+        query_incidents(**arguments)
+
+
+def test_query_incidents_pages_through_every_match(supabase):
+    insert_incidents_bulk([
+        _accident(date=datetime(2024, 3, day), incident_description=f"Incident {day}") for day in range(1, 8)
+    ])
+    seen, cursor = [], None
+    while True:
+        page = query_incidents(fields=["vessel_name"], limit=3, cursor=cursor)
+        seen.extend(incident["date"][:10] for incident in page["incidents"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == [f"2024-03-0{day}" for day in range(7, 0, -1)]
@@ -0,0 +1,103 @@
+from types import SimpleNamespace
+
+import pytest
+
+from db.models import PTWData
+from services.similarity import (
+    HashingEmbedder,
+    IncidentLexicalIndex,
+    IncidentSearchEngine,
+    OpenAIEmbedder,
+    create_embedder,
+)
+from services.snapshot import IncidentSnapshot, to_typed_frame
+
+
+def _incident(incident_id: str, description: str, vessel: str = "HELIX 1") -> dict:
+    return {"id": incident_id, "date": "2024-03-14", "vessel_name": vessel, "incident_description": description}
+
+
+def _engine(rows):
+    snapshot = IncidentSnapshot(lambda: rows, refresh_seconds=0)
+    engine = IncidentSearchEngine(snapshot)
+    return snapshot, engine
+
+
+def test_updated_incident_replaces_indexed_version():
+    rows = [
+        _incident("a", "Hydraulic hose burst on the crane slew motor"),
+        _incident("b", "Scaffold plank dropped from the pipe deck"),
+    ]
+    snapshot, engine = _engine(rows)
+    ptw = PTWData(description_of_work="Grinding and welding on the helideck railing")
+    engine.search(ptw, k=2)
+
+    updated = _incident("a", "Welding spatter ignited rags during grinding on the helideck railing")
+    snapshot.append([updated])
+    engine.add([updated])
+
+    assert sorted(engine.vectors.ids) == ["a", "b"]
+    assert sorted(engine.lexical.ids) == ["a", "b"]
+    assert len(snapshot.get()) == 2
+    assert set(engine.lexical.bm25(["welding"], limit=10)) == {"a"}
+    assert engine.search(ptw, k=1)[0][0] == "a"
+
+
+def test_fallback_scan_prefers_facets_and_is_capped(monkeypatch):
+    monkeypatch.setattr("services.similarity.FALLBACK_SCAN_LIMIT", 3)
+    rows = [_incident(str(i), f"Routine task {i}", vessel="HELIX 2" if i % 4 == 0 else "HELIX 1") for i in range(12)]
+    _, engine = _engine(rows)
+    # No term in common with any incident
+    ptw = PTWData(description_of_work="Zzyzx qwerty")
+    assert len(engine.search(ptw, k=10)) == 3
+
+    candidates = engine._fallback_candidates(engine.lexical.facet("vessel_name", "HELIX 2"), set())
+    assert sorted(candidates) == ["0", "4", "8"]
+
+
+def test_embedder_is_chosen_by_backend(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    assert isinstance(create_embedder("openai"), OpenAIEmbedder)
+    assert isinstance(create_embedder("hashing"), HashingEmbedder)
+
+
+@pytest.mark.parametrize("backend", ["openai", "word2vec"])
+def test_embedder_falls_back_to_hashing(monkeypatch, backend):
+    monkeypatch.delenv("EMBEDDING_API_KEY", raising=False)
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    assert isinstance(create_embedder(backend), HashingEmbedder)
+
+
+def test_api_embeddings_are_normalised_in_input_order(monkeypatch):
+    class Embeddings:
+        def create(self, model, input, dimensions):
+            data = [SimpleNamespace(index=i, embedding=[float(len(text)), 0.0, 0.0]) for i, text in enumerate(input)]
+            return SimpleNamespace(data=list(reversed(data)))
+
+    embedder = OpenAIEmbedder("text-embedding-3-small", dim=3)
+    embedder._client = SimpleNamespace(embeddings=Embeddings())
+    vectors = embedder.embed(["weld", ""])
+    assert vectors.dtype == "float16"
+    assert vectors[:, 0].tolist() == [1.0, 1.0]
+
+
+def test_removing_incidents_matches_a_rebuilt_index():
+    incidents = [
+        _incident("a", "Hydraulic hose burst on the crane slew motor"),
+        _incident("b", "Scaffold plank dropped from the pipe deck", vessel="HELIX 2"),
+        _incident("c", "Crane wire rope snagged while lifting a hose reel"),
+        _incident("d", "Grinding sparks landed near the hose station"),
+    ]
+    index = IncidentLexicalIndex()
+    index.add(incidents)
+    index.remove({"a", "b"})
+    index.add([_incident("e", "Hose coupling failed during crane lifting")])
+
+    rebuilt = IncidentLexicalIndex()
+    rebuilt.add([incidents[2], incidents[3], _incident("e", "Hose coupling failed during crane lifting")])
+
+    query = ["hose", "crane", "lifting", "scaffold"]
+    assert sorted(index.ids) == ["c", "d", "e"]
+    assert index.bm25(query, limit=10) == pytest.approx(rebuilt.bm25(query, limit=10))
+    assert index.facet("vessel_name", "HELIX 2") == set()
+    assert index.facet("vessel_name", "HELIX 1") == {"c", "d", "e"}
@@ -0,0 +1,45 @@
+from services.snapshot import IncidentSnapshot
+
+
+def _incident(incident_id: str, vessel: str = "HELIX 1") -> dict:
+    return {"id": incident_id, "date": "2024-03-14", "vessel_name": vessel, "swell_height_m": 1.5}
+
+
+def _reload(snapshot: IncidentSnapshot):
+    snapshot._loaded_at = 0.0
+    return snapshot.get()
+
+
+def test_reload_keeps_version_when_rows_are_unchanged():
+    rows = [_incident("a"), _incident("b", "HELIX 2")]
+    snapshot = IncidentSnapshot(lambda: list(rows), refresh_seconds=300)
+    df = snapshot.get()
+    version = snapshot.version
+
+    # Same rows in a different order
+    rows.reverse()
+    assert _reload(snapshot) is df
+    assert snapshot.version == version
+
+
+def test_reload_bumps_version_when_rows_change():
+    rows = [_incident("a"), _incident("b")]
+    snapshot = IncidentSnapshot(lambda: list(rows), refresh_seconds=300)
+    snapshot.get()
+    version = snapshot.version
+
+    rows[1] = _incident("b", "HELIX 2")
+    assert list(_reload(snapshot)["vessel_name"]) == ["HELIX 1", "HELIX 2"]
+    assert snapshot.version == version + 1
+
+
+def test_reload_after_append_of_same_rows_keeps_version():
+    rows = [_incident("a")]
+    snapshot = IncidentSnapshot(lambda: list(rows), refresh_seconds=300)
+    snapshot.get()
+
+    rows.append(_incident("b", "HELIX 3"))
+    snapshot.append([rows[-1]])
+    version = snapshot.version
+    _reload(snapshot)
+    assert snapshot.version == version
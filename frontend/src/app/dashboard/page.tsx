@@ -1,9 +1,9 @@
 'use client'
 
 import { createClient } from '@/lib/supabase'
-import { api, DashboardUserData, ChatResponse } from '@/lib/api'
+import { api, DashboardUserData, ChatResponse, DashboardStats, DashboardChart } from '@/lib/api'
 import { useRouter } from 'next/navigation'
-import { useEffect, useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import { User } from '@supabase/supabase-js'
 import Image from 'next/image'
 import { 
@@ -56,11 +56,18 @@ const sidebarItems = [
   { icon: Shield, label: 'PTW', href: '/ptw', active: false },
 ]
 
+// Columns shown in the recent incidents list
+const RECENT_INCIDENT_FIELDS = [
+  'date', 'vessel_name', 'classification', 'type_of_event', 'injury_status', 'injured_person_returned_to_work',
+]
+
 const COLORS = ['#8884d8', '#82ca9d', '#ffc658', '#ff7c7c', '#8dd1e1', '#d084d0', '#ffb347']
 
 export default function DashboardPage() {
   const [user, setUser] = useState<User | null>(null)
-  const [incidents, setIncidents] = useState<any[]>([])
+  const [stats, setStats] = useState<DashboardStats | null>(null)
+  const [chart, setChart] = useState<DashboardChart>({ data: [], hues: [] })
+  const [recentIncidents, setRecentIncidents] = useState<any[]>([])
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<string | null>(null)
   const [selectedXAxis, setSelectedXAxis] = useState<string>('sea_state')
@@ -73,6 +80,7 @@ export default function DashboardPage() {
   const [isChatOpen, setIsChatOpen] = useState(false)
   const [isChatMinimized, setIsChatMinimized] = useState(false)
   const [isChatLoading, setIsChatLoading] = useState(false)
+  const chatAbortRef = useRef<AbortController | null>(null)
   
   const supabase = createClient()
   const router = useRouter()
@@ -88,9 +96,13 @@ export default function DashboardPage() {
         }
         setUser(user)
 
-        // Fetch incidents data from backend
-        const incidentsData = await api.getDashboardIncidents()
-        setIncidents(incidentsData.incidents || [])
+        // Fetch precomputed aggregates and the latest incidents from backend
+        const [statsData, recentData] = await Promise.all([
+          api.getDashboardStats(),
+          api.getDashboardIncidents({ fields: RECENT_INCIDENT_FIELDS, limit: 5 }),
+        ])
+        setStats(statsData)
+        setRecentIncidents(recentData.incidents || [])
       } catch (err) {
         console.error('Dashboard error:', err)
         setError(err instanceof Error ? err.message : 'Failed to load dashboard')
@@ -102,157 +114,33 @@ export default function DashboardPage() {
     loadDashboard()
   }, [supabase.auth, router])
 
-  // Data processing functions for visualizations
-  const getMinorInjuriesAndNearMisses = () => {
-    const minorInjuries = incidents.filter(i => 
-      i.injury_status?.toLowerCase().includes('minor') || 
-      i.injury_status?.toLowerCase().includes('first aid')
-    ).length
-    const nearMisses = incidents.filter(i => 
-      i.type_of_event?.toLowerCase().includes('near miss') ||
-      i.classification?.toLowerCase().includes('near miss')
-    ).length
-    
-    return [
-      { name: 'Minor Injuries', value: minorInjuries },
-      { name: 'Near Misses', value: nearMisses },
-      { name: 'Other', value: incidents.length - minorInjuries - nearMisses }
-    ]
-  }
+  // Stop a streaming chat answer when leaving the dashboard
+  useEffect(() => () => chatAbortRef.current?.abort(), [])
 
-  const getRoutineTaskIncidents = () => {
-    const routineIncidents = incidents.filter(i => 
-      i.task_being_performed?.toLowerCase().includes('routine') ||
-      i.incident_description?.toLowerCase().includes('routine')
-    )
-    
-    const grouped = routineIncidents.reduce((acc: any, incident) => {
-      const task = incident.task_being_performed || 'Unknown Task'
-      acc[task] = (acc[task] || 0) + 1
-      return acc
-    }, {})
-    
-    return Object.entries(grouped).map(([task, count]) => ({
-      task: task, // Keep full task name
-      taskShort: task.length > 15 ? task.substring(0, 15) + '...' : task, // Shorter version for display
-      count
-    }))
-  }
+  useEffect(() => {
+    api.getDashboardChart(selectedXAxis, selectedYAxis, selectedHue)
+      .then(setChart)
+      .catch(err => console.error('Chart error:', err))
+  }, [selectedXAxis, selectedYAxis, selectedHue])
 
-  const getDropObjectIncidents = () => {
-    const dropObjectIncidents = incidents.filter(i => i.dropped_object === true)
-    
-    // Group by month
-    const grouped = dropObjectIncidents.reduce((acc: any, incident) => {
-      const date = new Date(incident.date)
-      const month = date.toLocaleDateString('en-US', { month: 'short', year: '2-digit' })
-      acc[month] = (acc[month] || 0) + 1
-      return acc
-    }, {})
-    
-    return Object.entries(grouped).map(([month, count]) => ({ month, count }))
-  }
+  // Chart data, aggregated server-side
+  const getMinorInjuriesAndNearMisses = () => stats?.minor_injuries_vs_near_misses ?? []
 
-  const getHandInjuryIncidents = () => {
-    const handInjuries = incidents.filter(i => 
-      i.incident_description?.toLowerCase().includes('hand') ||
-      i.incident_description?.toLowerCase().includes('finger') ||
-      i.job_role?.toLowerCase().includes('hand')
-    ).length
-    
-    const totalInjuries = incidents.filter(i => 
-      i.injury_status && i.injury_status !== '' && !i.injury_status.toLowerCase().includes('no injury')
-    ).length
-    
-    return [
-      { name: 'Hand Injuries', value: handInjuries },
-      { name: 'Other Injuries', value: totalInjuries - handInjuries }
-    ]
-  }
+  const getRoutineTaskIncidents = () => (stats?.routine_tasks ?? []).map(({ task, count }) => ({
+    task: task, // Keep full task name
+    taskShort: task.length > 15 ? task.substring(0, 15) + '...' : task, // Shorter version for display
+    count
+  }))
 
-  const getHighPotentialIncidents = () => {
-    const hiPos = incidents.filter(i => 
-      i.classification?.toLowerCase().includes('high potential') ||
-      i.classification?.toLowerCase().includes('hipo') ||
-      i.level_of_investigation?.toLowerCase().includes('high')
-    )
-    
-    // Group by month to show trend
-    const grouped = hiPos.reduce((acc: any, incident) => {
-      const date = new Date(incident.date)
-      const month = date.toLocaleDateString('en-US', { month: 'short' })
-      acc[month] = (acc[month] || 0) + 1
-      return acc
-    }, {})
-    
-    return Object.entries(grouped).map(([month, count]) => ({ month, count }))
-  }
+  const getDropObjectIncidents = () => stats?.dropped_objects_by_month ?? []
 
-  const getWeatherSeaStateIncidents = () => {
-    const weatherIncidents = incidents.filter(i => 
-      i.sea_state && i.sea_state !== '' ||
-      i.swell_height_m > 0 ||
-      i.incident_description?.toLowerCase().includes('weather') ||
-      i.incident_description?.toLowerCase().includes('sea')
-    )
-    
-    const seaStates = weatherIncidents.reduce((acc: any, incident) => {
-      const state = incident.sea_state || 'Unknown'
-      acc[state] = (acc[state] || 0) + 1
-      return acc
-    }, {})
-    
-    // Define sea state order from smooth to very rough
-    const seaStateOrder = [
-      'Smooth',
-      'Calm',
-      'Slight',
-      'Light',
-      'Moderate',
-      'Rough',
-      'Very Rough',
-      'High',
-      'Very High',
-      'Phenomenal',
-      'Unknown'
-    ]
-    
-    const result = Object.entries(seaStates).map(([state, count]) => ({ state, count }))
-    
-    // Sort according to sea state severity
-    return result.sort((a, b) => {
-      const aIndex = seaStateOrder.findIndex(s => s.toLowerCase() === a.state.toLowerCase())
-      const bIndex = seaStateOrder.findIndex(s => s.toLowerCase() === b.state.toLowerCase())
-      
-      // If not found in order, put at end
-      const aPos = aIndex === -1 ? seaStateOrder.length : aIndex
-      const bPos = bIndex === -1 ? seaStateOrder.length : bIndex
-      
-      return aPos - bPos
-    })
-  }
+  const getHandInjuryIncidents = () => stats?.hand_injuries ?? []
 
-  const getFireWatchHotWorkIncidents = () => {
-    const fireWatchIncidents = incidents.filter(i => 
-      i.ptw_type?.toLowerCase().includes('hot work') ||
-      i.task_being_performed?.toLowerCase().includes('fire watch') ||
-      i.task_being_performed?.toLowerCase().includes('hot work') ||
-      i.incident_description?.toLowerCase().includes('fire') ||
-      i.incident_description?.toLowerCase().includes('hot work')
-    )
-    
-    const nearMisses = fireWatchIncidents.filter(i =>
-      i.type_of_event?.toLowerCase().includes('near miss') ||
-      i.classification?.toLowerCase().includes('near miss')
-    ).length
-    
-    const incidents_count = fireWatchIncidents.length - nearMisses
-    
-    return [
-      { name: 'Near Misses', value: nearMisses },
-      { name: 'Actual Incidents', value: incidents_count }
-    ]
-  }
+  const getHighPotentialIncidents = () => stats?.high_potential_by_month ?? []
+
+  const getWeatherSeaStateIncidents = () => stats?.sea_states ?? []
+
+  const getFireWatchHotWorkIncidents = () => stats?.fire_watch_hot_work ?? []
 
   // Define available data options for the interactive plot
   const dataOptions: SelectOption[] = [
@@ -269,108 +157,9 @@ export default function DashboardPage() {
     { value: 'count', label: 'Count of Incidents', type: 'numerical' },
   ]
 
-  const generateInteractiveChartData = () => {
-    if (!incidents.length) return []
-
-    const xOption = dataOptions.find(opt => opt.value === selectedXAxis)
-    const yOption = dataOptions.find(opt => opt.value === selectedYAxis)
-    const hueOption = dataOptions.find(opt => opt.value === selectedHue)
-
-    if (!xOption || !yOption || !hueOption) return []
-
-    const isCounting = selectedYAxis === 'count'
-    const grouped: { [key: string]: { [hue: string]: number[] } } = {}
+  const generateInteractiveChartData = () => chart.data
 
-    incidents.forEach(incident => {
-      const xValue = incident[selectedXAxis] || 'Unknown'
-      const hueValue = incident[selectedHue] || 'Unknown'
-      
-      if (!xValue || !hueValue) return
-
-      if (!grouped[xValue]) grouped[xValue] = {}
-      if (!grouped[xValue][hueValue]) grouped[xValue][hueValue] = []
-
-      if (isCounting) {
-        grouped[xValue][hueValue].push(1)
-      } else {
-        const yValue = parseFloat(incident[selectedYAxis])
-        if (!isNaN(yValue)) {
-          grouped[xValue][hueValue].push(yValue)
-        }
-      }
-    })
-
-    const result: any[] = []
-    Object.entries(grouped).forEach(([xValue, hueData]) => {
-      const dataPoint: any = { 
-        name: xValue,
-        [selectedXAxis]: xValue 
-      }
-      Object.entries(hueData).forEach(([hueValue, values]) => {
-        if (values.length === 0) return
-
-        if (isCounting) {
-          dataPoint[hueValue] = values.length
-        } else {
-          // Calculate average for numerical data
-          const sum = values.reduce((a, b) => a + b, 0)
-          dataPoint[hueValue] = sum / values.length
-        }
-      })
-      result.push(dataPoint)
-    })
-
-    // Sort the result based on the X-axis selection
-    if (selectedXAxis === 'sea_state') {
-      // Define sea state order from smooth to very rough
-      const seaStateOrder = [
-        'Smooth',
-        'Calm',
-        'Slight',
-        'Light',
-        'Moderate',
-        'Rough',
-        'Very Rough',
-        'High',
-        'Very High',
-        'Phenomenal',
-        'Unknown'
-      ]
-      
-      result.sort((a, b) => {
-        const aIndex = seaStateOrder.findIndex(s => s.toLowerCase() === a.name.toLowerCase())
-        const bIndex = seaStateOrder.findIndex(s => s.toLowerCase() === b.name.toLowerCase())
-        
-        // If not found in order, put at end
-        const aPos = aIndex === -1 ? seaStateOrder.length : aIndex
-        const bPos = bIndex === -1 ? seaStateOrder.length : bIndex
-        
-        return aPos - bPos
-      })
-    } else {
-      // For other categorical data, sort alphabetically
-      result.sort((a, b) => a.name.localeCompare(b.name))
-    }
-
-    return result
-  }
-
-  const getUniqueHueValues = () => {
-    if (!incidents.length || !selectedHue) return []
-    const uniqueHues = new Set<string>()
-    incidents.forEach(incident => {
-      const hueValue = incident[selectedHue]
-      if (hueValue && String(hueValue).trim()) {
-        uniqueHues.add(String(hueValue))
-      }
-    })
-    
-    if (incidents.some(i => !i[selectedHue] || !String(i[selectedHue]).trim())) {
-        uniqueHues.add('Unknown');
-    }
-
-    return Array.from(uniqueHues).slice(0, 7)
-  }
+  const getUniqueHueValues = () => chart.hues
 
   const handleSignOut = async () => {
     await supabase.auth.signOut()
@@ -410,19 +199,39 @@ export default function DashboardPage() {
           timestamp: msg.timestamp.toISOString()
         }))
       
-      const response = await api.askQuestion(userMessage.content, historyForApi)
-      
-      // Remove loading message and add real response
-      setChatMessages(prev => {
-        const filtered = prev.filter(msg => !msg.loading)
-        const botMessage: ChatMessage = {
-          id: (Date.now() + 2).toString(),
-          type: 'bot',
-          content: response.answer,
-          timestamp: new Date()
+      // Stream the answer, showing the agent's progress in the loading message
+      const controller = new AbortController()
+      chatAbortRef.current = controller
+      let answer = null as string | null
+      let streamedText = ''
+      const updateLoading = (content: string) =>
+        setChatMessages(prev => prev.map(msg => msg.loading ? { ...msg, content } : msg))
+
+      await api.askQuestionStream(userMessage.content, historyForApi, event => {
+        if (event.type === 'token') {
+          streamedText += event.content
+          updateLoading(streamedText)
+        } else if (event.type === 'step') {
+          updateLoading(`Running ${event.tool}...`)
+        } else if (event.type === 'answer') {
+          answer = event.content
+        } else if (event.type === 'error') {
+          throw new Error(event.error)
         }
-        return [...filtered, botMessage]
-      })
+      }, controller.signal)
+
+      if (answer === null) {
+        throw new Error('Chat stream ended without an answer')
+      }
+
+      // Remove loading message and add real response
+      const botMessage: ChatMessage = {
+        id: (Date.now() + 2).toString(),
+        type: 'bot',
+        content: answer,
+        timestamp: new Date()
+      }
+      setChatMessages(prev => [...prev.filter(msg => !msg.loading), botMessage])
     } catch (error) {
       // Remove loading message and add error response
       setChatMessages(prev => {
@@ -437,6 +246,7 @@ export default function DashboardPage() {
       })
       console.error('Chat error:', error)
     } finally {
+      chatAbortRef.current = null
       setIsChatLoading(false)
     }
   }
@@ -476,15 +286,10 @@ export default function DashboardPage() {
   }
 
   // Calculate stats from real data
-  const totalIncidents = incidents.length
-  const openIncidents = incidents.filter(i => 
-    !i.injured_person_returned_to_work && i.injury_status !== 'No injury'
-  ).length
-  const dropObjectCount = incidents.filter(i => i.dropped_object === true).length
-  const handInjuryCount = incidents.filter(i => 
-    i.incident_description?.toLowerCase().includes('hand') ||
-    i.incident_description?.toLowerCase().includes('finger')
-  ).length
+  const totalIncidents = stats?.total_incidents ?? 0
+  const openIncidents = stats?.open_incidents ?? 0
+  const dropObjectCount = stats?.dropped_object_count ?? 0
+  const handInjuryCount = stats?.hand_injury_count ?? 0
 
   return (
     <div className="min-h-screen flex bg-background">
@@ -985,7 +790,7 @@ export default function DashboardPage() {
             </CardHeader>
             <CardContent>
               <div className="space-y-4">
-                {incidents.slice(0, 5).map((incident, index) => (
+                {recentIncidents.map((incident, index) => (
                   <div key={incident.id || index} className="flex items-center justify-between p-3 rounded-lg border bg-card hover:bg-accent/50 transition-colors">
                     <div className="flex-1 min-w-0">
                       <div className="flex items-center space-x-3">
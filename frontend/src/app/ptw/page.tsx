@@ -146,7 +146,7 @@ export default function PTWPage() {
       // Load similar incidents after successful PTW processing
       setLoadingSimilar(true)
       try {
-        const similarData = await api.getSimilarIncidents()
+        const similarData = await api.getSimilarIncidents(result)
         setSimilarIncidents(similarData.similar_incidents)
         setIncidentsSummary(similarData.summary)
       } catch (err) {
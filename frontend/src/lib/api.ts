@@ -128,10 +128,72 @@ class ApiClient {
 
     return response.json()
   }
+
+  // POST and read a server-sent event stream, calling onEvent for each event
+  async postStream(
+    endpoint: string,
+    data: Record<string, unknown>,
+    onEvent: (event: string, data: any) => void,
+    signal?: AbortSignal,
+  ) {
+    const headers = await this.getAuthHeaders()
+    const response = await fetch(`${API_URL}${endpoint}`, {
+      method: 'POST',
+      headers: { ...headers, 'Accept': 'text/event-stream' },
+      body: JSON.stringify(data),
+      signal,
+    })
+
+    if (!response.ok || !response.body) {
+      throw new Error(`API request failed: ${response.statusText}`)
+    }
+
+    const reader = response.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ''
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      let boundary = buffer.indexOf('\n\n')
+      while (boundary !== -1) {
+        const block = buffer.slice(0, boundary)
+        buffer = buffer.slice(boundary + 2)
+        let event = 'message'
+        const dataLines: string[] = []
+        for (const line of block.split('\n')) {
+          if (line.startsWith('event:')) event = line.slice(6).trim()
+          else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim())
+        }
+        if (dataLines.length) onEvent(event, JSON.parse(dataLines.join('\n')))
+        boundary = buffer.indexOf('\n\n')
+      }
+    }
+  }
 }
 
 export const apiClient = new ApiClient()
 
+const JOB_POLL_INTERVAL_MS = 1500
+
+// Submit a PDF as a background extraction job and poll until it finishes,
+// so long extractions don't hold a single request open past proxy timeouts
+async function runExtractionJob<T>(endpoint: string, file: File): Promise<T> {
+  let job: ExtractionJob<T> = await apiClient.uploadFile(endpoint, file)
+
+  while (job.status === 'queued' || job.status === 'running') {
+    await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+    job = await apiClient.get(`/dashboard/jobs/${job.id}`)
+  }
+
+  if (job.status === 'failed' || job.result === null) {
+    throw new Error(job.error || 'Extraction failed')
+  }
+
+  return job.result
+}
+
 // Types for API responses
 export interface DashboardUserData {
   user_id: string
@@ -221,6 +283,18 @@ export interface PTWData {
   equipment_required: string
 }
 
+export interface ExtractionJob<T> {
+  id: string
+  kind: string
+  status: 'queued' | 'running' | 'succeeded' | 'failed'
+  stage: string
+  partial: Partial<T> | null
+  result: T | null
+  error: string | null
+  created_at: number
+  updated_at: number
+}
+
 export interface SimilarIncident {
   id: string
   date: string
@@ -230,6 +304,57 @@ export interface SimilarIncident {
   incident_description: string
   tools_used: string
   injury_status: string
+  score: number
+}
+
+export interface IncidentQuery {
+  fields?: string[]
+  vessel_name?: string
+  date_from?: string
+  date_to?: string
+  classification?: string
+  work_at_height?: boolean
+  work_in_confined_space?: boolean
+  lifting_operation_incident?: boolean
+  dropped_object?: boolean
+  environmental_loss_of_containment?: boolean
+  limit?: number
+  cursor?: string
+}
+
+function toQueryString(params: Record<string, unknown>): string {
+  const search = new URLSearchParams()
+  Object.entries(params).forEach(([key, value]) => {
+    if (value === undefined || value === null) return
+    search.set(key, Array.isArray(value) ? value.join(',') : String(value))
+  })
+  const query = search.toString()
+  return query ? `?${query}` : ''
+}
+
+export interface NameValue {
+  name: string
+  value: number
+}
+
+export interface DashboardStats {
+  total_incidents: number
+  open_incidents: number
+  dropped_object_count: number
+  hand_injury_count: number
+  minor_injuries_vs_near_misses: NameValue[]
+  routine_tasks: Array<{task: string, count: number}>
+  dropped_objects_by_month: Array<{month: string, count: number}>
+  dropped_objects_by_vessel: Array<{vessel_name: string, count: number}>
+  hand_injuries: NameValue[]
+  high_potential_by_month: Array<{month: string, count: number}>
+  sea_states: Array<{state: string, count: number}>
+  fire_watch_hot_work: NameValue[]
+}
+
+export interface DashboardChart {
+  data: Array<Record<string, string | number>>
+  hues: string[]
 }
 
 export interface ChatRequest {
@@ -247,23 +372,44 @@ export interface ChatResponse {
   error?: string
 }
 
+// Events from /dashboard/chat/stream
+export type ChatStreamEvent =
+  | { type: 'token', content: string }
+  | { type: 'step', tool: string, input: string }
+  | { type: 'observation', tool: string, output: string }
+  | { type: 'answer', content: string }
+  | { type: 'error', error: string }
+
 // Typed API functions
 export const api = {
   // Dashboard endpoints
   getDashboardUser: (): Promise<DashboardUserData> => apiClient.get('/dashboard/user'),
-  getDashboardIncidents: (): Promise<{incidents: any[]}> => apiClient.get('/dashboard/incidents'),
+  getDashboardStats: (): Promise<DashboardStats> => apiClient.get('/dashboard/stats'),
+  getDashboardChart: (x: string, y: string, hue: string): Promise<DashboardChart> =>
+    apiClient.get(`/dashboard/stats/chart${toQueryString({ x, y, hue })}`),
+  getDashboardIncidents: (query: IncidentQuery = {}): Promise<{incidents: any[], next_cursor: string | null}> =>
+    apiClient.get(`/dashboard/incidents${toQueryString(query as Record<string, unknown>)}`),
   
   // Incident endpoints
-  uploadIncidentReport: (file: File): Promise<AccidentData> => apiClient.uploadFile('/dashboard/upload', file),
+  uploadIncidentReport: (file: File): Promise<AccidentData> => runExtractionJob<AccidentData>('/dashboard/jobs/upload', file),
   saveIncident: (accidentData: AccidentData): Promise<{success: boolean, message: string, incident_id: string}> => 
     apiClient.post('/dashboard/save-incident', accidentData as unknown as Record<string, unknown>),
   
   // PTW endpoints
-  uploadPTWReport: (file: File): Promise<PTWData> => apiClient.uploadFile('/dashboard/upload-ptw', file),
-  getSimilarIncidents: (): Promise<{similar_incidents: SimilarIncident[], summary: string}> => apiClient.get('/dashboard/similar-incidents'),
+  uploadPTWReport: (file: File): Promise<PTWData> => runExtractionJob<PTWData>('/dashboard/jobs/upload-ptw', file),
+  getSimilarIncidents: (ptwData: PTWData): Promise<{similar_incidents: SimilarIncident[], summary: string}> =>
+    apiClient.post('/dashboard/similar-incidents', ptwData as unknown as Record<string, unknown>),
   getIncidentDetails: (incidentId: string): Promise<{incident: AccidentData}> => apiClient.get(`/dashboard/incident/${incidentId}`),
   
   // Chat endpoints
   askQuestion: (question: string, chatHistory: Array<{type: 'user' | 'bot', content: string, timestamp: string}> = []): Promise<ChatResponse> => 
     apiClient.post('/dashboard/chat', { question, chat_history: chatHistory } as Record<string, unknown>),
+  askQuestionStream: (
+    question: string,
+    chatHistory: Array<{type: 'user' | 'bot', content: string, timestamp: string}>,
+    onEvent: (event: ChatStreamEvent) => void,
+    signal?: AbortSignal,
+  ): Promise<void> =>
+    apiClient.postStream('/dashboard/chat/stream', { question, chat_history: chatHistory } as Record<string, unknown>,
+      (type, data) => onEvent({ ...data, type }), signal),
 } 
\ No newline at end of file